@@ -0,0 +1,111 @@
+import numpy as np
+
+DIVERGENCE_THRESHOLD = 16
+PERIODICITY_STRIDE = 8
+
+
+def colour_map() -> np.ndarray:
+    # Red to yellow to white, 64 steps each, plus pure white at the end
+    steps = np.arange(64) * 4
+    reds = np.stack([steps, np.zeros(64), np.zeros(64)], axis=1)
+    yellows = np.stack([np.full(64, 255), steps, np.zeros(64)], axis=1)
+    whites = np.stack([np.full(64, 255), np.full(64, 255), steps], axis=1)
+    return np.concatenate([reds, yellows, whites, [[255, 255, 255]]]).astype(np.uint8)
+
+
+def viewport(width: int, height: int, real_range: tuple[float, float], imag_range: tuple[float, float],
+             tile: tuple[int, int, int, int] | None = None) -> np.ndarray:
+    # The complex point under every pixel, indexed [x][y] to match the surface's pixel array. A tile (x0, y0, x1, y1)
+    # gives just the points under that block of pixels, with exactly the same values as in the whole viewport
+    x0, y0, x1, y1 = tile or (0, 0, width, height)
+    real = np.interp(np.arange(x0, x1), [0, width], real_range)
+    imag = np.interp(np.arange(y0, y1), [0, height], imag_range)
+    return real[:, np.newaxis] + 1j * imag[np.newaxis, :]
+
+
+def auto_max_iterations(zoom: float, base_iterations: int = 100, per_doubling: int = 25) -> int:
+    # Detail near the set takes more iterations to show the further in you go, so add some for every doubling of zoom
+    return base_iterations + int(per_doubling * max(0.0, np.log2(zoom)))
+
+
+def in_cardioid_or_bulb(c: np.ndarray) -> np.ndarray:
+    # Points inside the main cardioid or the period-2 bulb of the Mandelbrot set, which never escape
+    x, y = c.real, c.imag
+    q = (x - 0.25) ** 2 + y * y
+    return (q * (q + x - 0.25) <= 0.25 * y * y) | ((x + 1) ** 2 + y * y <= 0.0625)
+
+
+def escape_time(z: np.ndarray, c: np.ndarray | complex, max_iterations: int,
+                divergence_threshold: float = DIVERGENCE_THRESHOLD, check_bulbs: bool = False,
+                check_periodicity: bool = True, stats: dict | None = None) -> np.ndarray:
+    """
+    Iterate z = z * z + c over a whole array of points at once, and return how many iterations each point took to
+    diverge, or max_iterations if it never did. c is either one value (Julia) or an array the same shape as z
+    (Mandelbrot).
+    Points drop out of the arrays as soon as they escape, so later iterations only work on the points still going.
+
+    Points which will never escape are found early too, as they would otherwise use up the whole budget:
+    check_bulbs - skips points inside the main cardioid and period-2 bulb. Only for the Mandelbrot set, where z starts
+                  at c
+    check_periodicity - Brent's method. z is saved at every power of two iterations, and a point whose orbit lands
+                        exactly on its saved value again is in a cycle. Checked every PERIODICITY_STRIDE iterations
+    stats, if given, is updated with how many iterations each of these saved, and how many were done.
+    """
+    iterations = np.full(z.shape, max_iterations, dtype=np.int32)
+    remaining = np.flatnonzero(np.ones(z.shape, dtype=np.bool_))
+    z = z.ravel().copy()
+    c = np.broadcast_to(c, iterations.shape).ravel().copy()
+    flat_iterations = iterations.ravel()
+    saved = {"bulbs": 0, "periodicity": 0, "done": 0}
+
+    if check_bulbs:
+        inside = in_cardioid_or_bulb(c)
+        saved["bulbs"] = int(np.count_nonzero(inside)) * max_iterations
+        outside = ~inside
+        remaining, z, c = remaining[outside], z[outside], c[outside]
+
+    saved_z = z.copy()
+    next_save = 1
+    for num_iterations in range(max_iterations):
+        if len(remaining) == 0:
+            break
+
+        z *= z
+        z += c
+        saved["done"] += len(remaining)
+
+        escaped = np.abs(z.real + z.imag) > divergence_threshold
+        # Only compare every few iterations to keep the cost down. A cycle is still caught, just a little later
+        if check_periodicity and num_iterations % PERIODICITY_STRIDE == 0:
+            periodic = z == saved_z
+            saved["periodicity"] += int(np.count_nonzero(periodic)) * (max_iterations - num_iterations - 1)
+            finished = escaped | periodic
+        else:
+            finished = escaped
+
+        if finished.any():
+            flat_iterations[remaining[escaped]] = num_iterations
+            still_going = ~finished
+            remaining = remaining[still_going]
+            z = z[still_going]
+            c = c[still_going]
+            saved_z = saved_z[still_going]
+
+        if check_periodicity and num_iterations + 1 == next_save:
+            saved_z = z.copy()
+            next_save *= 2
+
+    if stats is not None:
+        for name, value in saved.items():
+            stats[name] = stats.get(name, 0) + value
+    return iterations
+
+
+def colourise(iterations: np.ndarray, max_iterations: int, col_map: np.ndarray) -> np.ndarray:
+    # Colour by the square root of how far through the budget each point escaped, with black for points that never did,
+    # and grey for any marked -1 as not computed yet
+    indices = (np.sqrt(np.maximum(iterations, 0) / max_iterations) * len(col_map)).astype(np.intp)
+    pixels = col_map[np.minimum(indices, len(col_map) - 1)]
+    pixels[iterations >= max_iterations] = 0
+    pixels[iterations < 0] = 51
+    return pixels
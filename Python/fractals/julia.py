@@ -1,14 +1,15 @@
 import ctypes
-from math import sqrt, fabs
 
-import numpy as np
 import pygame
 from pygame import pixelcopy
 from pygame._sdl2 import Window
 
+from escape_time import colour_map, colourise
+from tile_cache import CachedRenderer, PyramidView, TileCache
+
 
 class Julia:
-    def __init__(self) -> None:
+    def __init__(self, workers: int | None = None, cache_directory: str | None = None) -> None:
         user32 = ctypes.windll.user32
         self.screen_width = 800  # user32.GetSystemMetrics(0)
         self.screen_height = 600  # user32.GetSystemMetrics(1)
@@ -22,66 +23,72 @@ class Julia:
         self.screen = pygame.display.set_mode(window_size, pygame.DOUBLEBUF, 32)
         self.pg_window = Window.from_display_module()
 
+        # Tiles are rendered by a pool of worker processes, one per core unless told otherwise
+        self.workers = workers
+        # Computed tiles are kept for when they come back on screen, and saved to disk too if given a directory
+        self.cache = TileCache(directory=cache_directory)
+
     def start(self) -> None:
-        reds = []
-        yellows = []
-        whites = []
-        for i in range(64):
-            reds.append([i * 4, 0, 0])
-            yellows.append([255, i * 4, 0])
-            whites.append([255, 255, i * 4])
-        whites.append([255, 255, 255])
-
-        col_map = reds + yellows + whites
-        col_map_len = len(col_map)
-        pix_arr = np.array([[[51, 51, 51] for _ in range(self.screen_height)] for _ in range(self.screen_width)],
-                           dtype=np.uint8)
-
-        max_iterations = 100
-        divergence_threshold = 16
-        c_real = -0.70176
-        c_imag = -0.3842
+        # Keys: arrows pan a tenth of the screen, +/- zoom in/out 2x
+        col_map = colour_map()
+
+        # The iteration limit grows as you zoom in
+        max_iterations = None
+        c = complex(-0.70176, -0.3842)
+        params = ("julia", c.real, c.imag)
 
         self.screen.fill((0, 0, 0))
 
+        # Only tiles which aren't cached are rendered, and each is shown as soon as it is finished
+        cached_renderer = CachedRenderer(self.cache, params, max_iterations, self.workers)
+        view = PyramidView(self.screen_width, self.screen_height, 3, (0.0, 0.0))
+        cached_renderer.show(view)
+        pix_arr = colourise(cached_renderer.iterations, cached_renderer.view_max_iterations, col_map)
+
         while 1:
             self.__clock.tick(10)
 
+            changed = False
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    cached_renderer.close()
                     exit()
 
                 if event.type == pygame.KEYUP:
                     if event.key == pygame.K_ESCAPE:
+                        cached_renderer.close()
                         exit()
-
-            # update
-            for x in range(self.screen_width):
-                for y in range(self.screen_height):
-                    z_real = np.interp(x, [0, self.screen_width], [-2.0, 2.0])
-                    z_imag = np.interp(y, [0, self.screen_height], [-1.5, 1.5])
-
-                    num_iterations = 0
-
-                    while num_iterations < max_iterations:
-                        z_squared_real = z_real * z_real - z_imag * z_imag
-                        z_squared_imag = 2 * z_real * z_imag
-
-                        z_real = z_squared_real + c_real
-                        z_imag = z_squared_imag + c_imag
-
-                        if fabs(z_real + z_imag) > divergence_threshold:
-                            break
-
-                        num_iterations += 1
-
-                    if num_iterations == max_iterations:
-                        bright = [0, 0, 0]
+                    elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                        view.zoom(1)
+                    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        view.zoom(-1)
+                    elif event.key == pygame.K_LEFT:
+                        view.pan(-self.screen_width // 10, 0)
+                    elif event.key == pygame.K_RIGHT:
+                        view.pan(self.screen_width // 10, 0)
+                    elif event.key == pygame.K_UP:
+                        view.pan(0, -self.screen_height // 10)
+                    elif event.key == pygame.K_DOWN:
+                        view.pan(0, self.screen_height // 10)
                     else:
-                        bright = np.interp(num_iterations, [0, max_iterations], [0, 1])
-                        bright = col_map[int(np.interp(sqrt(bright), [0, 1], [0, col_map_len]))]
+                        continue
+                    changed = True
 
-                    pix_arr[x][y] = bright
+            # update
+            if changed:
+                cached_renderer.show(view)
+                pix_arr = colourise(cached_renderer.iterations, cached_renderer.view_max_iterations, col_map)
+            finished = cached_renderer.finished()
+            for x0, y0, x1, y1 in finished:
+                pix_arr[x0:x1, y0:y1] = colourise(
+                    cached_renderer.iterations[x0:x1, y0:y1], cached_renderer.view_max_iterations, col_map
+                )
+            if changed or finished:
+                stats = cached_renderer.stats
+                pygame.display.set_caption(
+                    f"Max iterations {cached_renderer.view_max_iterations} - did {stats['done']}, saved "
+                    f"{stats['bulbs']} in the cardioid and bulbs and {stats['periodicity']} with periodicity checks"
+                )
 
             # render
             pixelcopy.array_to_surface(self.screen, pix_arr)  # fast copy colour array to screen
@@ -5,6 +5,7 @@ import julia_GL
 
 if __name__ == '__main__':
     # Mandelbrot().start()
+    # Mandelbrot().deep_zoom("-0.743643887037151", "0.131825904205330", 1e-6)
     # Julia().start()
     # mandelbrot_GL.main()
     julia_GL.main()
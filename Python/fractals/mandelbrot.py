@@ -1,14 +1,19 @@
 import ctypes
-from math import sqrt, fabs
+import time
+from decimal import Decimal, localcontext
 
 import numpy as np
 import pygame
 from pygame import pixelcopy
 from pygame._sdl2 import Window
 
+from escape_time import auto_max_iterations, colour_map, colourise
+from perturbation import deep_zoom_escape_time, precision_for
+from tile_cache import CachedRenderer, PyramidView, TileCache
+
 
 class Mandelbrot:
-    def __init__(self) -> None:
+    def __init__(self, workers: int | None = None, cache_directory: str | None = None) -> None:
         user32 = ctypes.windll.user32
         self.screen_width = 800  # user32.GetSystemMetrics(0)
         self.screen_height = 600  # user32.GetSystemMetrics(1)
@@ -22,66 +27,141 @@ class Mandelbrot:
         self.screen = pygame.display.set_mode(window_size, pygame.DOUBLEBUF, 32)
         self.pg_window = Window.from_display_module()
 
+        # Tiles are rendered by a pool of worker processes, one per core unless told otherwise
+        self.workers = workers
+        # Computed tiles are kept for when they come back on screen, and saved to disk too if given a directory
+        self.cache = TileCache(directory=cache_directory)
+
     def start(self) -> None:
-        reds = []
-        yellows = []
-        whites = []
-        for i in range(64):
-            reds.append([i * 4, 0, 0])
-            yellows.append([255, i * 4, 0])
-            whites.append([255, 255, i * 4])
-        whites.append([255, 255, 255])
-
-        col_map = reds + yellows + whites
-        col_map_len = len(col_map)
-        pix_arr = np.array([[[51, 51, 51] for _ in range(self.screen_height)] for _ in range(self.screen_width)],
-                           dtype=np.uint8)
-
-        max_iterations = 100
-        divergence_threshold = 16
+        # Keys: arrows pan a tenth of the screen, +/- zoom in/out 2x
+        col_map = colour_map()
+
+        # The iteration limit grows as you zoom in
+        max_iterations = None
+        params = ("mandelbrot",)
 
         self.screen.fill((0, 0, 0))
 
+        # Only tiles which aren't cached are rendered, and each is shown as soon as it is finished
+        cached_renderer = CachedRenderer(self.cache, params, max_iterations, self.workers)
+        view = PyramidView(self.screen_width, self.screen_height, 3, (-0.5, 0.0))
+        cached_renderer.show(view)
+        pix_arr = colourise(cached_renderer.iterations, cached_renderer.view_max_iterations, col_map)
+
         while 1:
             self.__clock.tick(10)
 
+            changed = False
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    cached_renderer.close()
                     exit()
 
                 if event.type == pygame.KEYUP:
                     if event.key == pygame.K_ESCAPE:
+                        cached_renderer.close()
                         exit()
+                    elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                        view.zoom(1)
+                    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        view.zoom(-1)
+                    elif event.key == pygame.K_LEFT:
+                        view.pan(-self.screen_width // 10, 0)
+                    elif event.key == pygame.K_RIGHT:
+                        view.pan(self.screen_width // 10, 0)
+                    elif event.key == pygame.K_UP:
+                        view.pan(0, -self.screen_height // 10)
+                    elif event.key == pygame.K_DOWN:
+                        view.pan(0, self.screen_height // 10)
+                    else:
+                        continue
+                    changed = True
 
             # update
-            for x in range(self.screen_width):
-                for y in range(self.screen_height):
-                    z_real = np.interp(x, [0, self.screen_width], [-2.5, 1.5])
-                    z_imag = np.interp(y, [0, self.screen_height], [-1.5, 1.5])
+            if changed:
+                cached_renderer.show(view)
+                pix_arr = colourise(cached_renderer.iterations, cached_renderer.view_max_iterations, col_map)
+            finished = cached_renderer.finished()
+            for x0, y0, x1, y1 in finished:
+                pix_arr[x0:x1, y0:y1] = colourise(
+                    cached_renderer.iterations[x0:x1, y0:y1], cached_renderer.view_max_iterations, col_map
+                )
+            if changed or finished:
+                stats = cached_renderer.stats
+                pygame.display.set_caption(
+                    f"Max iterations {cached_renderer.view_max_iterations} - did {stats['done']}, saved "
+                    f"{stats['bulbs']} in the cardioid and bulbs and {stats['periodicity']} with periodicity checks"
+                )
 
-                    c_real = z_real
-                    c_imag = z_imag
-                    num_iterations = 0
+            # render
+            pixelcopy.array_to_surface(self.screen, pix_arr)  # fast copy colour array to screen
 
-                    while num_iterations < max_iterations:
-                        z_squared_real = z_real * z_real - z_imag * z_imag
-                        z_squared_imag = 2 * z_real * z_imag
+            pygame.display.update()
 
-                        z_real = z_squared_real + c_real
-                        z_imag = z_squared_imag + c_imag
+    def deep_zoom(self, centre_real: str = "-0.75", centre_imag: str = "0", half_width: float = 2.0,
+                  max_iterations: int | None = None) -> None:
+        # Zooms far past the precision of doubles, down to 1e-100 and beyond, with perturbation theory.
+        # Keys: +/- zoom in/out 2x, arrows pan a tenth of the view, and clicking a point moves it to the middle.
+        # Without max_iterations, the limit grows as you zoom in
+        col_map = colour_map()
+        centre = (Decimal(centre_real), Decimal(centre_imag))
+        half_height = half_width * self.screen_height / self.screen_width
+        pix_arr = np.full((self.screen_width, self.screen_height, 3), 51, dtype=np.uint8)
+        changed = True
 
-                        if fabs(z_real + z_imag) > divergence_threshold:
-                            break
+        while 1:
+            self.__clock.tick(10)
 
-                        num_iterations += 1
+            pan = None
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    exit()
 
-                    if num_iterations == max_iterations:
-                        colour = [0, 0, 0]
+                if event.type == pygame.KEYUP:
+                    if event.key == pygame.K_ESCAPE:
+                        exit()
+                    elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                        half_width /= 2
+                    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        half_width *= 2
+                    elif event.key == pygame.K_LEFT:
+                        pan = (-0.1, 0)
+                    elif event.key == pygame.K_RIGHT:
+                        pan = (0.1, 0)
+                    elif event.key == pygame.K_UP:
+                        pan = (0, -0.1)
+                    elif event.key == pygame.K_DOWN:
+                        pan = (0, 0.1)
                     else:
-                        normalised_iterations = np.interp(num_iterations, [0, max_iterations], [0, 1])
-                        colour = col_map[int(np.interp(sqrt(normalised_iterations), [0, 1], [0, col_map_len]))]
+                        continue
+                    changed = True
+
+                if event.type == pygame.MOUSEBUTTONUP:
+                    mouse_x, mouse_y = event.pos
+                    pan = (mouse_x / self.screen_width - 0.5, mouse_y / self.screen_height - 0.5)
+                    changed = True
 
-                    pix_arr[x][y] = colour
+            half_height = half_width * self.screen_height / self.screen_width
+            if pan is not None:
+                # Move the centre in high precision, as a double can't hold it once zoomed in
+                with localcontext() as context:
+                    context.prec = precision_for(half_width)
+                    centre = (centre[0] + Decimal(2 * pan[0] * half_width), centre[1] + Decimal(2 * pan[1] * half_height))
+
+            # update
+            if changed:
+                started = time.perf_counter()
+                view_max_iterations = max_iterations or auto_max_iterations(2.0 / half_width)
+                iterations, stats = deep_zoom_escape_time(
+                    centre[0], centre[1], half_width, self.screen_width, self.screen_height, view_max_iterations
+                )
+                pix_arr = colourise(iterations, view_max_iterations, col_map)
+                pygame.display.set_caption(
+                    f"Zoom {half_width:.1e} in {time.perf_counter() - started:.2f}s with max iterations "
+                    f"{view_max_iterations} - skipped {stats['skipped']} "
+                    f"iterations per pixel, fixed glitches in {stats['glitches']} pixels"
+                )
+                changed = False
 
             # render
             pixelcopy.array_to_surface(self.screen, pix_arr)  # fast copy colour array to screen
@@ -0,0 +1,134 @@
+from decimal import Decimal, localcontext
+
+import numpy as np
+
+from escape_time import DIVERGENCE_THRESHOLD
+
+# The reference orbit is no use once it has escaped this far, as every nearby point will have escaped too
+REFERENCE_BAILOUT = 1e4
+
+
+def precision_for(half_width: float) -> int:
+    # Enough decimal digits to tell pixels apart at this zoom, with plenty to spare for the orbit's rounding errors
+    return max(20, int(-np.log10(half_width)) + 20)
+
+
+def reference_orbit(centre_real: str | Decimal, centre_imag: str | Decimal, max_iterations: int, digits: int) -> np.ndarray:
+    """
+    The orbit Z_0 = 0, Z_n+1 = Z_n * Z_n + C of the centre of the view, computed with digits of precision and then
+    rounded to doubles. The values stay near the set, so doubles hold them fine - it is only the differences between
+    pixels which are too small for doubles, and those are handled by the perturbation.
+    Stops early if the centre escapes.
+    """
+    orbit = [0j]
+    with localcontext() as context:
+        context.prec = digits
+        c_real, c_imag = Decimal(centre_real), Decimal(centre_imag)
+        z_real, z_imag = Decimal(0), Decimal(0)
+        for _ in range(max_iterations + 1):
+            z_real, z_imag = z_real * z_real - z_imag * z_imag + c_real, 2 * z_real * z_imag + c_imag
+            orbit.append(complex(float(z_real), float(z_imag)))
+            if abs(orbit[-1]) > REFERENCE_BAILOUT:
+                break
+    return np.array(orbit)
+
+
+def series_coefficients(orbit: np.ndarray, scale: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Coefficients of the series dz_n = a_n * u + b_n * u^2 + c_n * u^3 for a pixel at offset delta = u * scale from the
+    centre. They are kept scaled by powers of scale, as the raw coefficients grow past the range of doubles when zoomed
+    in far enough.
+    """
+    a = np.zeros(len(orbit), dtype=np.complex128)
+    b = np.zeros(len(orbit), dtype=np.complex128)
+    c = np.zeros(len(orbit), dtype=np.complex128)
+    # Once the orbit heads away from the set the coefficients overflow, which series_skip() treats as inaccurate
+    with np.errstate(invalid="ignore", over="ignore"):
+        for n in range(len(orbit) - 1):
+            a[n + 1] = 2 * orbit[n] * a[n] + scale
+            b[n + 1] = 2 * orbit[n] * b[n] + a[n] * a[n]
+            c[n + 1] = 2 * orbit[n] * c[n] + 2 * a[n] * b[n]
+    return a, b, c
+
+
+def series_skip(orbit: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray, probes: np.ndarray, scale: float,
+                tolerance: float = 1e-12) -> int:
+    # The last iterate at which the series still matches a few probe pixels, iterated the long way, to within
+    # tolerance. Points near the set are chaotic, so anything less accurate than the doubles themselves shows up.
+    # It also stops before the probes leave |z| <= 2, as pixels start escaping soon after and must not be skipped past
+    delta = probes * scale
+    dz = delta.copy()
+    for n in range(1, len(orbit) - 1):
+        series = a[n] * probes + b[n] * probes * probes + c[n] * probes * probes * probes
+        with np.errstate(invalid="ignore", over="ignore"):
+            if not np.all(np.abs(series - dz) <= tolerance * np.abs(dz)) or np.any(np.abs(orbit[n] + dz) > 2):
+                return max(1, n - 1)
+            dz = 2 * orbit[n] * dz + dz * dz + delta
+    # Leave at least one reference iteration for the perturbation itself
+    return max(1, len(orbit) - 2)
+
+
+def deep_zoom_escape_time(centre_real: str | Decimal, centre_imag: str | Decimal, half_width: float, width: int,
+                          height: int, max_iterations: int, use_series: bool = True,
+                          divergence_threshold: float = DIVERGENCE_THRESHOLD) -> tuple[np.ndarray, dict]:
+    """
+    Escape-time iteration counts of the Mandelbrot set for a view of half_width around the centre, indexed [x][y],
+    counted the same way as escape_time(). Works far beyond the zoom where doubles run out of precision.
+
+    Only the centre is iterated in high precision. Every pixel then iterates its difference dz from the centre's orbit
+    in doubles: dz_n+1 = 2 * Z_n * dz_n + dz_n^2 + delta. The first iterations are skipped with a series approximation
+    of dz. A glitch, where the difference grows larger than the point itself and loses its precision, is detected with
+    |Z_n + dz_n| < |dz_n|, and fixed by rebasing the pixel back on to the start of the orbit with dz = Z_n + dz_n.
+    The stats give the length of the reference orbit, how many iterations the series skipped and how many pixels glitched.
+    """
+    half_height = half_width * height / width
+    orbit = reference_orbit(centre_real, centre_imag, max_iterations, precision_for(half_width))
+    last = len(orbit) - 1
+
+    # Offsets from the centre, spaced the same way as viewport(), as multiples of the half width
+    u_real = np.interp(np.arange(width), [0, width], [-1.0, 1.0])
+    u_imag = np.interp(np.arange(height), [0, height], [-half_height / half_width, half_height / half_width])
+    u = (u_real[:, np.newaxis] + 1j * u_imag[np.newaxis, :]).ravel()
+    delta = u * half_width
+
+    # Start every pixel at its first iterate, dz_1 = delta, or further on with the series approximation
+    skipped = 1
+    if use_series:
+        a, b, c = series_coefficients(orbit, half_width)
+        # Probe the corners and the middles of the edges, where the series is least accurate
+        probes = np.array([complex(x, y * half_height / half_width) for x in (-1, 0, 1) for y in (-1, 0, 1) if x or y])
+        skipped = series_skip(orbit, a, b, c, probes, half_width)
+        dz = a[skipped] * u + b[skipped] * u * u + c[skipped] * u * u * u
+    else:
+        dz = delta.copy()
+
+    iterations = np.full(width * height, max_iterations, dtype=np.int32)
+    remaining = np.arange(width * height)
+    reference_index = np.full(width * height, skipped)
+    # Pixels which glitched at least once. A pixel may need rebasing many times, so counting rebases would overstate it
+    glitched = np.zeros(width * height, dtype=np.bool_)
+
+    # Orbit index n is the nth iterate from z_0 = 0, and escape_time() starts with z = c, which is z_1. So a point
+    # escaping at z_n took n - 2 iterations
+    for n in range(skipped + 1, max_iterations + 2):
+        dz = 2 * orbit[reference_index] * dz + dz * dz + delta
+        reference_index += 1
+        z = orbit[reference_index] + dz
+
+        escaped = np.abs(z.real + z.imag) > divergence_threshold
+        if escaped.any():
+            iterations[remaining[escaped]] = n - 2
+            still_going = ~escaped
+            remaining, dz, z, delta = remaining[still_going], dz[still_going], z[still_going], delta[still_going]
+            reference_index = reference_index[still_going]
+            if len(remaining) == 0:
+                break
+
+        rebase = (np.abs(z) < np.abs(dz)) | (reference_index == last)
+        if rebase.any():
+            glitched[remaining[rebase & (reference_index < last)]] = True
+            dz[rebase] = z[rebase]
+            reference_index[rebase] = 0
+
+    stats = {"reference_length": last, "skipped": skipped - 1, "glitches": int(np.count_nonzero(glitched))}
+    return iterations.reshape(width, height), stats
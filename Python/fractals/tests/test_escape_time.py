@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+
+from escape_time import DIVERGENCE_THRESHOLD, auto_max_iterations, escape_time, in_cardioid_or_bulb, viewport
+
+
+def iterate_point(z: complex, c: complex, max_iterations: int) -> int:
+    # One point at a time, the way the original loop did it
+    for num_iterations in range(max_iterations):
+        z = z * z + c
+        if abs(z.real + z.imag) > DIVERGENCE_THRESHOLD:
+            return num_iterations
+    return max_iterations
+
+
+class TestEscapeTime:
+    @pytest.fixture
+    def setup(self):
+        self.max_iterations = 200
+        # Covers the whole set, so there are points inside the cardioid, the bulbs and the smaller cycles
+        self.points = viewport(48, 32, (-2.2, 0.8), (-1.2, 1.2))
+
+    def test_escape_time_matches_iterating_each_point(self, setup):
+        # Arrange
+        expected = [[iterate_point(c, c, self.max_iterations) for c in row] for row in self.points]
+
+        # Act
+        result = escape_time(self.points, self.points, self.max_iterations, check_periodicity=False)
+
+        # Assert
+        assert result.shape == self.points.shape
+        assert result.tolist() == expected
+
+    def test_escape_time_with_one_c_matches_iterating_each_point(self, setup):
+        # Arrange
+        c = complex(-0.8, 0.156)
+        expected = [[iterate_point(z, c, self.max_iterations) for z in row] for row in self.points]
+
+        # Act
+        result = escape_time(self.points, c, self.max_iterations, check_periodicity=False)
+
+        # Assert
+        assert result.tolist() == expected
+
+    @pytest.mark.parametrize("check_bulbs, check_periodicity", [(True, False), (False, True), (True, True)])
+    def test_interior_checks_leave_every_count_unchanged(self, setup, check_bulbs, check_periodicity):
+        # Arrange
+        expected = escape_time(self.points, self.points, self.max_iterations, check_periodicity=False)
+
+        # Act
+        result = escape_time(self.points, self.points, self.max_iterations, check_bulbs=check_bulbs, check_periodicity=check_periodicity)
+
+        # Assert
+        assert np.array_equal(result, expected)
+
+    def test_interior_checks_save_iterations(self, setup):
+        # Arrange
+        plain_stats = {}
+        stats = {}
+        escape_time(self.points, self.points, self.max_iterations, check_periodicity=False, stats=plain_stats)
+
+        # Act
+        escape_time(self.points, self.points, self.max_iterations, check_bulbs=True, check_periodicity=True, stats=stats)
+
+        # Assert
+        assert stats["bulbs"] > 0
+        assert stats["periodicity"] > 0
+        assert plain_stats["bulbs"] == plain_stats["periodicity"] == 0
+        assert stats["done"] < plain_stats["done"]
+
+    def test_stats_add_up_over_calls(self, setup):
+        # Arrange
+        stats = {}
+        escape_time(self.points, self.points, self.max_iterations, check_bulbs=True, stats=stats)
+        once = dict(stats)
+
+        # Act
+        escape_time(self.points, self.points, self.max_iterations, check_bulbs=True, stats=stats)
+
+        # Assert
+        assert stats == {name: 2 * value for name, value in once.items()}
+
+    def test_periodicity_check_finds_a_fixed_point(self):
+        # Arrange
+        # c = 0 with z = 0 stays at 0 for ever, so it is caught at the first check
+        z = np.zeros(1, dtype=np.complex128)
+        stats = {}
+
+        # Act
+        result = escape_time(z, z, 1000, check_periodicity=True, stats=stats)
+
+        # Assert
+        assert result.tolist() == [1000]
+        assert stats["done"] == 1
+        assert stats["periodicity"] == 999
+
+
+class TestInCardioidOrBulb:
+    @pytest.mark.parametrize("c, expected", [
+        (0, True),
+        (-0.5 + 0.5j, True),
+        (0.24, True),
+        (-1, True),
+        (-1.2, True),
+        (0.3, False),
+        (-1.3, False),
+        (-0.1 + 0.8j, False),
+        (-2, False),
+    ])
+    def test_in_cardioid_or_bulb(self, c, expected):
+        # Arrange
+        points = np.array([c], dtype=np.complex128)
+
+        # Act
+        result = in_cardioid_or_bulb(points)
+
+        # Assert
+        assert result.tolist() == [expected]
+
+    def test_points_inside_never_escape(self):
+        # Arrange
+        points = viewport(60, 40, (-2.2, 0.8), (-1.2, 1.2))
+        inside = in_cardioid_or_bulb(points)
+
+        # Act
+        result = escape_time(points[inside], points[inside], 500, check_periodicity=False)
+
+        # Assert
+        assert inside.any()
+        assert np.all(result == 500)
+
+
+class TestAutoMaxIterations:
+    @pytest.mark.parametrize("zoom, expected", [(0.5, 100), (1, 100), (2, 125), (4, 150), (1024, 350)])
+    def test_auto_max_iterations_adds_iterations_for_every_doubling(self, zoom, expected):
+        # Arrange
+
+        # Act
+        result = auto_max_iterations(zoom)
+
+        # Assert
+        assert result == expected
+
+    def test_auto_max_iterations_uses_the_given_budget(self):
+        # Arrange
+
+        # Act
+        result = auto_max_iterations(8, base_iterations=50, per_doubling=10)
+
+        # Assert
+        assert result == 80
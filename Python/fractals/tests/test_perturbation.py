@@ -0,0 +1,89 @@
+from decimal import Decimal, localcontext
+
+import numpy as np
+import pytest
+
+from escape_time import DIVERGENCE_THRESHOLD, escape_time, viewport
+from perturbation import deep_zoom_escape_time
+
+
+def iterate_exactly(centre_real: str, centre_imag: str, half_width: float, width: int, height: int,
+                    max_iterations: int, digits: int = 50) -> np.ndarray:
+    # Every pixel iterated in Decimal, counted the same way as escape_time()
+    iterations = np.full((width, height), max_iterations, dtype=np.int32)
+    half_height = half_width * height / width
+    with localcontext() as context:
+        context.prec = digits
+        for x in range(width):
+            for y in range(height):
+                c_real = Decimal(centre_real) + Decimal(half_width) * Decimal(x * 2 / width - 1)
+                c_imag = Decimal(centre_imag) + Decimal(half_height) * Decimal(y * 2 / height - 1)
+                z_real, z_imag = c_real, c_imag
+                for num_iterations in range(max_iterations):
+                    z_real, z_imag = z_real * z_real - z_imag * z_imag + c_real, 2 * z_real * z_imag + c_imag
+                    if abs(z_real + z_imag) > DIVERGENCE_THRESHOLD:
+                        iterations[x, y] = num_iterations
+                        break
+    return iterations
+
+
+class TestDeepZoomEscapeTime:
+    @pytest.mark.parametrize("centre_real, centre_imag, half_width", [("-0.75", "0", 1.5), ("-0.7436", "0.1318", 0.01)])
+    @pytest.mark.parametrize("use_series", [False, True])
+    def test_deep_zoom_matches_escape_time_at_shallow_zoom(self, centre_real, centre_imag, half_width, use_series):
+        # Arrange
+        width, height, max_iterations = 40, 30, 200
+        half_height = half_width * height / width
+        centre = complex(float(centre_real), float(centre_imag))
+        points = viewport(width, height, (centre.real - half_width, centre.real + half_width),
+                          (centre.imag - half_height, centre.imag + half_height))
+        expected = escape_time(points, points, max_iterations, check_periodicity=False)
+
+        # Act
+        result, _ = deep_zoom_escape_time(centre_real, centre_imag, half_width, width, height, max_iterations, use_series=use_series)
+
+        # Assert
+        assert np.array_equal(result, expected)
+
+    # Views of 1e-20 across the edge of the points escaping within 400 iterations, found by bisecting in Decimal.
+    # The second one needs glitches fixing
+    @pytest.mark.parametrize("centre_real, centre_imag", [
+        ("-0.1", "0.8782302728026113174150567130"),
+        ("-1.25", "0.0120889771134806606452787917"),
+    ])
+    def test_deep_zoom_matches_exact_iteration_far_past_doubles(self, centre_real, centre_imag):
+        # Arrange
+        width, height, max_iterations, half_width = 16, 12, 1000, 1e-20
+        expected = iterate_exactly(centre_real, centre_imag, half_width, width, height, max_iterations)
+
+        # Act
+        result, stats = deep_zoom_escape_time(centre_real, centre_imag, half_width, width, height, max_iterations)
+
+        # Assert
+        assert len(np.unique(expected)) > 1
+        assert stats["skipped"] > 0
+        assert np.array_equal(result, expected)
+
+    def test_series_never_skips_past_an_escape(self):
+        # Arrange
+        # The centre escapes here, so the series stays accurate right up to the end of the reference orbit
+        centre_real, centre_imag = "-0.1", "0.8782302728026113174150567130"
+        with_series, stats = deep_zoom_escape_time(centre_real, centre_imag, 1e-20, 16, 12, 1000)
+
+        # Act
+        without_series, _ = deep_zoom_escape_time(centre_real, centre_imag, 1e-20, 16, 12, 1000, use_series=False)
+
+        # Assert
+        assert stats["skipped"] < with_series.min()
+        assert np.array_equal(with_series, without_series)
+
+    def test_glitches_counts_pixels_not_rebases(self):
+        # Arrange
+        # Points inside the set rebase again and again for the whole iteration budget
+        width, height = 8, 6
+
+        # Act
+        _, stats = deep_zoom_escape_time("-0.75", "0", 1.5, width, height, 1000)
+
+        # Assert
+        assert 0 < stats["glitches"] <= width * height
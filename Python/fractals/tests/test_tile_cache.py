@@ -0,0 +1,199 @@
+import numpy as np
+import pytest
+
+from escape_time import escape_time
+from tile_cache import TILE_SIZE, CachedRenderer, PyramidView, TileCache, compute_tile, pixel_size, tile_key
+
+MANDELBROT = ("mandelbrot",)
+
+
+def wait_for(renderer: CachedRenderer) -> None:
+    # Let every tile of the current view finish, then pick them all up
+    for future in list(renderer.pending.values()):
+        future.result()
+    renderer.finished()
+
+
+def direct_iterations(view: PyramidView, params: tuple, max_iterations: int) -> np.ndarray:
+    # The whole view computed in one go, without any tiles
+    real = (view.x + np.arange(view.width)) * pixel_size(view.level)
+    imag = (view.y + np.arange(view.height)) * pixel_size(view.level)
+    points = real[:, np.newaxis] + 1j * imag[np.newaxis, :]
+    c = points if params[0] == "mandelbrot" else complex(params[1], params[2])
+    return escape_time(points, c, max_iterations, check_periodicity=False)
+
+
+class TestTileCache:
+    @pytest.fixture
+    def setup(self):
+        self.tile = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.int32)
+        self.keys = [tile_key(MANDELBROT, 100, 3, tile_x, 0) for tile_x in range(4)]
+
+    def test_least_recently_used_tile_is_evicted_once_over_max_bytes(self, setup):
+        # Arrange
+        cache = TileCache(max_bytes=3 * self.tile.nbytes)
+        for key in self.keys[:3]:
+            cache.put(key, self.tile.copy())
+        cache.get(self.keys[0])
+
+        # Act
+        cache.put(self.keys[3], self.tile.copy())
+
+        # Assert
+        assert list(cache.tiles) == [self.keys[2], self.keys[0], self.keys[3]]
+        assert cache.nbytes == 3 * self.tile.nbytes
+        assert cache.stats["evictions"] == 1
+
+    def test_replacing_a_tile_does_not_count_its_bytes_twice(self, setup):
+        # Arrange
+        cache = TileCache(max_bytes=2 * self.tile.nbytes)
+        cache.put(self.keys[0], self.tile.copy())
+
+        # Act
+        cache.put(self.keys[0], self.tile.copy())
+        cache.put(self.keys[1], self.tile.copy())
+
+        # Assert
+        assert len(cache) == 2
+        assert cache.nbytes == 2 * self.tile.nbytes
+        assert cache.stats["evictions"] == 0
+
+    def test_tile_larger_than_max_bytes_is_still_kept(self, setup):
+        # Arrange
+        cache = TileCache(max_bytes=self.tile.nbytes // 2)
+
+        # Act
+        cache.put(self.keys[0], self.tile.copy())
+
+        # Assert
+        assert self.keys[0] in cache
+
+    @pytest.mark.parametrize("params", [MANDELBROT, ("julia", -0.8, 0.156)])
+    def test_tiles_saved_to_disk_are_read_back_by_a_new_cache(self, setup, tmp_path, params):
+        # Arrange
+        key = tile_key(params, 100, 3, -2, 1)
+        tile, _ = compute_tile(key)
+        TileCache(directory=tmp_path).put(key, tile)
+        cache = TileCache(directory=tmp_path)
+
+        # Act
+        from_disk = cache.get(key)
+        from_memory = cache.get(key)
+
+        # Assert
+        assert np.array_equal(from_disk, tile)
+        assert from_memory is from_disk
+        assert cache.stats["from_disk"] == 1
+        assert cache.stats["hits"] == 1
+
+    def test_missing_tile_is_a_miss(self, setup, tmp_path):
+        # Arrange
+        cache = TileCache(directory=tmp_path)
+
+        # Act
+        result = cache.get(self.keys[0])
+
+        # Assert
+        assert result is None
+        assert cache.stats["misses"] == 1
+
+    @pytest.mark.parametrize("children_max_iterations", [100, 300])
+    def test_tile_from_children_matches_computing_it(self, setup, children_max_iterations):
+        # Arrange
+        key = tile_key(MANDELBROT, 100, 3, -1, -1)
+        cache = TileCache()
+        for dx in (0, 1):
+            for dy in (0, 1):
+                child_key = tile_key(MANDELBROT, children_max_iterations, 4, -2 + dx, -2 + dy)
+                cache.put(child_key, compute_tile(child_key)[0])
+
+        # Act
+        result = cache.get(key, children_max_iterations)
+
+        # Assert
+        assert cache.stats["from_children"] == 1
+        assert np.array_equal(result, compute_tile(key)[0])
+
+
+class TestCachedRenderer:
+    @pytest.fixture
+    def setup(self):
+        self.width, self.height = 200, 150
+        self.cache = TileCache()
+        renderer = CachedRenderer(self.cache, MANDELBROT, max_iterations=100, workers=1)
+        yield renderer
+        renderer.close()
+
+    def show(self, renderer, view):
+        renderer.show(view)
+        wait_for(renderer)
+        return renderer.iterations
+
+    def test_views_match_direct_computation_after_pans_and_zooms(self, setup):
+        # Arrange
+        renderer = setup
+        view = PyramidView(self.width, self.height, 4, (-0.6, 0.1))
+        expected = []
+        results = []
+
+        # Act
+        for move in (None, ("pan", 37, -21), ("zoom", 1), ("pan", -150, 90), ("zoom", -2)):
+            if move is not None and move[0] == "pan":
+                view.pan(move[1], move[2])
+            elif move is not None:
+                view.zoom(move[1])
+            results.append(self.show(renderer, view).copy())
+            expected.append(direct_iterations(view, MANDELBROT, 100))
+
+        # Assert
+        for result, direct in zip(results, expected):
+            assert np.array_equal(result, direct)
+        assert self.cache.stats["hits"] > 0
+
+    def test_zooming_out_builds_tiles_from_the_tiles_zoomed_in_on(self, setup):
+        # Arrange
+        renderer = setup
+        # Without a fixed limit, the tiles a level in were computed with a higher one
+        renderer.max_iterations = None
+        view = PyramidView(self.width, self.height, 4, (0.0, 0.0))
+        # Line the view up with a 2x2 block of tiles, which together make up one tile a level out
+        view.x, view.y = -2 * TILE_SIZE, -2 * TILE_SIZE
+        self.show(renderer, view)
+
+        # Act
+        view.zoom(-1)
+        result = self.show(renderer, view)
+
+        # Assert
+        assert self.cache.stats["from_children"] == 1
+        assert renderer.view_max_iterations < renderer.max_iterations_for(view.level + 1)
+        assert np.array_equal(result, direct_iterations(view, MANDELBROT, renderer.view_max_iterations))
+
+    def test_showing_the_same_view_again_only_uses_the_cache(self, setup):
+        # Arrange
+        renderer = setup
+        view = PyramidView(self.width, self.height, 3, (-0.5, 0.0))
+        self.show(renderer, view)
+        misses = self.cache.stats["misses"]
+
+        # Act
+        placed = renderer.show(view)
+
+        # Assert
+        assert not renderer.pending
+        assert len(placed) == len(view.tiles())
+        assert np.all(renderer.iterations >= 0)
+        assert self.cache.stats["misses"] == misses
+
+    def test_julia_view_matches_direct_computation(self, setup):
+        # Arrange
+        renderer = setup
+        params = ("julia", -0.8, 0.156)
+        renderer.params = params
+        view = PyramidView(self.width, self.height, 3, (0.1, -0.2))
+
+        # Act
+        result = self.show(renderer, view)
+
+        # Assert
+        assert np.array_equal(result, direct_iterations(view, params, 100))
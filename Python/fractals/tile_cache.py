@@ -0,0 +1,246 @@
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from escape_time import auto_max_iterations, escape_time, viewport
+
+TILE_SIZE = 128
+# Width of the complex plane covered by one tile at zoom level 0. Each level halves it. Keeping every size a power of two
+# means a pixel's point is the same exact double at every level it appears in, so parents can be built from children
+LEVEL_0_WIDTH = 4.0
+# The level at which the whole set fits on an 800x600 screen, and automatic iteration limits start growing
+START_LEVEL = 3
+
+
+def tile_width(level: int) -> float:
+    return LEVEL_0_WIDTH / 2 ** level
+
+
+def pixel_size(level: int) -> float:
+    return tile_width(level) / TILE_SIZE
+
+
+def tile_key(params: tuple, max_iterations: int, level: int, tile_x: int, tile_y: int) -> tuple:
+    # params is ("mandelbrot",) or ("julia", c.real, c.imag)
+    return params, max_iterations, level, tile_x, tile_y
+
+
+def compute_tile(key: tuple) -> tuple[np.ndarray, dict]:
+    # Iteration counts of one tile of the pyramid, indexed [x][y] like the screen, and the iterations saved computing it
+    params, max_iterations, level, tile_x, tile_y = key
+    width = tile_width(level)
+    points = viewport(TILE_SIZE, TILE_SIZE, (tile_x * width, (tile_x + 1) * width), (tile_y * width, (tile_y + 1) * width))
+    stats = {}
+    if params[0] == "mandelbrot":
+        tile = escape_time(points, points, max_iterations, check_bulbs=True, stats=stats)
+    else:
+        tile = escape_time(points, complex(params[1], params[2]), max_iterations, stats=stats)
+    return tile, stats
+
+
+class TileCache:
+    """
+    Iteration-count tiles of a quadtree pyramid, keyed by (fractal params, max_iterations, zoom level, tile x, tile y).
+    The least recently used tiles are dropped once the cache holds more than max_bytes. With a directory, every tile is
+    also saved to disk as it is added, and tiles missing from memory are looked for there before being recomputed.
+    A tile missing at one level is put together from its four children a level further in, when they are all cached.
+    Children computed with a higher iteration limit still match, once their counts are capped at the parent's limit.
+    """
+    def __init__(self, max_bytes: int = 256 * 2 ** 20, directory: str | Path | None = None) -> None:
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.tiles = OrderedDict()
+        self.nbytes = 0
+        self.stats = {"hits": 0, "from_disk": 0, "from_children": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self.tiles
+
+    def path(self, key: tuple) -> Path:
+        params, max_iterations, level, tile_x, tile_y = key
+        return self.directory / ("_".join(map(str, (*params, max_iterations, level, tile_x, tile_y))) + ".npy")
+
+    def get(self, key: tuple, children_max_iterations: int | None = None) -> np.ndarray | None:
+        # The tile for key, or None if it has to be computed. children_max_iterations is the limit tiles a level
+        # further in were computed with, if it differs from this tile's
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            self.stats["hits"] += 1
+            return self.tiles[key]
+
+        if self.directory is not None and self.path(key).exists():
+            self.stats["from_disk"] += 1
+            tile = np.load(self.path(key))
+            self.put(key, tile, save=False)
+            return tile
+
+        tile = self.from_children(key, children_max_iterations)
+        if tile is not None:
+            self.stats["from_children"] += 1
+            self.put(key, tile)
+            return tile
+
+        self.stats["misses"] += 1
+        return None
+
+    def from_children(self, key: tuple, children_max_iterations: int | None = None) -> np.ndarray | None:
+        # Every other pixel of the four tiles a level further in lands exactly on this tile's pixels
+        params, max_iterations, level, tile_x, tile_y = key
+        children_max_iterations = children_max_iterations or max_iterations
+        children = [
+            self.tiles.get(tile_key(params, children_max_iterations, level + 1, 2 * tile_x + dx, 2 * tile_y + dy))
+            for dx in (0, 1) for dy in (0, 1)
+        ]
+        if any(child is None for child in children):
+            return None
+
+        joined = np.block([[children[0], children[1]], [children[2], children[3]]])
+        return np.minimum(joined[::2, ::2], max_iterations)
+
+    def put(self, key: tuple, tile: np.ndarray, save: bool = True) -> None:
+        if key in self.tiles:
+            self.nbytes -= self.tiles.pop(key).nbytes
+        self.tiles[key] = tile
+        self.nbytes += tile.nbytes
+
+        if save and self.directory is not None:
+            np.save(self.path(key), tile)
+
+        while self.nbytes > self.max_bytes and len(self.tiles) > 1:
+            _, evicted = self.tiles.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.stats["evictions"] += 1
+
+
+class PyramidView:
+    """
+    A screen-sized window on to one level of the pyramid, with its top left corner at pixel (x, y) of that level.
+    Pans move by whole pixels and zooms change level, so the view always lines up with the cached tiles.
+    """
+    def __init__(self, width: int, height: int, level: int, centre: tuple[float, float]) -> None:
+        self.width = width
+        self.height = height
+        self.level = level
+        self.x = round(centre[0] / pixel_size(level)) - width // 2
+        self.y = round(centre[1] / pixel_size(level)) - height // 2
+
+    def pan(self, dx: int, dy: int) -> None:
+        self.x += dx
+        self.y += dy
+
+    def zoom(self, levels: int) -> None:
+        # Zoom in (positive) or out (negative) about the middle of the screen
+        centre_x, centre_y = self.x + self.width // 2, self.y + self.height // 2
+        if levels >= 0:
+            centre_x, centre_y = centre_x * 2 ** levels, centre_y * 2 ** levels
+        else:
+            centre_x, centre_y = centre_x // 2 ** -levels, centre_y // 2 ** -levels
+        self.level += levels
+        self.x, self.y = centre_x - self.width // 2, centre_y - self.height // 2
+
+    def tiles(self) -> list[tuple[int, int]]:
+        # (tile x, tile y) of every tile on screen
+        return [
+            (tile_x, tile_y)
+            for tile_x in range(self.x // TILE_SIZE, (self.x + self.width - 1) // TILE_SIZE + 1)
+            for tile_y in range(self.y // TILE_SIZE, (self.y + self.height - 1) // TILE_SIZE + 1)
+        ]
+
+    def place(self, iterations: np.ndarray, tile_x: int, tile_y: int, tile: np.ndarray) -> tuple[int, int, int, int]:
+        # Copy the part of a tile that is on screen into the screen's iterations, returning the (x0, y0, x1, y1) changed
+        left, top = tile_x * TILE_SIZE - self.x, tile_y * TILE_SIZE - self.y
+        x0, y0 = max(left, 0), max(top, 0)
+        x1, y1 = min(left + TILE_SIZE, self.width), min(top + TILE_SIZE, self.height)
+        iterations[x0:x1, y0:y1] = tile[x0 - left:x1 - left, y0 - top:y1 - top]
+        return x0, y0, x1, y1
+
+
+class CachedRenderer:
+    """
+    Shows views of the pyramid, taking tiles from the cache where it can, and computing the rest on its own pool of
+    worker processes, one per core unless told otherwise. show() starts a new view, and finished() hands back the screen
+    areas filled in since the last call. Finished tiles come back from the workers whole, as the cache keeps all of each
+    tile and not just the part on screen.
+    Panning only computes the tiles that have just come on screen, and zooming out reuses the tiles zoomed in on.
+    With max_iterations None, the limit grows with the zoom - see auto_max_iterations().
+    stats holds how many iterations were done and saved for the tiles computed for the current view.
+    """
+    def __init__(self, cache: TileCache, params: tuple, max_iterations: int | None = None,
+                 workers: int | None = None) -> None:
+        self.cache = cache
+        self.params = params
+        self.max_iterations = max_iterations
+        self.view = None
+        self.iterations = None
+        self.pending = {}
+        self.stale = {}
+        self.stats = {}
+
+        # Spawn the workers, as the GL and SDL state of the parent process shouldn't be copied into them
+        self.pool = ProcessPoolExecutor(workers or os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+    def max_iterations_for(self, level: int) -> int:
+        if self.max_iterations is not None:
+            return self.max_iterations
+        return auto_max_iterations(2 ** (level - START_LEVEL))
+
+    @property
+    def view_max_iterations(self) -> int:
+        return self.max_iterations_for(self.view.level)
+
+    def show(self, view: PyramidView) -> list[tuple[int, int, int, int]]:
+        # Fill the screen from the cache straight away, and start computing anything missing. -1 marks pixels still
+        # being computed
+        self.view = view
+        self.iterations = np.full((view.width, view.height), -1, dtype=np.int32)
+        previous, self.pending = self.pending, {}
+        self.stats = {"bulbs": 0, "periodicity": 0, "done": 0}
+
+        placed = []
+        max_iterations = self.max_iterations_for(view.level)
+        for tile_x, tile_y in view.tiles():
+            key = tile_key(self.params, max_iterations, view.level, tile_x, tile_y)
+            tile = self.cache.get(key, self.max_iterations_for(view.level + 1))
+            if tile is not None:
+                placed.append(view.place(self.iterations, tile_x, tile_y, tile))
+            elif key in previous:
+                # Still being computed for the last view
+                self.pending[key] = previous.pop(key)
+            else:
+                self.pending[key] = self.pool.submit(compute_tile, key)
+
+        # Tiles no longer on screen are dropped, unless a worker has already started on them
+        for key, future in previous.items():
+            if not future.cancel():
+                self.stale[key] = future
+        return placed
+
+    def finished(self) -> list[tuple[int, int, int, int]]:
+        for key, future in list(self.stale.items()):
+            if future.done():
+                del self.stale[key]
+                self.cache.put(key, future.result()[0])
+
+        placed = []
+        for key, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[key]
+                tile, stats = future.result()
+                self.cache.put(key, tile)
+                for name, value in stats.items():
+                    self.stats[name] += value
+                placed.append(self.view.place(self.iterations, key[3], key[4], tile))
+        return placed
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
@@ -0,0 +1 @@
+"""Modules shared by the overlapping and tiled versions, which import them as common.<module>"""
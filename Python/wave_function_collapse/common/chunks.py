@@ -0,0 +1,283 @@
+"""
+Unbounded worlds, generated one fixed-size chunk at a time on demand. Shared by both versions, whose chunks.py say how
+to solve and draw a chunk with their own grid.
+
+Each chunk is solved together with a strip of overlap cells along every edge, which reaches into the neighbouring
+chunks that already exist. Those strips are solved again along with the new chunk and written back, and only the ring
+of cells just outside them is pinned to the tiles already there. This gives the solver room to join the new chunk up
+with what is around it, rather than having to match the neighbours' edges exactly. A pin which still can't be
+satisfied is skipped and counted as a seam in the chunk's stats.
+
+Pins on opposite sides of a chunk are the hardest to satisfy, so generate() works in a wavefront which only ever pins
+a chunk to the chunks west, north-west, north and north-east of it (see wavefront). Chunks generated on demand with
+chunk() are pinned to whatever already exists around them.
+
+Only an LRU window of chunks is kept in memory - every chunk is written to disk as soon as it is made or changed, and
+read back when needed.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Set in each worker process by init_worker
+_tile_set = None
+
+
+def init_worker(tile_set) -> None:
+    global _tile_set
+    _tile_set = tile_set
+
+
+def wavefront(chunk_x: int, chunk_y: int) -> int:
+    """
+    The wave of generate() a chunk belongs to. The chunks west, north-west, north and north-east of a chunk are all in
+    earlier waves, and the ones east and south of it in later waves, so no chunk is pinned on opposite sides. Chunks
+    in the same wave are at least two chunks apart across, so they can be solved in parallel.
+    """
+    return chunk_x + 2 * chunk_y
+
+
+def chunk_seed(seed: int, chunk_x: int, chunk_y: int) -> int:
+    """
+    Every chunk has its own seed. A chunk also depends on the chunks which existed around it when it was made, so the
+    same world comes out of the same seed as long as its chunks are generated in the same order.
+    """
+    return hash((seed, chunk_x, chunk_y)) & 0xFFFFFFFF
+
+
+def solve_attempts(new_grid, pin_ring, run, seed: int, max_attempts: int) -> tuple[np.ndarray, dict]:
+    """
+    Solve a chunk, starting again with the next seed until it works or max_attempts run out. new_grid() makes the
+    grid of the chunk and its ring, pin_ring(grid) pins the ring and returns the number of seams, and run(grid) solves
+    it and returns the number of steps taken. Returns the tiles inside the ring and the chunk's stats.
+    """
+    if max_attempts < 1:
+        raise ValueError("max_attempts must be at least 1")
+
+    start = time.perf_counter()
+    for attempt in range(max_attempts):
+        random.seed(seed + attempt)
+        grid = new_grid()
+
+        seams = pin_ring(grid)
+        # Never backtrack into the pinned cells
+        grid.decisions = []
+
+        steps = run(grid)
+        if not grid.failed:
+            break
+
+    stats = {
+        "status": "failed" if grid.failed else "finished",
+        "attempts": attempt + 1,
+        "steps": steps,
+        "seams": seams,
+        "seconds": time.perf_counter() - start,
+    }
+    return grid.tiles[1:-1, 1:-1].copy(), stats
+
+
+def solve_chunk_in_worker(solve_chunk, chunk_size: tuple[int, int], seed: int, ring: np.ndarray, grid_options: dict, max_attempts: int) -> tuple[np.ndarray, dict]:
+    return solve_chunk(_tile_set, chunk_size, seed, ring, grid_options, max_attempts)
+
+
+class ChunkedWorld:
+    """
+    The parts of a chunk world which don't depend on the kind of tile set. Each version sets solve_chunk, which solves
+    one chunk, and adds render().
+    """
+    # solve_chunk(tile_set, chunk_size, seed, ring, grid_options, max_attempts) -> (tiles, stats)
+    solve_chunk = None
+
+    def __init__(self, tile_set, chunk_size: tuple[int, int]=(32, 32), seed: int=0, window: int=64, store_dir: str | None=None, grid_options: dict | None=None, max_attempts: int=5, overlap: int=2):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        # Chunks in the same wave must not reach into each other's overlap, which needs the middle of every chunk left
+        if overlap < 0 or 2 * overlap >= min(chunk_size):
+            raise ValueError("overlap must be at least 0 and less than half the chunk size")
+
+        self.tile_set = tile_set
+        self.chunk_size = tuple(chunk_size)
+        self.seed = seed
+        self.window = window
+        # A restart would wipe the pinned ring along with everything else, so chunks start again with max_attempts instead
+        self.grid_options = dict(grid_options or {}, wrap=False, max_restarts=0)
+        self.max_attempts = max_attempts
+        self.overlap = overlap
+
+        # Every chunk lives on disk, the most recently used ones are also kept in memory
+        self.store_dir = store_dir if store_dir is not None else tempfile.mkdtemp(prefix="wfc_chunks_")
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.loaded = OrderedDict()
+        self.stats = {}
+
+    def chunk_path(self, chunk_x: int, chunk_y: int) -> str:
+        return os.path.join(self.store_dir, f"chunk_{chunk_x}_{chunk_y}.npy")
+
+    def exists(self, chunk_x: int, chunk_y: int) -> bool:
+        return (chunk_x, chunk_y) in self.loaded or os.path.exists(self.chunk_path(chunk_x, chunk_y))
+
+    def chunk(self, chunk_x: int, chunk_y: int) -> np.ndarray:
+        """Tiles of a chunk as [height, width], generating it first if it doesn't exist yet"""
+        key = (chunk_x, chunk_y)
+        if key in self.loaded:
+            self.loaded.move_to_end(key)
+            return self.loaded[key]
+
+        if os.path.exists(self.chunk_path(chunk_x, chunk_y)):
+            tiles = np.load(self.chunk_path(chunk_x, chunk_y))
+            self.remember(key, tiles)
+            return tiles
+
+        self.place(key, *self.solve_chunk(self.tile_set, *self.solve_arguments(chunk_x, chunk_y)))
+        return self.loaded[key]
+
+    def store(self, chunk_x: int, chunk_y: int, tiles: np.ndarray) -> None:
+        # Write to a temporary file and rename it, so a chunk on disk is always complete
+        path = self.chunk_path(chunk_x, chunk_y)
+        with open(path + ".tmp", "wb") as chunk_file:
+            np.save(chunk_file, tiles)
+        os.replace(path + ".tmp", path)
+
+    def remember(self, key: tuple[int, int], tiles: np.ndarray) -> None:
+        self.loaded[key] = tiles
+        self.loaded.move_to_end(key)
+        while len(self.loaded) > self.window:
+            self.loaded.popitem(last=False)
+
+    def solved_area(self, chunk_x: int, chunk_y: int) -> tuple[int, int, int, int]:
+        """The cells solved along with a chunk - the chunk and its overlap strips - as (x, y, width, height) in the world"""
+        chunk_width, chunk_height = self.chunk_size
+        return (
+            chunk_x * chunk_width - self.overlap, chunk_y * chunk_height - self.overlap,
+            chunk_width + 2 * self.overlap, chunk_height + 2 * self.overlap,
+        )
+
+    def ring(self, chunk_x: int, chunk_y: int) -> np.ndarray:
+        """The existing cells just outside the solved area of a chunk, which it is pinned to, with -1 everywhere else"""
+        x_index, y_index, width, height = self.solved_area(chunk_x, chunk_y)
+        ring = self.existing_tiles(x_index - 1, y_index - 1, width + 2, height + 2)
+        ring[1:-1, 1:-1] = -1
+        return ring
+
+    def solve_arguments(self, chunk_x: int, chunk_y: int) -> tuple:
+        """Everything solve_chunk needs after the tile set, for one chunk"""
+        _, _, width, height = self.solved_area(chunk_x, chunk_y)
+        return (width, height), chunk_seed(self.seed, chunk_x, chunk_y), self.ring(chunk_x, chunk_y), self.grid_options, self.max_attempts
+
+    def place(self, key: tuple[int, int], tiles: np.ndarray, stats: dict) -> None:
+        """
+        Store a solved chunk. tiles covers its solved area, and unless the chunk failed the overlap strips are written
+        back to the neighbouring chunks they belong to.
+        """
+        chunk_width, chunk_height = self.chunk_size
+        self.stats[key] = stats
+        own = tiles[self.overlap:self.overlap + chunk_height, self.overlap:self.overlap + chunk_width].copy()
+        self.store(*key, own)
+
+        x_index, y_index, width, height = self.solved_area(*key)
+        for chunk_x, chunk_y in self.chunks_covering(x_index, y_index, width, height):
+            if stats["status"] == "failed" or (chunk_x, chunk_y) == key or not self.exists(chunk_x, chunk_y):
+                continue
+
+            neighbour = self.chunk(chunk_x, chunk_y).copy()
+            chunk_slices, area_slices = self.overlap_slices(chunk_x, chunk_y, x_index, y_index, width, height)
+            neighbour[chunk_slices] = tiles[area_slices]
+            self.store(chunk_x, chunk_y, neighbour)
+            self.remember((chunk_x, chunk_y), neighbour)
+
+        # Remembered last, so that the new chunk is still in memory even with a small window
+        self.remember(key, own)
+
+    def chunks_covering(self, x_index: int, y_index: int, width: int, height: int) -> list[tuple[int, int]]:
+        chunk_width, chunk_height = self.chunk_size
+        return [
+            (chunk_x, chunk_y)
+            for chunk_y in range(y_index // chunk_height, (y_index + height - 1) // chunk_height + 1)
+            for chunk_x in range(x_index // chunk_width, (x_index + width - 1) // chunk_width + 1)
+        ]
+
+    def overlap_slices(self, chunk_x: int, chunk_y: int, x_index: int, y_index: int, width: int, height: int) -> tuple:
+        """Where a chunk and a rectangle of the world overlap, as slices of the chunk and slices of the rectangle"""
+        chunk_width, chunk_height = self.chunk_size
+        left, top = max(x_index, chunk_x * chunk_width), max(y_index, chunk_y * chunk_height)
+        right = min(x_index + width, (chunk_x + 1) * chunk_width)
+        bottom = min(y_index + height, (chunk_y + 1) * chunk_height)
+        return (
+            (slice(top - chunk_y * chunk_height, bottom - chunk_y * chunk_height), slice(left - chunk_x * chunk_width, right - chunk_x * chunk_width)),
+            (slice(top - y_index, bottom - y_index), slice(left - x_index, right - x_index)),
+        )
+
+    def existing_tiles(self, x_index: int, y_index: int, width: int, height: int) -> np.ndarray:
+        """Tiles of a rectangle of the world in cells, with -1 wherever the chunk hasn't been generated"""
+        region = np.full((height, width), -1, dtype=np.int32)
+        for chunk_x, chunk_y in self.chunks_covering(x_index, y_index, width, height):
+            if self.exists(chunk_x, chunk_y):
+                chunk_slices, region_slices = self.overlap_slices(chunk_x, chunk_y, x_index, y_index, width, height)
+                region[region_slices] = self.chunk(chunk_x, chunk_y)[chunk_slices]
+        return region
+
+    def generate(self, chunks: list[tuple[int, int]], workers: int | None=None) -> None:
+        """
+        Generate many chunks at once across a process pool, one wave at a time (see wavefront), so every chunk is pinned
+        only to the chunks west and north of it which came in earlier waves.
+        """
+        todo = [key for key in dict.fromkeys(map(tuple, chunks)) if not self.exists(*key)]
+        if not todo:
+            return
+
+        # Spawn rather than fork the workers, as forking after Numba has started its parallel threads can deadlock
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=spawn, initializer=init_worker, initargs=(self.tile_set,)) as pool:
+            for wave in sorted(set(wavefront(*key) for key in todo)):
+                futures = {
+                    key: pool.submit(solve_chunk_in_worker, self.solve_chunk, *self.solve_arguments(*key))
+                    for key in todo if wavefront(*key) == wave
+                }
+                for key, future in futures.items():
+                    self.place(key, *future.result())
+
+    def tiles(self, x_index: int, y_index: int, width: int, height: int) -> np.ndarray:
+        """Tiles of any rectangle of the world in cells, generating the chunks it covers as needed"""
+        # Generate them all before reading any, as each new chunk rewrites the edges of the ones next to it
+        for chunk_x, chunk_y in self.chunks_covering(x_index, y_index, width, height):
+            self.chunk(chunk_x, chunk_y)
+        return self.existing_tiles(x_index, y_index, width, height)
+
+
+def add_world_arguments(parser: argparse.ArgumentParser, chunk_size: tuple[int, int], cells: str) -> None:
+    """The arguments both versions take, with chunk sizes counted in cells (or whatever the version calls them)"""
+    parser.add_argument("--chunks", type=int, nargs=2, default=(4, 4), metavar=("WIDTH", "HEIGHT"), help="world size in chunks")
+    parser.add_argument("--chunk-size", type=int, nargs=2, default=chunk_size, metavar=("WIDTH", "HEIGHT"), help=f"chunk size in {cells}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--window", type=int, default=64, help="number of chunks kept in memory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--store", default=None, help="folder to keep the chunks in (a temporary folder by default)")
+    parser.add_argument("--output", default="world.png")
+    parser.add_argument("--max-backtrack-depth", type=int, default=None)
+    parser.add_argument("--max-attempts", type=int, default=5, help="attempts at each chunk before giving up on it")
+    parser.add_argument("--overlap", type=int, default=2, help=f"{cells} of each neighbouring chunk solved again with a new chunk")
+
+
+def generate_world(world: ChunkedWorld, args: argparse.Namespace) -> None:
+    """Generate the world the arguments ask for, and save it as a single image"""
+    start = time.perf_counter()
+    chunks_x, chunks_y = args.chunks
+    world.generate([(x, y) for y in range(chunks_y) for x in range(chunks_x)], workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    width, height = chunks_x * args.chunk_size[0], chunks_y * args.chunk_size[1]
+    Image.fromarray(world.render(0, 0, width, height)).save(args.output)
+
+    failed = sum(stats["status"] == "failed" for stats in world.stats.values())
+    seams = sum(stats["seams"] for stats in world.stats.values())
+    print(f"{len(world.stats) - failed}/{len(world.stats)} chunks finished with {seams} seam(s) in {elapsed:.2f}s, written to {args.output}")
+
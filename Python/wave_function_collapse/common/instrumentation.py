@@ -0,0 +1,114 @@
+"""
+Tracing shared by both versions - Tracer records timed phases and counters and exports them as JSON lines or as a
+Chrome trace, and trace_phases() wraps the phases of one Grid instance. What each version counts in its own grid is up
+to its instrumentation.instrument().
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.events = []
+        self.start = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+    def span(self, name: str, start_ns: int, end_ns: int, **args) -> None:
+        """A timed phase, with times in nanoseconds from time.perf_counter_ns"""
+        self.events.append({"name": name, "ts": (start_ns - self.start) / 1000, "dur": (end_ns - start_ns) / 1000, "args": args})
+
+    def counter(self, name: str, **values) -> None:
+        """Values sampled at this moment, such as memory use"""
+        self.events.append({"name": name, "ts": (time.perf_counter_ns() - self.start) / 1000, "values": values})
+
+    def summary(self) -> dict:
+        """Count and total seconds of each phase, with the totals of their counts and flags"""
+        summary = defaultdict(lambda: defaultdict(float))
+        for event in self.events:
+            if "dur" not in event:
+                continue
+            phase = summary[event["name"]]
+            phase["count"] += 1
+            phase["seconds"] += event["dur"] / 1e6
+            for key, value in event["args"].items():
+                if isinstance(value, (int, float)):
+                    phase[key] += value
+        return {name: dict(phase) for name, phase in summary.items()}
+
+    def write_jsonl(self, path: str) -> None:
+        with open(path, "w") as trace_file:
+            for event in self.events:
+                trace_file.write(json.dumps(event) + "\n")
+
+    def write_chrome_trace(self, path: str) -> None:
+        trace_events = []
+        for event in self.events:
+            if "dur" in event:
+                trace_events.append(
+                    {"name": event["name"], "ph": "X", "ts": event["ts"], "dur": event["dur"], "pid": self.pid, "tid": self.tid, "args": event["args"]}
+                )
+            else:
+                trace_events.append({"name": event["name"], "ph": "C", "ts": event["ts"], "pid": self.pid, "args": event["values"]})
+
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, trace_file)
+
+    def write(self, path: str) -> None:
+        """Chrome trace for a .json path, JSON lines for anything else"""
+        if path.endswith(".json"):
+            self.write_chrome_trace(path)
+        else:
+            self.write_jsonl(path)
+
+
+def trace_phases(grid, tracer: Tracer, position, phases: dict) -> None:
+    """
+    Wrap methods of grid so that every call to them is recorded by tracer. phases maps a method name to its span name
+    and describe(before, result), which turns what position() returned before the call, and the method's result, into
+    the args of the span. phases must include "undo".
+    backtrack and get_lowest_entropy_cell are always traced as well. The depth of a backtrack is the number of undos it
+    made.
+    The wrappers are set on the instance, so only calls made through it, as self.method(), are traced. Both grids call
+    their phases that way; a call through the class, such as super().undo() or Grid.undo(grid), would not be traced.
+    """
+    phases = dict(phases)
+    undos = [0]
+
+    def traced(method, name, describe):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            before = position()
+            start = time.perf_counter_ns()
+            result = method(*args, **kwargs)
+            tracer.span(name, start, time.perf_counter_ns(), **describe(before, result))
+            return result
+        return wrapper
+
+    undo_name, describe_undo = phases.pop("undo")
+
+    def undone(before, result):
+        undos[0] += 1
+        return describe_undo(before, result)
+
+    def backtracked(before, result):
+        # Every decision unwound is one undo, so the depth is the number of undos since this backtrack started
+        return {"depth": undos[0] - backtracked.undos, "restarted": grid.restarts > backtracked.restarts, "failed": grid.failed}
+
+    backtrack = grid.backtrack
+
+    @functools.wraps(backtrack)
+    def backtrack_from_here():
+        backtracked.undos = undos[0]
+        backtracked.restarts = grid.restarts
+        return backtrack()
+
+    grid.undo = traced(grid.undo, undo_name, undone)
+    grid.backtrack = traced(backtrack_from_here, "backtrack", backtracked)
+    grid.get_lowest_entropy_cell = traced(grid.get_lowest_entropy_cell, "select", lambda before, result: {})
+    for method_name, (name, describe) in phases.items():
+        setattr(grid, method_name, traced(getattr(grid, method_name), name, describe))
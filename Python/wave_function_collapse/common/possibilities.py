@@ -0,0 +1,136 @@
+import numpy as np
+
+WORD_BITS = 64
+
+
+def num_words(num_bits: int) -> int:
+    """Number of uint64 words needed to hold num_bits flags"""
+    return (num_bits + WORD_BITS - 1) // WORD_BITS
+
+
+def pack_bits(flags: np.ndarray) -> np.ndarray:
+    """
+    Packs a boolean array along its last axis into uint64 words.
+    Bit t of the flags ends up in word t // 64 at bit position t % 64.
+    """
+    flags = np.asarray(flags, dtype=np.bool_)
+    words = num_words(flags.shape[-1])
+    packed_bytes = np.packbits(flags, axis=-1, bitorder="little")
+    padding = words * 8 - packed_bytes.shape[-1]
+    if padding:
+        pad_width = [(0, 0)] * (packed_bytes.ndim - 1) + [(0, padding)]
+        packed_bytes = np.pad(packed_bytes, pad_width)
+    return np.ascontiguousarray(packed_bytes).view("<u8").astype(np.uint64, copy=False)
+
+
+def unpack_bits(words: np.ndarray, num_bits: int) -> np.ndarray:
+    """Inverse of pack_bits, returns a boolean array with num_bits entries along the last axis"""
+    as_bytes = np.ascontiguousarray(words).astype("<u8", copy=False).view(np.uint8)
+    return np.unpackbits(as_bytes, axis=-1, count=num_bits, bitorder="little").astype(np.bool_)
+
+
+if hasattr(np, "bitwise_count"):
+    def popcount(words: np.ndarray) -> np.ndarray:
+        """Number of set bits along the last axis"""
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+else:
+    # numpy < 2.0 has no popcount ufunc, so fall back to a byte lookup table
+    _BYTE_COUNTS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(words: np.ndarray) -> np.ndarray:
+        """Number of set bits along the last axis"""
+        as_bytes = np.ascontiguousarray(words).view(np.uint8)
+        return _BYTE_COUNTS[as_bytes].sum(axis=-1, dtype=np.int64)
+
+
+class Wave:
+    """
+    The set of tiles still possible in every cell of a grid.
+    Stored either as one bool per tile, or bit-packed into uint64 words (8x smaller) with popcount for the entropy counts.
+    Masks passed to constrain() and union() must use the same storage as the wave - see pack_mask().
+    """
+    def __init__(self, shape: tuple[int, int], num_tiles: int, packed: bool=False) -> None:
+        self.shape = shape
+        self.num_tiles = num_tiles
+        self.packed = packed
+        self.data = self.pack_mask(np.ones(shape + (num_tiles,), dtype=np.bool_))
+
+    def copy(self) -> "Wave":
+        new_wave = Wave.__new__(Wave)  # Create instance without calling __init__
+        new_wave.shape = self.shape
+        new_wave.num_tiles = self.num_tiles
+        new_wave.packed = self.packed
+        new_wave.data = self.data.copy()
+        return new_wave
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def pack_mask(self, flags: np.ndarray) -> np.ndarray:
+        """Convert a boolean tile mask (last axis = tiles) into this wave's storage format"""
+        if self.packed:
+            return pack_bits(flags)
+        return np.asarray(flags, dtype=np.bool_)
+
+    def to_bool(self) -> np.ndarray:
+        """Boolean view of the whole wave - shape [height, width, num_tiles]"""
+        if self.packed:
+            return unpack_bits(self.data, self.num_tiles)
+        return self.data
+
+    def possible(self, y_index: int, x_index: int) -> np.ndarray:
+        if self.packed:
+            return unpack_bits(self.data[y_index, x_index], self.num_tiles)
+        return self.data[y_index, x_index]
+
+    def tile_ids(self, y_index: int, x_index: int) -> np.ndarray:
+        return np.flatnonzero(self.possible(y_index, x_index))
+
+    def counts(self) -> np.ndarray:
+        """Number of possible tiles in every cell"""
+        if self.packed:
+            return popcount(self.data)
+        return self.data.sum(axis=-1, dtype=np.int64)
+
+    def count(self, y_index: int, x_index: int) -> int:
+        if self.packed:
+            return int(popcount(self.data[y_index, x_index]))
+        return int(np.count_nonzero(self.data[y_index, x_index]))
+
+    def collapse(self, y_index: int, x_index: int, tile_id: int) -> None:
+        """Remove every possibility except tile_id"""
+        self.data[y_index, x_index] = 0
+        if self.packed:
+            self.data[y_index, x_index, tile_id // WORD_BITS] = np.uint64(1) << np.uint64(tile_id % WORD_BITS)
+        else:
+            self.data[y_index, x_index, tile_id] = True
+
+    def remove(self, y_index: int, x_index: int, tile_id: int) -> None:
+        if self.packed:
+            self.data[y_index, x_index, tile_id // WORD_BITS] &= ~(np.uint64(1) << np.uint64(tile_id % WORD_BITS))
+        else:
+            self.data[y_index, x_index, tile_id] = False
+
+    def mask(self, y_index: int, x_index: int) -> np.ndarray:
+        """Copy of the cell's possibilities, in the storage format of the wave"""
+        return self.data[y_index, x_index].copy()
+
+    def restore(self, y_index: int, x_index: int, mask: np.ndarray) -> None:
+        """OR mask back into the cell, undoing the removal of those possibilities"""
+        self.data[y_index, x_index] |= mask
+
+    def union(self, masks: np.ndarray) -> np.ndarray:
+        """OR together a stack of masks (first axis)"""
+        if self.packed:
+            return np.bitwise_or.reduce(masks, axis=0)
+        return np.any(masks, axis=0)
+
+    def constrain(self, y_index: int, x_index: int, mask: np.ndarray) -> bool:
+        """AND the cell with mask. Returns True if anything was removed"""
+        before = self.data[y_index, x_index]
+        after = before & mask
+        if np.array_equal(before, after):
+            return False
+        self.data[y_index, x_index] = after
+        return True
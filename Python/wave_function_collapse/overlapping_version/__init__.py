@@ -0,0 +1 @@
+"""Overlapping model - tiles are the overlapping patterns of a sample image"""
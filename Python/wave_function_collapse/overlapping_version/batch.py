@@ -0,0 +1,153 @@
+"""
+Headless batch generation, without a pygame window or frame limit.
+
+Example - 100 images of 40x30 cells from seeds 0-99, on every core, giving up on any image after 10 seconds:
+    python -m overlapping_version.batch samples\\City.png --count 100 --size 40 30 --seed 0 --budget 10 --output out
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .grid import Grid
+from .instrumentation import Tracer, instrument
+from .tile_set import TileSet
+
+# Set in each worker process by init_worker, so the tile set is only built once per process
+_tile_set = None
+
+
+def init_worker(sample: str, tile_set_options: dict, cache_dir: str) -> None:
+    global _tile_set
+    _tile_set = TileSet(sample, **tile_set_options, cache_dir=cache_dir)
+
+
+def render(grid: Grid) -> np.ndarray:
+    """One pixel per cell - the top-left pixel of the collapsed tile, or the average colour while uncollapsed"""
+    return np.clip(np.rint(grid.average_colours()), 0, 255).astype(np.uint8)
+
+
+def generate(seed: int, size: tuple[int, int], budget: float, output: str, grid_options: dict, trace: str | None=None) -> dict:
+    """Generate a single image. Everything random is drawn from the seed, so the same seed gives the same image"""
+    random.seed(seed)
+    start = time.perf_counter()
+    grid = Grid(size, size, _tile_set, **grid_options)
+    tracer = instrument(grid, Tracer()) if trace else None
+
+    steps = 0
+    timed_out = False
+    while not grid.finished:
+        if budget is not None and time.perf_counter() - start > budget:
+            timed_out = True
+            break
+        grid.step()
+        steps += 1
+
+    filename = os.path.join(output, f"wfc_{seed}.png")
+    Image.fromarray(render(grid)).save(filename)
+
+    result = {
+        "seed": seed,
+        "file": filename,
+        "status": "timeout" if timed_out else "failed" if grid.failed else "finished",
+        "steps": steps,
+        "restarts": grid.restarts,
+        "seconds": time.perf_counter() - start,
+    }
+    if tracer is not None:
+        result["trace"] = os.path.join(output, f"wfc_{seed}.{'json' if trace == 'chrome' else 'jsonl'}")
+        result["phases"] = tracer.summary()
+        tracer.write(result["trace"])
+    return result
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate wave function collapse images from a sample PNG, without a window.")
+    parser.add_argument("sample", help="sample PNG to take the tiles from")
+    parser.add_argument("--count", type=int, default=1, help="number of images to generate")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first image, the others follow on from it")
+    parser.add_argument("--seeds", type=int, nargs="+", help="explicit seeds, one per image (overrides --count and --seed)")
+    parser.add_argument("--size", type=int, nargs=2, default=(40, 30), metavar=("WIDTH", "HEIGHT"), help="output size in cells")
+    parser.add_argument("--budget", type=float, default=None, help="wall-clock seconds allowed per image")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--output", default="output", help="folder for the PNGs and stats.json")
+    parser.add_argument("--kernel-size", type=int, default=3)
+    parser.add_argument("--rotate", action="store_true", help="include rotated kernels")
+    parser.add_argument("--flip", action="store_true", help="include flipped kernels")
+    parser.add_argument(
+        "--adjacency", choices=["auto", "dense", "sparse"], default="auto",
+        help="adjacency rule storage - auto picks sparse CSR rules when few tile pairs are compatible"
+    )
+    parser.add_argument("--cache-dir", default=".wfc_cache", help="folder to cache the tile set rule tables in")
+    parser.add_argument("--wrap", action="store_true")
+    parser.add_argument("--packed", action="store_true", help="bit-pack the wave")
+    parser.add_argument("--propagator", choices=["ac4", "overlap"], default="ac4")
+    parser.add_argument("--max-backtrack-depth", type=int, default=None)
+    parser.add_argument("--max-restarts", type=int, default=0)
+    parser.add_argument(
+        "--trace", choices=["jsonl", "chrome"], default=None,
+        help="write a trace of every solver phase next to each image, as JSON lines or in Chrome trace format"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    seeds = args.seeds if args.seeds else list(range(args.seed, args.seed + args.count))
+    size = tuple(args.size)
+    os.makedirs(args.output, exist_ok=True)
+
+    tile_set_options = dict(
+        kernel_size=args.kernel_size,
+        include_rotated_kernels=args.rotate,
+        include_flipped_kernels=args.flip,
+        sparse_adjacencies={"auto": None, "dense": False, "sparse": True}[args.adjacency],
+    )
+    # Build the tile set once up front, so the workers all load it from the cache rather than racing to build it
+    TileSet(args.sample, **tile_set_options, cache_dir=args.cache_dir)
+    grid_options = dict(
+        wrap=args.wrap,
+        packed=args.packed,
+        propagator=args.propagator,
+        max_backtrack_depth=args.max_backtrack_depth,
+        max_restarts=args.max_restarts,
+    )
+
+    start = time.perf_counter()
+    # Spawn rather than fork the workers, as forking after Numba has started its parallel threads can deadlock
+    spawn = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        args.workers, mp_context=spawn, initializer=init_worker, initargs=(args.sample, tile_set_options, args.cache_dir)
+    ) as pool:
+        futures = [pool.submit(generate, seed, size, args.budget, args.output, grid_options, args.trace) for seed in seeds]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    stats = {
+        "sample": args.sample,
+        "size": size,
+        "tile_set": tile_set_options,
+        "grid": grid_options,
+        "budget": args.budget,
+        "workers": args.workers,
+        "seconds": elapsed,
+        "images_per_second": len(results) / elapsed,
+        "finished": sum(result["status"] == "finished" for result in results),
+        "failed": sum(result["status"] == "failed" for result in results),
+        "timeout": sum(result["status"] == "timeout" for result in results),
+        "images": results,
+    }
+    with open(os.path.join(args.output, "stats.json"), "w") as stats_file:
+        json.dump(stats, stats_file, indent=2)
+
+    print(f"{stats['finished']}/{len(results)} images finished in {elapsed:.2f}s, written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Benchmark suite - times building the tile set and its rules, setting up the enabler counts, and full solves (including
+ones which backtrack a lot), across several grid sizes and pattern counts. Samples are generated from fixed seeds and
+every solve is seeded, so two runs of the same suite do the same work.
+
+Results are written as JSON. Given the results of an earlier run as a baseline, any operation whose median time has
+grown by more than the threshold is reported as a regression, and the exit status is 1.
+
+Example - record a baseline, then check a later version against it:
+    python -m overlapping_version.benchmark --output baseline.json
+    python -m overlapping_version.benchmark --output latest.json --baseline baseline.json --threshold 1.25
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from .grid import Grid
+from .helpers import Adjacencies, EnablerCounts, Frequencies
+from .tile_set import TileSet
+
+# name: (kind, size in pixels, number of colours, kernel size). Between them they cover about 60 to 230 patterns
+SAMPLES = {
+    "noise-8": ("noise", 8, 2, 3),
+    "blocks-16": ("blocks", 16, 3, 3),
+    "blocks-32": ("blocks", 32, 4, 3),
+    "maze-16": ("maze", 16, 3, 4),
+}
+# The maze sample with a larger kernel paints itself into corners far more often than the others, so its solves
+# exercise backtracking
+BACKTRACKING_SAMPLE = "maze-16"
+BACKTRACKING_OPTIONS = {"max_backtrack_depth": 8, "max_restarts": 5}
+
+SUITES = {
+    "quick": {"grid_sizes": [(16, 16), (32, 32)], "seeds": [0, 1, 2], "repeats": 3},
+    "full": {"grid_sizes": [(16, 16), (32, 32), (64, 64)], "seeds": [0, 1, 2, 3, 4], "repeats": 5},
+}
+
+
+def synthetic_sample(kind: str, size: int, colours: int, seed: int=0) -> np.ndarray:
+    """
+    A size x size RGB sample drawn from a fixed seed.
+    noise - every pixel a random colour, so almost every pattern is unique and only fits one way
+    blocks - overlapping rectangles on a plain background, with large areas of a few patterns
+    maze - walls every 4 pixels with a gap in each, which only fit together in a few ways
+    """
+    rng = np.random.default_rng(seed)
+    palette = rng.integers(0, 256, (colours, 3), dtype=np.uint8)
+
+    if kind == "noise":
+        indices = rng.integers(0, colours, (size, size))
+    elif kind == "blocks":
+        indices = np.zeros((size, size), dtype=np.int64)
+        for _ in range(size // 2):
+            y, x = rng.integers(0, size, 2)
+            height, width = rng.integers(2, max(3, size // 3), 2)
+            indices[y:y + height, x:x + width] = rng.integers(1, colours)
+    elif kind == "maze":
+        indices = np.zeros((size, size), dtype=np.int64)
+        indices[::4, :] = 1
+        indices[:, ::4] = 1
+        for y in range(0, size, 4):
+            for x in range(0, size, 4):
+                indices[y + rng.integers(1, 4), x] = 0 if rng.random() < 0.5 else 2
+                indices[y, x + rng.integers(1, 4)] = 0 if rng.random() < 0.5 else 2
+    else:
+        raise ValueError(f"unknown sample kind '{kind}'")
+
+    return palette[indices]
+
+
+def measure(function, repeats: int) -> list[float]:
+    """Wall-clock seconds of each of repeats calls"""
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def solve(tile_set: TileSet, size: tuple[int, int], seed: int, grid_options: dict) -> dict:
+    """Run one seeded grid to the end, counting its steps and backtracks"""
+    random.seed(seed)
+    start = time.perf_counter()
+    grid = Grid(size, size, tile_set, **grid_options)
+
+    backtracks = 0
+    backtrack = grid.backtrack
+
+    def counted_backtrack():
+        nonlocal backtracks
+        backtracks += 1
+        return backtrack()
+
+    grid.backtrack = counted_backtrack
+
+    steps = 0
+    while not grid.finished:
+        grid.step()
+        steps += 1
+
+    return {
+        "seconds": time.perf_counter() - start,
+        "steps": steps,
+        "backtracks": backtracks,
+        "restarts": grid.restarts,
+        "failed": grid.failed,
+    }
+
+
+def result(operation: str, case: str, seconds: list[float], **details) -> dict:
+    return {
+        "operation": operation,
+        "case": case,
+        "repeats": len(seconds),
+        "min": min(seconds),
+        "median": statistics.median(seconds),
+        "mean": statistics.fmean(seconds),
+        **details,
+    }
+
+
+def run_suite(suite: dict, samples: dict, folder: str, log=print) -> list[dict]:
+    results = []
+    for name, (kind, size, colours, kernel_size) in samples.items():
+        path = os.path.join(folder, f"{name}.png")
+        Image.fromarray(synthetic_sample(kind, size, colours)).save(path)
+
+        seconds = measure(lambda: TileSet(path, kernel_size=kernel_size), suite["repeats"])
+        tile_set = TileSet(path, kernel_size=kernel_size)
+        patterns = len(tile_set.tiles)
+        results.append(result("tile_set", name, seconds, patterns=patterns))
+        results.append(result("adjacencies", name, measure(lambda: Adjacencies(tile_set.tiles), suite["repeats"]), patterns=patterns))
+        # The tile set's own counts come out of deduplicating the windows, so count every window of the sample instead
+        windows = list(TileSet.extract_windows(tile_set.pixels, kernel_size))
+        results.append(result("frequencies", name, measure(lambda: Frequencies(windows), suite["repeats"]), patterns=patterns))
+        log(f"{name}: {patterns} patterns")
+
+        # Numba compiles the kernels on first use, so solve a small grid before anything is timed
+        solve(tile_set, (4, 4), 0, {})
+
+        for grid_size in suite["grid_sizes"]:
+            case = f"{name} {grid_size[0]}x{grid_size[1]}"
+            seconds = measure(lambda: EnablerCounts(grid_size, patterns, tile_set.adjacencies), suite["repeats"])
+            results.append(result("enabler_counts", case, seconds, patterns=patterns))
+
+            # The depth and restart limits stop an unlucky seed from backtracking for minutes
+            operation, grid_options = ("backtracking_solve", BACKTRACKING_OPTIONS) if name == BACKTRACKING_SAMPLE else ("solve", {})
+            runs = [solve(tile_set, grid_size, seed, grid_options) for seed in suite["seeds"]]
+            results.append(result(
+                operation, case, [run["seconds"] for run in runs], patterns=patterns, seeds=suite["seeds"],
+                steps=sum(run["steps"] for run in runs), backtracks=sum(run["backtracks"] for run in runs),
+                restarts=sum(run["restarts"] for run in runs), failed=sum(run["failed"] for run in runs),
+            ))
+            log(f"  {operation} {case}: {statistics.median(run['seconds'] for run in runs):.3f}s median")
+
+    return results
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float, min_seconds: float=0.001) -> list[dict]:
+    """
+    Operations whose median time is more than threshold times their median in the baseline. Operations faster than
+    min_seconds in both are left out, as timer noise alone can double them
+    """
+    baseline_medians = {(entry["operation"], entry["case"]): entry["median"] for entry in baseline}
+    regressions = []
+    for entry in results:
+        before = baseline_medians.get((entry["operation"], entry["case"]))
+        if before is None or max(before, entry["median"]) < min_seconds:
+            continue
+        if entry["median"] > before * threshold:
+            regressions.append({"operation": entry["operation"], "case": entry["case"], "baseline": before, "median": entry["median"], "ratio": entry["median"] / before})
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark tile set construction, rule building and solving.")
+    parser.add_argument("--suite", choices=list(SUITES), default="quick")
+    parser.add_argument("--samples", nargs="+", choices=list(SAMPLES), default=list(SAMPLES), help="samples to benchmark")
+    parser.add_argument("--output", default="benchmark.json", help="file to write the results to")
+    parser.add_argument("--baseline", default=None, help="results of an earlier run to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown against the baseline counted as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.001, help="operations faster than this are never counted as regressions")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    suite = SUITES[args.suite]
+
+    with tempfile.TemporaryDirectory() as folder:
+        results = run_suite(suite, {name: SAMPLES[name] for name in args.samples}, folder)
+
+    report = {
+        "suite": args.suite,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file)["results"], args.threshold, args.min_seconds)
+        report["baseline"] = args.baseline
+        report["threshold"] = args.threshold
+        report["regressions"] = regressions
+
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    print(f"{'operation':<20} {'case':<24} {'median':>10} {'min':>10}")
+    for entry in results:
+        print(f"{entry['operation']:<20} {entry['case']:<24} {entry['median']:>9.4f}s {entry['min']:>9.4f}s")
+    print(f"Results written to {args.output}")
+
+    if regressions:
+        for regression in regressions:
+            print(f"REGRESSION {regression['operation']} {regression['case']}: {regression['baseline']:.4f}s -> {regression['median']:.4f}s ({regression['ratio']:.2f}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
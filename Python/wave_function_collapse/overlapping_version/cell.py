@@ -3,53 +3,46 @@ import pygame
 
 
 class Cell:
-    def __init__(
-        self, x_pos: int, y_pos: int, cell_size: int, total_number_of_tiles: int
-    ) -> None:
-        self.x_pos = x_pos
-        self.y_pos = y_pos
-        self.width = cell_size
-        self.height = cell_size
-        self.possible = np.full(total_number_of_tiles, True, dtype=np.bool_)
-        self.tile = None
-        self.is_collapsed = False
-        self.recursion_checked = False
+    """
+    Thin view onto a single position of a Grid.
+    All solver state lives in the Grid's arrays - this class only exists to make drawing and debugging convenient.
+    """
+    def __init__(self, grid, x_index: int, y_index: int) -> None:
+        self.grid = grid
+        self.x_index = x_index
+        self.y_index = y_index
+        self.x_pos = x_index * grid.cell_size
+        self.y_pos = y_index * grid.cell_size
+        self.width = grid.cell_size
+        self.height = grid.cell_size
 
-    def copy(self):
-        """Create a fast copy of this cell"""
-        # Create new cell with same position and size
-        new_cell = Cell.__new__(Cell)  # Create instance without calling __init__
+    @property
+    def possible(self) -> np.ndarray:
+        return self.grid.wave.possible(self.y_index, self.x_index)
 
-        # Copy all attributes efficiently
-        new_cell.x_pos = self.x_pos
-        new_cell.y_pos = self.y_pos
-        new_cell.width = self.width
-        new_cell.height = self.height
-        new_cell.is_collapsed = self.is_collapsed
-        new_cell.recursion_checked = self.recursion_checked
+    @property
+    def is_collapsed(self) -> bool:
+        return bool(self.grid.collapsed[self.y_index, self.x_index])
 
-        # Copy numpy array efficiently
-        new_cell.possible = self.possible.copy()
+    @property
+    def tile(self) -> np.ndarray | None:
+        tile_id = self.grid.tiles[self.y_index, self.x_index]
+        if tile_id < 0:
+            return None
+        return self.grid.tile_set.tiles[tile_id]
 
-        # Handle tile reference (shallow copy is usually sufficient for tiles)
-        new_cell.tile = self.tile  # Shallow copy - tiles are typically immutable
-
-        return new_cell
-
-    def set_tile(self, tile: np.ndarray) -> None:
-        self.tile = tile
-
-    def get_tile(self) -> np.ndarray:
+    def get_tile(self) -> np.ndarray | None:
         return self.tile
 
     def draw(self, screen: pygame.Surface, average_colour=None) -> None:
-        if self.tile is None:
+        tile = self.tile
+        if tile is None:
             # Average colour of top-left pixel of all possible tiles
             pygame.draw.rect(
                 screen, average_colour, (self.x_pos, self.y_pos, self.width, self.height)
             )
         else:
-            blit_array = np.transpose(self.tile, (1, 0, 2))
+            blit_array = np.transpose(tile, (1, 0, 2))
             # Top-left pixel of 3x3 tile
             pygame.draw.rect(
                 screen,
@@ -57,12 +50,29 @@ class Cell:
                 (self.x_pos, self.y_pos, self.width, self.height),
             )
 
-    def reset(self):
-        """Reset cell to initial uncollapsed state"""
-        self.possible.fill(True)
-        self.tile = None
-        self.is_collapsed = False
-        self.recursion_checked = False
-
     def __repr__(self):
-        return f"Cell(pos=({self.x_pos // self.width}, {self.y_pos // self.height}), collapsed={self.is_collapsed}, tile={self.tile}, possibilities={np.nonzero(self.possible)[0]})"
+        return f"Cell(pos=({self.x_index}, {self.y_index}), collapsed={self.is_collapsed}, tile={self.tile}, possibilities={np.nonzero(self.possible)[0]})"
+
+
+class CellImage:
+    """
+    Persistent one pixel per cell image of a grid. Only the cells which changed are written into it, and it reaches
+    the screen with a single surfarray write, scaled up to the cell size
+    """
+    def __init__(self, width_in_cells: int, height_in_cells: int, cell_size: int) -> None:
+        self.pixels = np.zeros((width_in_cells, height_in_cells, 3), dtype=np.uint8)
+        self.surface = pygame.Surface((width_in_cells, height_in_cells))
+        self.scaled = pygame.Surface((width_in_cells * cell_size, height_in_cells * cell_size))
+        self.changed = True
+
+    def apply(self, changed_y: np.ndarray, changed_x: np.ndarray, colours: np.ndarray) -> None:
+        if len(changed_y):
+            self.pixels[changed_x, changed_y] = colours
+            self.changed = True
+
+    def draw(self, surface: pygame.Surface) -> None:
+        if self.changed:
+            pygame.surfarray.blit_array(self.surface, self.pixels)
+            pygame.transform.scale(self.surface, self.scaled.get_size(), self.scaled)
+            self.changed = False
+        surface.blit(self.scaled, (0, 0))
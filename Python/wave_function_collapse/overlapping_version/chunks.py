@@ -0,0 +1,98 @@
+"""
+Chunk worlds of the overlapping model - see common/chunks.py for how a world is put together from chunks.
+
+Example - an 8x8 chunk world of 32x32 cell chunks, as a single image:
+    python -m overlapping_version.chunks samples\\City.png --chunks 8 8 --chunk-size 32 32 --output world.png
+"""
+import argparse
+
+import numpy as np
+
+from common import chunks as shared_chunks
+
+from .grid import Grid
+from .tile_set import TileSet
+
+
+def solve_chunk(tile_set: TileSet, chunk_size: tuple[int, int], seed: int, ring: np.ndarray, grid_options: dict, max_attempts: int) -> tuple[np.ndarray, dict]:
+    """
+    Solve one chunk along with its overlap strips, which together are chunk_size. ring is [height + 2, width + 2] and
+    holds the tiles of the neighbouring chunks around the edge, or -1 where that chunk hasn't been generated. Returns
+    the [height, width] tiles inside the ring and the chunk's stats.
+    """
+    width, height = chunk_size
+    return shared_chunks.solve_attempts(
+        lambda: Grid((width + 2, height + 2), (width + 2, height + 2), tile_set, **grid_options),
+        lambda grid: pin_ring(grid, ring), run, seed, max_attempts
+    )
+
+
+def run(grid: Grid) -> int:
+    steps = 0
+    while not grid.finished:
+        grid.step()
+        steps += 1
+    return steps
+
+
+def pin_ring(grid: Grid, ring: np.ndarray) -> int:
+    """
+    Collapse the ring cells around the chunk to the tiles of the neighbouring chunks.
+    A pin which would cause a contradiction is skipped, leaving a seam. Returns the number of seams.
+    """
+    seams = 0
+    for y_index, x_index in zip(*np.nonzero(ring >= 0)):
+        tile_id = int(ring[y_index, x_index])
+        # An earlier pin may already have forced this cell
+        if grid.collapsed[y_index, x_index] and grid.tiles[y_index, x_index] == tile_id:
+            continue
+
+        if not grid.wave.possible(y_index, x_index)[tile_id]:
+            seams += 1
+            continue
+
+        trail_length = int(grid.cursor[1])
+        if not grid.collapse_cell(int(x_index), int(y_index), tile_id):
+            grid.decisions.pop()
+            grid.undo(trail_length)
+            seams += 1
+    return seams
+
+
+class ChunkedWorld(shared_chunks.ChunkedWorld):
+    solve_chunk = staticmethod(solve_chunk)
+
+    def render(self, x_index: int, y_index: int, width: int, height: int) -> np.ndarray:
+        """One pixel per cell - the top-left pixel of its tile, black where a chunk failed to collapse a cell"""
+        tiles = self.tiles(x_index, y_index, width, height)
+        colours = np.concatenate([np.stack(self.tile_set.tiles)[:, 0, 0, :], np.zeros((1, 3), dtype=np.uint8)])
+        return colours[tiles]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate a large world chunk by chunk from a sample PNG.")
+    parser.add_argument("sample", help="sample PNG to take the tiles from")
+    shared_chunks.add_world_arguments(parser, (32, 32), "cells")
+    parser.add_argument("--kernel-size", type=int, default=3)
+    parser.add_argument("--rotate", action="store_true", help="include rotated kernels")
+    parser.add_argument("--flip", action="store_true", help="include flipped kernels")
+    parser.add_argument("--cache-dir", default=".wfc_cache", help="folder to cache the tile set rule tables in")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tile_set = TileSet(
+        args.sample, kernel_size=args.kernel_size, include_rotated_kernels=args.rotate, include_flipped_kernels=args.flip,
+        cache_dir=args.cache_dir
+    )
+    world = ChunkedWorld(
+        tile_set, args.chunk_size, seed=args.seed, window=args.window, store_dir=args.store,
+        grid_options=dict(max_backtrack_depth=args.max_backtrack_depth), max_attempts=args.max_attempts,
+        overlap=args.overlap
+    )
+    shared_chunks.generate_world(world, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Drivers which run as many solver steps per frame as fit in a time budget, rather than one step per frame.
+
+inline - steps run in the render loop until the frame's budget is used up, then the frame is drawn
+thread - steps run on a worker thread, which streams the cells it changed to the render loop
+process - the same, in a worker process, so solving and drawing don't take turns holding the GIL
+"""
+import multiprocessing
+import queue
+import random
+import threading
+import time
+
+from .cell import CellImage
+from .grid import Grid
+from .tile_set import TileSet
+
+MODES = ("inline", "thread", "process")
+
+
+def step_for(grid: Grid, budget: float) -> int:
+    """Step the grid until budget seconds have passed or it is finished. Returns the number of steps taken"""
+    deadline = time.perf_counter() + budget
+    steps = 0
+    while not grid.finished:
+        grid.step()
+        steps += 1
+        if time.perf_counter() >= deadline:
+            break
+    return steps
+
+
+def stream_changes(grid: Grid, changes, stop, interval: float) -> None:
+    """
+    Step the grid until it is finished or stopped, putting the cells it changed on the changes queue every interval
+    seconds as ("cells", ys, xs, colours). ("done", failed) is put on the queue last.
+    """
+    while not grid.finished and not stop.is_set():
+        step_for(grid, interval)
+        changes.put(("cells", *grid.take_changes()))
+    changes.put(("done", grid.failed))
+
+
+def solve_in_process(tile_set: TileSet, screen_size: tuple[int, int], grid_resolution: tuple[int, int], grid_options: dict, seed: int | None, changes, stop, interval: float) -> None:
+    random.seed(seed)
+    stream_changes(Grid(screen_size, grid_resolution, tile_set, **grid_options), changes, stop, interval)
+
+
+class BackgroundSolver:
+    """
+    Solves a grid on a worker thread or process, while the render loop picks up the changed cells with poll().
+    Only the changes cross over, so the render loop never reads the solver's arrays while they are being updated.
+    """
+    def __init__(self, mode: str, tile_set: TileSet, screen_size: tuple[int, int], grid_resolution: tuple[int, int], grid_options: dict | None=None, seed: int | None=None, interval: float=0.01):
+        if mode not in ("thread", "process"):
+            raise ValueError("mode must be 'thread' or 'process'")
+
+        grid_options = grid_options or {}
+        self.finished = False
+        self.failed = False
+
+        if mode == "thread":
+            random.seed(seed)
+            grid = Grid(screen_size, grid_resolution, tile_set, **grid_options)
+            self.changes = queue.Queue()
+            self.stop_event = threading.Event()
+            self.worker = threading.Thread(target=stream_changes, args=(grid, self.changes, self.stop_event, interval), daemon=True)
+        else:
+            # Spawn rather than fork the worker, as forking after Numba has started its parallel threads can deadlock
+            spawn = multiprocessing.get_context("spawn")
+            self.changes = spawn.Queue()
+            self.stop_event = spawn.Event()
+            self.worker = spawn.Process(
+                target=solve_in_process,
+                args=(tile_set, screen_size, grid_resolution, grid_options, seed, self.changes, self.stop_event, interval),
+                daemon=True,
+            )
+
+    def start(self) -> None:
+        self.worker.start()
+
+    def poll(self, image: CellImage) -> int:
+        """Apply every change waiting on the queue to image, without blocking. Returns the number of cells changed"""
+        changed = 0
+        while True:
+            try:
+                message = self.changes.get_nowait()
+            except queue.Empty:
+                return changed
+
+            if message[0] == "done":
+                self.finished = True
+                self.failed = message[1]
+            else:
+                image.apply(*message[1:])
+                changed += len(message[1])
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        # Drain the queue so a worker process isn't left blocked flushing changes nobody will read
+        while self.worker.is_alive():
+            try:
+                self.changes.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.worker.join()
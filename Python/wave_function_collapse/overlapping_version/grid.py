@@ -1,104 +1,102 @@
-import copy
 from random import choice
 import pygame
 import numpy as np
 from collections import deque
-from numpy import ndarray
-from cell import Cell
-from tile_set import TileSet
+from .cell import Cell, CellImage
+from .solver import Solver
+from .tile_set import TileSet
 
 
-class Grid:
-    def __init__(self, screen_size: tuple[int, int], grid_resolution: tuple[int, int], tile_set: TileSet, wrap: bool=False):
+class Grid(Solver):
+    """2D layer over the solver - cells indexed by [y, x], the overlap propagator, and drawing the average colours"""
+    def __init__(self, screen_size: tuple[int, int], grid_resolution: tuple[int, int], tile_set: TileSet, wrap: bool=False, packed: bool=False, propagator: str="ac4", max_backtrack_depth: int | None=None, max_restarts: int=0):
+        if propagator not in ("ac4", "overlap"):
+            raise ValueError("propagator must be 'ac4' or 'overlap'")
+
         self.screen_size = screen_size
-        self.tile_set = tile_set
         self.width_in_cells = grid_resolution[0]
         self.height_in_cells = grid_resolution[1]
         self.cell_size = min(self.screen_size[0] // self.width_in_cells, self.screen_size[1] // self.height_in_cells)
-        self.num_tiles = len(self.tile_set.tiles)
-        self.draw_size = (self.tile_set.kernel_size, self.tile_set.kernel_size)
-        self.wrap = wrap
-        self.finished = False
-        self.cells = np.array([[Cell(x * self.cell_size, y * self.cell_size, self.cell_size, self.num_tiles) for x in range(self.width_in_cells)] for y in range(self.height_in_cells)])
+        self.draw_size = (tile_set.kernel_size, tile_set.kernel_size)
+        self.propagator = propagator
+
+        # Top-left pixel colour of every tile, used to draw the average colour of uncollapsed cells
+        self.tile_colours = np.array(tile_set.tiles)[:, 0, 0, :].astype(np.float64)
+        # Persistent image of the cell colours, so each frame only redraws the cells which changed. Made on first draw
+        self.image = None
+
+        grid_shape = (self.height_in_cells, self.width_in_cells)
+        super().__init__(grid_shape, grid_shape, tile_set, self.tile_colours, wrap, packed, max_backtrack_depth, max_restarts)
+
+        # Cells are only views onto the solver arrays, used for drawing
+        self.cells = [[Cell(self, x, y) for x in range(self.width_in_cells)] for y in range(self.height_in_cells)]
+        # The overlap propagator walks the neighbours itself, in the same order as the neighbour table
         self.neighbours = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # N, S, W, E
-        # Cache for backtracking - maybe a queue would be more efficient?
-        self.grid_copy = []
+
+        # Adjacency rules in the same storage format as the wave, so constraints can be applied word-wise.
+        # Only the overlap propagator needs them, and they always come from the dense rules
+        if self.propagator == "overlap":
+            self.adjacency_masks = self.wave.pack_mask(self.tile_set.adjacencies)
+
+    @property
+    def colour_sums(self) -> np.ndarray:
+        """Running sum of the colours of the possible tiles of every cell, as [y, x, rgb]"""
+        return self.value_sums
+
+    def make_enabler_counts(self):
+        if self.propagator == "overlap":
+            # The overlap propagator keeps no support counts
+            return None
+        return super().make_enabler_counts()
 
     def step(self):
         next_cell = self.get_lowest_entropy_cell()
 
-        if next_cell is None or next_cell.is_collapsed:     # should never be collapsed, just being defensive
+        if next_cell is None:
             return False
 
+        x_index, y_index = next_cell
+
         # choose a tile to collapse to
-        next_cell_tile = choice(np.nonzero(next_cell.possible)[0])
+        next_cell_tile = choice(self.wave.tile_ids(y_index, x_index))
 
         # collapse the cell
-        success = self.collapse_cell(next_cell, next_cell_tile)
-
-        while not success:
-            # Need to backtrack the last step on the stack
-            if len(self.grid_copy) > 0:
-                print(
-                    f"Backtracked using snapshots. Snapshot stack length = {len(self.grid_copy)}"
-                )
-            else:
-                print("No more states to backtrack to. Puzzle failed.")
-                break
-
-            # restore grid to pre-collapsed state
-            old_cells, old_cell, old_cell_tile = self.grid_copy.pop()
-
-            old_possible = np.nonzero(old_cell.possible)[0]
-            choices = old_possible[old_possible != old_cell_tile]
-
-            if len(choices) == 0:
-                success = False
-                continue
-
-            # restore last good grid
-            self.cells = copy.deepcopy(old_cells)
-
-            # choose a new tile to collapse to
-            new_choice = choice(choices)
-
-            # try it out
-            success = self.collapse_cell(old_cell, new_choice)
-
-    def collapse_cell(self, next_cell, next_cell_tile):
-        # Save state in case we need to backtrack
-        self.grid_copy.append(
-            [copy.deepcopy(self.cells), next_cell.copy(), next_cell_tile]       # TODO: append list of cell choices here, instead of next_cell_tile
-        )
-
-        next_cell.tile = self.tile_set.tiles[next_cell_tile]
-        next_cell.possible[:] = False
-        next_cell.possible[next_cell_tile] = True
-        next_cell.is_collapsed = True
-        return self.propagate(
-            next_cell.x_pos // next_cell.width,
-            next_cell.y_pos // next_cell.height,
-            next_cell_tile,
-        )
-
-    def propagate(self, x_index: int, y_index: int, tile_id) -> bool:
+        success = self.collapse_cell(x_index, y_index, next_cell_tile)
+
+        if not success:
+            success = self.backtrack()
+
+        return success
+
+    def ban_tile(self, x_index: int, y_index: int, tile_id: int) -> bool:
+        """Remove a single tile from a cell and propagate the consequences"""
+        return self.ban(y_index * self.width_in_cells + x_index, tile_id)
+
+    def collapse_cell(self, x_index: int, y_index: int, tile_id: int) -> bool:
+        return self.collapse(y_index * self.width_in_cells + x_index, tile_id)
+
+    def propagate_queued(self, cell: int) -> bool:
+        if self.propagator == "ac4":
+            return self.propagate_ac4()
+
+        self.cursor[0] = self.cursor[1]
+        y_index, x_index = divmod(cell, self.width_in_cells)
+        return self.propagate(x_index, y_index)
+
+    def propagate(self, x_index: int, y_index: int) -> bool:
         queue = deque([(y_index, x_index)])
 
         while queue:
             current_y, current_x = queue.popleft()
-            source_cell = self.cells[current_y, current_x]
-            source_possible = np.nonzero(source_cell.possible)[0]
+            source_possible = self.wave.tile_ids(current_y, current_x)
 
             for idx, direction in enumerate(self.neighbours):
                 neighbour_y = current_y + direction[0]
                 neighbour_x = current_x + direction[1]
 
                 if self.wrap:
-                    if neighbour_x == self.width_in_cells:
-                        neighbour_x = 0
-
-                    if neighbour_y >= self.height_in_cells:
-                        neighbour_y = 0
+                    neighbour_y %= self.height_in_cells
+                    neighbour_x %= self.width_in_cells
                 else:
                     if (
                         neighbour_y < 0
@@ -108,59 +106,62 @@ class Grid:
                     ):
                         continue
 
-                neighbour = self.cells[neighbour_y, neighbour_x]
-                if neighbour.is_collapsed:
-                    continue
+                # OR together the adjacency rows of every tile still possible in the source cell
+                valid_tiles = self.wave.union(self.adjacency_masks[source_possible, idx])
 
-                valid_tiles = np.zeros(self.num_tiles, dtype=bool)
-                for t_id in source_possible:
-                    valid_tiles |= self.tile_set.adjacencies[t_id][idx]
-
-                before = neighbour.possible.copy()
-                neighbour.possible &= valid_tiles
-                after = neighbour.possible
-
-                if np.array_equal(before, after):
+                before = self.wave.tile_ids(neighbour_y, neighbour_x)
+                if not self.wave.constrain(neighbour_y, neighbour_x, valid_tiles):
                     continue  # No change
 
-                remaining = np.nonzero(after)[0]
+                possible = self.wave.possible(neighbour_y, neighbour_x)
+                self._record_removals(neighbour_y * self.width_in_cells + neighbour_x, before[~possible[before]])
+                remaining = self.wave.count(neighbour_y, neighbour_x)
+                self.counts[neighbour_y, neighbour_x] = remaining
+                self.sum_weights[neighbour_y, neighbour_x] = self.weights[possible].sum()
+                self.sum_weight_log_weights[neighbour_y, neighbour_x] = self.weight_log_weights[possible].sum()
+                self.colour_sums[neighbour_y, neighbour_x] = self.tile_colours[possible].sum(axis=0)
+                self.dirty[neighbour_y, neighbour_x] = True
 
-                if len(remaining) == 0:
+                if remaining == 0:
                     return False  # Contradiction
 
-                elif len(remaining) == 1:
-                    forced_tile = remaining[0]
-                    neighbour.tile = self.tile_set.tiles[forced_tile]
-                    neighbour.possible[:] = False
-                    neighbour.possible[forced_tile] = True
-                    neighbour.is_collapsed = True
-                    queue.append((neighbour_y, neighbour_x))
+                elif remaining == 1:
+                    self.tiles[neighbour_y, neighbour_x] = self.wave.tile_ids(neighbour_y, neighbour_x)[0]
+                    self.collapsed[neighbour_y, neighbour_x] = True
 
-                else:
-                    queue.append((neighbour_y, neighbour_x))
+                queue.append((neighbour_y, neighbour_x))
+                self.update_entropy_heap(np.array([neighbour_y * self.width_in_cells + neighbour_x]))
 
         return True
 
-    def get_lowest_entropy_cell(self) -> ndarray | None:
-        u_cells = self.get_uncollapsed_cells()
-        if len(u_cells) == 0:
-            self.grid_copy = []
+    def get_lowest_entropy_cell(self) -> tuple[int, int] | None:
+        cell = self.choose_next_cell()
+        if cell is None:
+            self.decisions = []
             self.finished = True
             print("Finished")
             return None     # we're done
 
-        lowest_entropy_cell = sorted(u_cells, key=lambda obj: obj.possible.sum())[0]
-        lowest_entropy_value = len(np.nonzero(lowest_entropy_cell.possible)[0])
-        lowest_entropy_cells = u_cells[
-            np.nonzero(np.vectorize(lambda c: len(np.nonzero(c.possible)[0]) == lowest_entropy_value)(u_cells))
-        ]
-        return choice(lowest_entropy_cells)
+        y_index, x_index = divmod(cell, self.width_in_cells)
+        return x_index, y_index
+
+    def get_uncollapsed_cells(self) -> tuple[np.ndarray, np.ndarray]:
+        return np.nonzero(~self.collapsed)
+
+    def average_colours(self) -> np.ndarray:
+        """Average colour of the top-left pixel of every possible tile, for every cell at once"""
+        return self.colour_sums / np.maximum(self.counts, 1)[:, :, np.newaxis]
 
-    def get_uncollapsed_cells(self) -> ndarray:
-        return self.cells[np.nonzero(np.vectorize(lambda c: c.is_collapsed is False)(self.cells))]
+    def take_changes(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Cells which changed since this was last called, as (ys, xs, colours), clearing their dirty flags"""
+        changed_y, changed_x = np.nonzero(self.dirty)
+        colours = self.colour_sums[changed_y, changed_x] / np.maximum(self.counts[changed_y, changed_x], 1)[:, np.newaxis]
+        self.dirty[changed_y, changed_x] = False
+        return changed_y, changed_x, np.clip(np.rint(colours), 0, 255).astype(np.uint8)
 
     def draw(self, surface: pygame.Surface) -> None:
-        for y in range(self.height_in_cells):
-            for x in range(self.width_in_cells):
-                average_colour = np.mean(np.array(self.tile_set.tiles)[self.cells[y, x].possible][:, 0, 0, :], axis=0)
-                self.cells[y, x].draw(surface, average_colour)
+        """Redraw the cells which changed since the last frame"""
+        if self.image is None:
+            self.image = CellImage(self.width_in_cells, self.height_in_cells, self.cell_size)
+        self.image.apply(*self.take_changes())
+        self.image.draw(surface)
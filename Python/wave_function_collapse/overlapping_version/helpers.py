@@ -1,84 +1,94 @@
 import numpy as np
-from numba import jit, njit, prange, types
+from numba import jit, njit, types
 from numba.typed import Dict
 
 
 class Adjacencies:
-    def __init__(self, all_tiles: list[np.ndarray]) -> None:
+    """
+    Adjacency rules between every pair of tiles in each direction (N, S, W, E).
+    Two tiles may sit next to each other when their overlapping edge strips match exactly, e.g. the top two rows of a
+    tile against the bottom two rows of the tile to its north. Rather than comparing every pair of tiles, each strip is
+    given an integer id and the tiles are joined on those ids, so the work grows with the number of tiles plus the
+    number of allowed pairs.
+
+    The rules are always held in compressed sparse row form - the tiles allowed next to tile in direction are
+    indices[indptr[direction * length + tile]:indptr[direction * length + tile + 1]].
+    The dense [tile, direction, tile] tensor in allowed is only built when dense is True, as it grows with T^2.
+
+    Tiles with more axes, such as voxel patterns, pass their number of axes as dimensions. Each axis adds a pair of
+    directions, one step back then one step forward along it, and overlap is the depth of the strips compared.
+    """
+    def __init__(self, all_tiles: list[np.ndarray], dense: bool=True, dimensions: int=2, overlap: int=2) -> None:
         # Stack all tiles into a single numpy array for efficient processing
         self.tiles = np.stack(all_tiles)
         self.length = len(all_tiles)
-        self.allowed = np.full((self.length, 4, self.length), False, dtype=np.bool_)
+        self.dimensions = dimensions
+        self.overlap = overlap
         print(f"Creating {self.length} Adjacency rules")
 
-        # Pre-compute all hashes using vectorized operations
-        hashes = self._compute_all_hashes_vectorized(self.tiles)
-
-        # Use numba-compiled function for the main computation
-        self.allowed = self._compute_adjacency_rules_numba(
-            self.tiles, hashes, self.allowed
-        )
+        self.indptr, self.indices = self._join_edge_strips(self.tiles)
+        self.allowed = self.to_dense() if dense else None
 
         print("Adjacency rules created")
 
-    def _compute_all_hashes_vectorized(self, tiles: np.ndarray) -> np.ndarray:
-        """Compute hashes for all tiles using vectorized operations."""
-        # Reshape tiles to 2D for easier processing
-        flat_tiles = tiles.reshape(tiles.shape[0], -1)
-
-        # Use a simple but fast hash based on array content
-        # This assumes tiles are small enough that hash collisions are rare
-        return np.array([hash(tile.tobytes()) for tile in flat_tiles])
+    def _edge_strips(self, tiles: np.ndarray) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        For each direction, the strip of every tile paired with the strip of the neighbouring tile it has to match.
+        The default two pixel overlap is the same as get_valid_adjacencies.
+        """
+        strips = []
+        for axis in range(1, self.dimensions + 1):
+            start = [slice(None)] * tiles.ndim
+            end = [slice(None)] * tiles.ndim
+            start[axis] = slice(None, self.overlap)
+            end[axis] = slice(-self.overlap, None)
+            # e.g. North: our top rows against the bottom rows of the tile above, then South the other way round
+            strips.append((tiles[tuple(start)], tiles[tuple(end)]))
+            strips.append((tiles[tuple(end)], tiles[tuple(start)]))
+        return strips
 
     @staticmethod
-    @jit(nopython=True, parallel=True, cache=True)
-    def _compute_adjacency_rules_numba(tiles, hashes, allowed):
-        """Numba-compiled function for computing adjacency rules."""
-        length = tiles.shape[0]
-        opposite = np.array([1, 0, 3, 2])  # Opposite directions for N,S,W,E
-
-        # Pre-allocate cache arrays for numba compatibility
-        max_cache_size = length * length * 4
-        cache_keys = np.zeros((max_cache_size, 3), dtype=np.int64)
-        cache_values = np.zeros(max_cache_size, dtype=np.bool_)
-        cache_count = 0
-
-        for i in prange(length):
-            for j in range(i, length):
-                for direction in range(4):
-                    # Check cache first
-                    cache_key = (hashes[i], hashes[j], direction)
-                    cached_result = False
-                    found_in_cache = False
-
-                    # Simple linear search in cache (could be optimized further)
-                    for k in range(cache_count):
-                        if (
-                            cache_keys[k, 0] == cache_key[0]
-                            and cache_keys[k, 1] == cache_key[1]
-                            and cache_keys[k, 2] == cache_key[2]
-                        ):
-                            cached_result = cache_values[k]
-                            found_in_cache = True
-                            break
-
-                    if not found_in_cache:
-                        # Compute compatibility
-                        cached_result = get_valid_adjacencies(tiles[i], tiles[j], direction)
-
-                        # Add to cache
-                        if cache_count < max_cache_size:
-                            cache_keys[cache_count, 0] = cache_key[0]
-                            cache_keys[cache_count, 1] = cache_key[1]
-                            cache_keys[cache_count, 2] = cache_key[2]
-                            cache_values[cache_count] = cached_result
-                            cache_count += 1
-
-                    if cached_result:
-                        allowed[i, direction, j] = True
-                        allowed[j, opposite[direction], i] = True
-
-        return allowed
+    def _strip_ids(ours: np.ndarray, theirs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Number the distinct strips, so that equal strips on either side get equal ids"""
+        length = ours.shape[0]
+        flat = np.ascontiguousarray(np.concatenate([ours, theirs]).reshape(2 * length, -1))
+        keys = flat.view(np.dtype((np.void, flat.shape[1] * flat.itemsize)))[:, 0]
+        _, ids = np.unique(keys, return_inverse=True)
+        return ids[:length], ids[length:]
+
+    def _join_edge_strips(self, tiles: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        row_lengths = []
+        row_indices = []
+        for ours, theirs in self._edge_strips(tiles):
+            our_ids, their_ids = self._strip_ids(ours, theirs)
+
+            # Group the neighbouring tiles by strip id
+            order = np.argsort(their_ids, kind="stable")
+            group_sizes = np.bincount(their_ids, minlength=2 * self.length)
+            group_starts = np.cumsum(group_sizes) - group_sizes
+
+            # Each tile's row is the whole group of neighbours sharing its strip id
+            lengths = group_sizes[our_ids]
+            offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            row_lengths.append(lengths)
+            row_indices.append(order[np.repeat(group_starts[our_ids], lengths) + offsets])
+
+        indptr = np.concatenate(([0], np.cumsum(np.concatenate(row_lengths)))).astype(np.int64)
+        indices = np.concatenate(row_indices).astype(np.int32)
+        return indptr, indices
+
+    def to_dense(self) -> np.ndarray:
+        return dense_adjacencies(self.indptr, self.indices, self.length)
+
+
+def dense_adjacencies(indptr: np.ndarray, indices: np.ndarray, length: int) -> np.ndarray:
+    """Expand CSR adjacency rules into the dense [tile, direction, tile] tensor"""
+    num_directions = (len(indptr) - 1) // length
+    allowed = np.full((length, num_directions, length), False, dtype=np.bool_)
+    rows = np.repeat(np.arange(num_directions * length), np.diff(indptr))
+    directions, tiles = np.divmod(rows, length)
+    allowed[tiles, directions, indices] = True
+    return allowed
 
 
 @jit(nopython=True, cache=True)
@@ -102,9 +112,15 @@ def get_valid_adjacencies(tile_a, tile_b, direction):
 
 
 class Frequencies:
-    def __init__(self, all_tiles: list[np.ndarray]) -> None:
+    def __init__(self, all_tiles: list[np.ndarray], counts: np.ndarray | None=None) -> None:
         print(f"Creating {len(all_tiles)} Frequency rules")
 
+        # Tiles which were deduplicated as they were extracted already know how often they appear
+        if counts is not None:
+            self.rules = np.asarray(counts, dtype=np.int64)
+            print(f"Frequency rules created")
+            return
+
         # Stack into a 3D array: shape (N, H, W)
         stacked = np.stack(all_tiles)
 
@@ -178,6 +194,10 @@ class Frequencies:
 
 
 class EnablerCounts:
+    """
+    How many tiles still support each tile of each cell from each direction, as [*grid_shape, direction, tile].
+    The counts work for grids with any number of axes; the per-cell helpers below index the first two.
+    """
     # def __init__(self, grid_shape: tuple[int, int], num_tiles: int, adjacency_rules: np.ndarray):
     #     self.height, self.width = grid_shape
     #     self.num_tiles = num_tiles
@@ -208,16 +228,32 @@ class EnablerCounts:
     # def disable_tile(self, y: int, x: int, tile_index: int):
     #     self.enablers[y, x, :, tile_index] = 0
     def __init__(
-        self, grid_shape: tuple[int, int], num_tiles: int, adjacency_rules: np.ndarray
+        self, grid_shape: tuple[int, ...], num_tiles: int, adjacency_rules: np.ndarray
     ):
-        self.height, self.width = grid_shape
+        # The grid may have any number of axes, and the rules have a pair of directions for each of them
+        self.height, self.width = grid_shape[:2]
         self.num_tiles = num_tiles
         self.adjacency_rules = adjacency_rules
 
-        # Use the vectorised Numba initialisation
-        self.enablers = _vectorised_initialise_enablers(
-            adjacency_rules, self.height, self.width, num_tiles
-        )
+        # Use the vectorised Numba count of the rules, then broadcast it to every cell
+        direction_tile_counts = _vectorised_initialise_enablers(adjacency_rules, num_tiles)
+        self.enablers = np.broadcast_to(direction_tile_counts, (*grid_shape, *direction_tile_counts.shape)).copy()
+
+    @classmethod
+    def from_sparse(cls, grid_shape: tuple[int, ...], num_tiles: int, indptr: np.ndarray, dtype=np.int32) -> "EnablerCounts":
+        """
+        Enabler counts from CSR adjacency rules, where the row lengths are the counts, without the dense tensor.
+        Works for grids with any number of axes, with two directions per axis, and a smaller dtype saves memory when
+        the counts fit in it.
+        """
+        enabler_counts = cls.__new__(cls)
+        enabler_counts.height, enabler_counts.width = grid_shape[:2]
+        enabler_counts.num_tiles = num_tiles
+        enabler_counts.adjacency_rules = None
+
+        direction_tile_counts = np.diff(indptr).reshape(-1, num_tiles).astype(dtype)
+        enabler_counts.enablers = np.broadcast_to(direction_tile_counts, (*grid_shape, *direction_tile_counts.shape)).copy()
+        return enabler_counts
 
     def get_enabler_count(self, y: int, x: int, direction: int, tile_index: int) -> int:
         return _get_enabler_count_numba(self.enablers, y, x, direction, tile_index)
@@ -234,43 +270,19 @@ class EnablerCounts:
 
 
 @njit
-def _initialise_enablers_numba(enablers, adjacency_rules, height, width, num_tiles):
-    """Numba-compiled initialisation of enabler counts."""
-    for y in range(height):
-        for x in range(width):
-            for direction in range(4):
-                for t in range(num_tiles):
-                    # Count how many tiles can support tile t from this direction
-                    count = 0
-                    for i in range(adjacency_rules.shape[1]):
-                        if adjacency_rules[t, direction, i] != 0:
-                            count += 1
-                    enablers[y, x, direction, t] = count
-
-
-@njit
-def _vectorised_initialise_enablers(adjacency_rules, height, width, num_tiles):
-    """Vectorised initialisation using Numba for better performance."""
-    enablers = np.zeros((height, width, 4, num_tiles), dtype=np.int32)
-
-    # Pre-compute counts for each tile and direction
-    tile_direction_counts = np.zeros((num_tiles, 4), dtype=np.int32)
+def _vectorised_initialise_enablers(adjacency_rules, num_tiles):
+    """Vectorised count of how many tiles can support each tile from each direction, as [direction, tile]"""
+    num_directions = adjacency_rules.shape[1]
+    direction_tile_counts = np.zeros((num_directions, num_tiles), dtype=np.int32)
     for t in range(num_tiles):
-        for direction in range(4):
+        for direction in range(num_directions):
             count = 0
             for i in range(adjacency_rules.shape[2]):
                 if adjacency_rules[t, direction, i] != 0:
                     count += 1
-            tile_direction_counts[t, direction] = count
-
-    # Broadcast to all positions
-    for y in range(height):
-        for x in range(width):
-            for direction in range(4):
-                for t in range(num_tiles):
-                    enablers[y, x, direction, t] = tile_direction_counts[t, direction]
+            direction_tile_counts[direction, t] = count
 
-    return enablers
+    return direction_tile_counts
 
 
 @njit
@@ -288,7 +300,7 @@ def _decrement_numba(enablers, y, x, direction, tile_index):
 @njit
 def _is_enabled_numba(enablers, y, x, tile_index):
     """Numba-compiled check if tile is enabled in all directions."""
-    for direction in range(4):
+    for direction in range(enablers.shape[2]):
         if enablers[y, x, direction, tile_index] <= 0:
             return False
     return True
@@ -296,5 +308,5 @@ def _is_enabled_numba(enablers, y, x, tile_index):
 @njit
 def _disable_tile_numba(enablers, y, x, tile_index):
     """Numba-compiled tile disabling."""
-    for direction in range(4):
+    for direction in range(enablers.shape[2]):
         enablers[y, x, direction, tile_index] = 0
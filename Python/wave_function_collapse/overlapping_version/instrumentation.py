@@ -0,0 +1,57 @@
+"""
+Opt-in instrumentation of a Grid - per phase timings and propagation counters, exported as JSON lines or as a Chrome
+trace (open it in chrome://tracing or https://ui.perfetto.dev).
+
+Nothing in the solver knows about tracing. instrument() wraps the methods of one Grid instance, so a grid which isn't
+instrumented runs exactly the same code as before, with no overhead at all.
+
+    tracer = instrument(grid, Tracer())
+    while not grid.finished:
+        grid.step()
+    tracer.write_chrome_trace("trace.json")
+"""
+from common.instrumentation import Tracer, trace_phases
+
+
+def instrument(grid, tracer: Tracer) -> Tracer:
+    """Wrap the phases of grid so that every call to them is recorded by tracer"""
+    # Trail positions only move forwards, apart from undoing and restarting. Compacting the trail drops its start, so
+    # count what was dropped to keep positions comparable across it
+    dropped = [0]
+
+    def position() -> tuple[int, int]:
+        return int(grid.cursor[0]) + dropped[0], int(grid.cursor[1]) + dropped[0]
+
+    compact_trail = grid._compact_trail
+
+    def counted_compact_trail():
+        tail = int(grid.cursor[1])
+        compact_trail()
+        dropped[0] += tail - int(grid.cursor[1])
+
+    grid._compact_trail = counted_compact_trail
+
+    def propagated(before, result):
+        head, tail = position()
+        args = {"tiles_removed": tail - before[1], "contradiction": not result}
+        # Only the AC-4 kernel pops removals off the trail. The overlap propagator keeps its own queue of cells
+        if grid.propagator == "ac4":
+            args["queue_pops"] = head - before[0]
+        return args
+
+    def undone(before, result):
+        return {"tiles_restored": before[1] - position()[1]}
+
+    def stepped(before, result):
+        # The trail replaced snapshots of the whole grid, so it is the memory spent on being able to backtrack
+        tracer.counter("trail", allocated_bytes=int(grid.removals.nbytes), used_bytes=int(grid.cursor[1]) * grid.removals.itemsize * 2)
+        tracer.counter("progress", decisions=len(grid.decisions), uncollapsed=int(grid.collapsed.size - grid.collapsed.sum()))
+        return {}
+
+    propagate_method = "propagate_ac4" if grid.propagator == "ac4" else "propagate"
+    trace_phases(grid, tracer, position, {
+        propagate_method: ("propagate", propagated),
+        "undo": ("undo", undone),
+        "step": ("step", stepped),
+    })
+    return tracer
@@ -1,20 +1,40 @@
+import argparse
 import pygame
-from grid import Grid
-from tile_set import TileSet
+from .cell import CellImage
+from .driver import MODES, BackgroundSolver, step_for
+from .grid import Grid
+from .tile_set import TileSet
 
 
-def main():
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Wave Function Collapse in Python")
+    parser.add_argument(
+        "--mode", choices=MODES, default="inline",
+        help="run the solver in the render loop, or on a worker thread or process which streams changed cells to it"
+    )
+    parser.add_argument("--frame-budget", type=float, default=12, help="milliseconds of solving per frame")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    budget = args.frame_budget / 1000
     screen_size = (1600, 1200)
-    tile_set = TileSet(r'..\samples\city.png', kernel_size=3, include_rotated_kernels=False, include_flipped_kernels=False)
+    tile_set = TileSet(r'samples\city.png', kernel_size=3, include_rotated_kernels=False, include_flipped_kernels=False)
     grid_resolution = (40, 30)
-    grid = Grid(screen_size, grid_resolution, tile_set, wrap=False)
 
     pygame.init()
     screen = pygame.display.set_mode(screen_size)
     screen.fill((0, 0, 0))
     pygame.display.set_caption("Wave Function Collapse in Python")
 
-    grid.step()
+    if args.mode == "inline":
+        grid = Grid(screen_size, grid_resolution, tile_set, wrap=False)
+    else:
+        solver = BackgroundSolver(args.mode, tile_set, screen_size, grid_resolution, dict(wrap=False), interval=budget)
+        cell_size = min(screen_size[0] // grid_resolution[0], screen_size[1] // grid_resolution[1])
+        image = CellImage(grid_resolution[0], grid_resolution[1], cell_size)
+        solver.start()
 
     clock = pygame.time.Clock()
     running = True
@@ -27,13 +47,19 @@ def main():
                 if event.key == pygame.K_ESCAPE:
                     running = False
 
-        if not grid.finished:
-            grid.step()
-        grid.draw(screen)
+        # Solve for as much of the frame as the budget allows, and only draw once per frame
+        if args.mode == "inline":
+            step_for(grid, budget)
+            grid.draw(screen)
+        else:
+            solver.poll(image)
+            image.draw(screen)
 
         pygame.display.flip()
         clock.tick(60)
 
+    if args.mode != "inline":
+        solver.stop()
     pygame.quit()
 
 
@@ -0,0 +1,272 @@
+import numpy as np
+from numba import njit
+
+# Status codes returned by the propagation kernels
+PROPAGATED = 0
+CONTRADICTION = 1
+NEEDS_SPACE = 2
+
+# Directions come in opposite pairs, one step back then one step forward along each axis of the grid. In 2D that is
+# N, S, W, E, matching Grid.neighbours, and a 3D volume adds a third pair along its last axis
+OPPOSITE = np.array([1, 0, 3, 2, 5, 4], dtype=np.int64)
+
+
+def neighbour_table(height: int, width: int, wrap: bool) -> np.ndarray:
+    """
+    Flat index of the neighbouring cell in each direction (N, S, W, E) for every flat cell index.
+    -1 marks a missing neighbour at the edge of a non-wrapping grid.
+    """
+    return neighbour_table_nd((height, width), wrap)
+
+
+def neighbour_table_nd(shape: tuple[int, ...], wrap: bool) -> np.ndarray:
+    """neighbour_table for a grid with any number of axes, with two directions per axis"""
+    coordinates = np.unravel_index(np.arange(int(np.prod(shape))), shape)
+    table = np.full((len(coordinates[0]), 2 * len(shape)), -1, dtype=np.int32)
+    for axis, size in enumerate(shape):
+        for step, direction in ((-1, 2 * axis), (1, 2 * axis + 1)):
+            moved = list(coordinates)
+            moved[axis] = coordinates[axis] + step
+            if wrap:
+                moved[axis] %= size
+                valid = np.ones(len(moved[axis]), dtype=np.bool_)
+            else:
+                valid = (moved[axis] >= 0) & (moved[axis] < size)
+            table[valid, direction] = np.ravel_multi_index([coordinate[valid] for coordinate in moved], shape)
+    return table
+
+
+@njit(cache=True)
+def has_tile(wave, packed, cell, tile):
+    """Works on both storage modes of common.possibilities.Wave - wave is the flattened [cells, tiles or words] array"""
+    if packed:
+        return (wave[cell, tile >> 6] >> np.uint64(tile & 63)) & np.uint64(1) != 0
+    return wave[cell, tile] != 0
+
+
+@njit(cache=True)
+def clear_tile(wave, packed, cell, tile):
+    if packed:
+        wave[cell, tile >> 6] &= ~(np.uint64(1) << np.uint64(tile & 63))
+    else:
+        wave[cell, tile] = False
+
+
+@njit(cache=True)
+def first_tile(wave, packed, cell):
+    limit = wave.shape[1] * 64 if packed else wave.shape[1]
+    for tile in range(limit):
+        if has_tile(wave, packed, cell, tile):
+            return tile
+    return -1
+
+
+@njit(cache=True)
+def remove_tile(state, cell, tile, removals, cursor):
+    """
+    Remove a single possibility and queue it so its neighbours lose the support it gave them.
+    state is the tuple built by Grid._flat_state, cursor holds [head, tail] of the removal queue.
+    Returns False if the cell has no possibilities left.
+    """
+    wave, packed, counts, tiles, collapsed, sum_weights, sum_weight_log_weights, weights, weight_log_weights, colour_sums, tile_colours, dirty = state
+    clear_tile(wave, packed, cell, tile)
+    counts[cell] -= 1
+    sum_weights[cell] -= weights[tile]
+    sum_weight_log_weights[cell] -= weight_log_weights[tile]
+    colour_sums[cell] -= tile_colours[tile]
+    dirty[cell] = True
+    removals[cursor[1], 0] = cell
+    removals[cursor[1], 1] = tile
+    cursor[1] += 1
+
+    if counts[cell] == 1 and not collapsed[cell]:
+        # Only one option left, so the cell is forced
+        tiles[cell] = first_tile(wave, packed, cell)
+        collapsed[cell] = True
+
+    return counts[cell] > 0
+
+
+@njit(cache=True)
+def collapse_to(state, num_tiles, cell, tile_id, removals, cursor):
+    """Queue the removal of every tile except tile_id from the cell"""
+    wave, packed, counts, tiles, collapsed = state[0], state[1], state[2], state[3], state[4]
+    tiles[cell] = tile_id
+    collapsed[cell] = True
+    for tile in range(num_tiles):
+        if tile != tile_id and has_tile(wave, packed, cell, tile):
+            remove_tile(state, cell, tile, removals, cursor)
+
+
+@njit(cache=True)
+def withdraw_support(state, enablers, neighbour, back, tile, removals, cursor):
+    """Take away one of the enablers of tile in the neighbouring cell. Returns False if that causes a contradiction"""
+    enablers[neighbour, back, tile] -= 1
+    if enablers[neighbour, back, tile] == 0 and has_tile(state[0], state[1], neighbour, tile):
+        return remove_tile(state, neighbour, tile, removals, cursor)
+    return True
+
+
+@njit(cache=True)
+def propagate_removals(state, enablers, allowed, neighbours, removals, cursor):
+    """
+    AC-4 propagation.
+    enablers[cell, direction, tile] counts the tiles still possible in the neighbouring cell in that direction which
+    allow tile to be placed in cell. Every removal decrements the counts of the tiles it supported next door, and any
+    tile whose count reaches zero is removed in turn. Work is therefore proportional to the number of removals.
+    The removal queue doubles as the backtracking trail: entries before cursor[0] have been fully propagated, entries
+    from cursor[0] to cursor[1] have been removed from the wave but not yet propagated.
+    """
+    num_tiles = allowed.shape[0]
+    while cursor[0] < cursor[1]:
+        # Each removal can queue at most one removal per tile in each direction
+        if removals.shape[0] - cursor[1] < neighbours.shape[1] * num_tiles:
+            return NEEDS_SPACE
+
+        cell = removals[cursor[0], 0]
+        removed = removals[cursor[0], 1]
+        cursor[0] += 1
+        contradiction = False
+
+        for direction in range(neighbours.shape[1]):
+            neighbour = neighbours[cell, direction]
+            if neighbour < 0:
+                continue
+
+            back = OPPOSITE[direction]
+            for tile in range(num_tiles):
+                if allowed[removed, direction, tile]:
+                    if not withdraw_support(state, enablers, neighbour, back, tile, removals, cursor):
+                        contradiction = True
+
+        # Only stop once this removal is fully propagated, so that it can be undone exactly
+        if contradiction:
+            return CONTRADICTION
+
+    return PROPAGATED
+
+
+@njit(cache=True)
+def propagate_removals_sparse(state, enablers, indptr, indices, neighbours, removals, cursor):
+    """
+    The same as propagate_removals, but with the adjacency rules in CSR form (see helpers.Adjacencies), so each
+    removal only visits the tiles it actually supported rather than scanning a whole row of the dense tensor.
+    """
+    num_tiles = enablers.shape[2]
+    while cursor[0] < cursor[1]:
+        if removals.shape[0] - cursor[1] < neighbours.shape[1] * num_tiles:
+            return NEEDS_SPACE
+
+        cell = removals[cursor[0], 0]
+        removed = removals[cursor[0], 1]
+        cursor[0] += 1
+        contradiction = False
+
+        for direction in range(neighbours.shape[1]):
+            neighbour = neighbours[cell, direction]
+            if neighbour < 0:
+                continue
+
+            back = OPPOSITE[direction]
+            row = direction * num_tiles + removed
+            for index in range(indptr[row], indptr[row + 1]):
+                if not withdraw_support(state, enablers, neighbour, back, indices[index], removals, cursor):
+                    contradiction = True
+
+        if contradiction:
+            return CONTRADICTION
+
+    return PROPAGATED
+
+
+@njit(cache=True)
+def set_tile(wave, packed, cell, tile):
+    if packed:
+        wave[cell, tile >> 6] |= np.uint64(1) << np.uint64(tile & 63)
+    else:
+        wave[cell, tile] = True
+
+
+@njit(cache=True)
+def restore_removal(state, cell, removed):
+    """Put a removed tile back in its cell"""
+    wave, packed, counts, tiles, collapsed, sum_weights, sum_weight_log_weights, weights, weight_log_weights, colour_sums, tile_colours, dirty = state
+    set_tile(wave, packed, cell, removed)
+    counts[cell] += 1
+    sum_weights[cell] += weights[removed]
+    sum_weight_log_weights[cell] += weight_log_weights[removed]
+    colour_sums[cell] += tile_colours[removed]
+    dirty[cell] = True
+
+    if counts[cell] > 1 and collapsed[cell]:
+        collapsed[cell] = False
+        tiles[cell] = -1
+
+
+@njit(cache=True)
+def undo_removals(state, enablers, allowed, neighbours, removals, cursor, restore_support, trail_length):
+    """
+    Rewind the trail back to trail_length, putting every removed tile back in its cell.
+    Removals which had been propagated also give back the support they took from their neighbours.
+    """
+    num_tiles = allowed.shape[0]
+    for index in range(cursor[1] - 1, trail_length - 1, -1):
+        cell = removals[index, 0]
+        removed = removals[index, 1]
+
+        if restore_support and index < cursor[0]:
+            for direction in range(neighbours.shape[1]):
+                neighbour = neighbours[cell, direction]
+                if neighbour < 0:
+                    continue
+                back = OPPOSITE[direction]
+                for tile in range(num_tiles):
+                    if allowed[removed, direction, tile]:
+                        enablers[neighbour, back, tile] += 1
+
+        restore_removal(state, cell, removed)
+
+    cursor[0] = min(cursor[0], trail_length)
+    cursor[1] = trail_length
+
+
+@njit(cache=True)
+def undo_removals_sparse(state, enablers, indptr, indices, neighbours, removals, cursor, restore_support, trail_length):
+    """The same as undo_removals, with the adjacency rules in CSR form"""
+    num_tiles = enablers.shape[2]
+    for index in range(cursor[1] - 1, trail_length - 1, -1):
+        cell = removals[index, 0]
+        removed = removals[index, 1]
+
+        if restore_support and index < cursor[0]:
+            for direction in range(neighbours.shape[1]):
+                neighbour = neighbours[cell, direction]
+                if neighbour < 0:
+                    continue
+                back = OPPOSITE[direction]
+                row = direction * num_tiles + removed
+                for rule in range(indptr[row], indptr[row + 1]):
+                    enablers[neighbour, back, indices[rule]] += 1
+
+        restore_removal(state, cell, removed)
+
+    cursor[0] = min(cursor[0], trail_length)
+    cursor[1] = trail_length
+
+
+@njit(cache=True)
+def remove_unsupported(state, enablers, neighbours, removals, cursor):
+    """Queue the removal of tiles which have no support at all from a neighbour that exists"""
+    wave, packed = state[0], state[1]
+    num_cells, num_directions, num_tiles = enablers.shape
+    for cell in range(num_cells):
+        for direction in range(num_directions):
+            if neighbours[cell, direction] < 0:
+                continue
+            for tile in range(num_tiles):
+                if enablers[cell, direction, tile] == 0 and has_tile(wave, packed, cell, tile):
+                    if removals.shape[0] - cursor[1] < 1:
+                        return NEEDS_SPACE
+                    if not remove_tile(state, cell, tile, removals, cursor):
+                        return CONTRADICTION
+    return PROPAGATED
@@ -0,0 +1,311 @@
+"""
+Solver core shared by the 2D Grid and the VoxelGrid - the trail of removals, backtracking, restarts and the entropy
+heap. Everything here works on flat cell indices, with the neighbours of each cell taken from neighbour_table_nd, so it
+doesn't matter how many axes the output has. The subclasses decide how their arrays are shaped, which value is summed
+over the possible tiles of each cell (colours or voxel ids) and how the result is shown.
+"""
+import heapq
+from random import choice, getrandbits
+
+import numpy as np
+
+from common.possibilities import Wave, unpack_bits
+
+from .helpers import EnablerCounts
+from .propagator import (
+    CONTRADICTION,
+    NEEDS_SPACE,
+    collapse_to,
+    neighbour_table_nd,
+    propagate_removals,
+    propagate_removals_sparse,
+    remove_tile,
+    remove_unsupported,
+    undo_removals,
+    undo_removals_sparse,
+)
+
+
+class Solver:
+    """
+    Wave, trail and entropy heap for an output of the given shape. Per-cell arrays are held in array_shape, which has
+    as many cells as shape but may be laid out differently (the 2D Grid indexes them by [y, x], the VoxelGrid by cell).
+    tile_values holds a row of values per tile, whose running sum over the possible tiles is kept for every cell.
+    """
+    def __init__(self, shape: tuple[int, ...], array_shape: tuple[int, ...], tile_set, tile_values: np.ndarray, wrap: bool=False, packed: bool=False, max_backtrack_depth: int | None=None, max_restarts: int=0):
+        self.shape = tuple(shape)
+        self.array_shape = tuple(array_shape)
+        self.tile_set = tile_set
+        self.num_cells = int(np.prod(self.shape))
+        self.num_tiles = len(tile_set.tiles)
+        self.num_directions = 2 * len(self.shape)
+        self.wrap = wrap
+        self.packed = packed
+        self.finished = False
+        self.failed = False
+
+        # Backtracking policy: how many decisions may be undone to resolve one contradiction (None for no limit),
+        # and how many times the whole output may be started again once backtracking gives up
+        self.max_backtrack_depth = max_backtrack_depth
+        self.max_restarts = max_restarts
+        self.restarts = 0
+
+        # Running sums for the weighted Shannon entropy of each cell, using the tile frequencies as weights:
+        # entropy = log(sum(w)) - sum(w * log(w)) / sum(w)
+        self.weights = np.asarray(tile_set.frequencies, dtype=np.float64)
+        self.weight_log_weights = self.weights * np.log(self.weights)
+        # Small per-cell noise breaks ties between cells of equal entropy
+        self.entropy_noise = np.random.default_rng(getrandbits(32)).random(self.array_shape) * 0.00001
+
+        self.neighbour_table = neighbour_table_nd(self.shape, wrap)
+        self.tile_values = tile_values
+
+        # Trail of every (flat cell index, tile) removal, with a [head, tail] cursor. Entries from head to tail are
+        # still waiting to be propagated. Backtracking rewinds the trail instead of restoring snapshots of the output
+        self.removals = np.zeros((self.num_directions * self.num_tiles + self.num_cells, 2), dtype=np.int32)
+        self.cursor = np.zeros(2, dtype=np.int64)
+        # Decisions made so far, as (trail length before the decision, cell, tile)
+        self.decisions = []
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Put every cell back to its initial state, with all tiles possible"""
+        # The wave holds the tiles still possible in each cell, either as bools or bit-packed into uint64 words
+        self.wave = Wave(self.shape, self.num_tiles, packed=self.packed)
+        self.counts = np.full(self.array_shape, self.num_tiles, dtype=np.int32)
+        self.collapsed = np.zeros(self.array_shape, dtype=np.bool_)
+        # -1 indicates not collapsed (no tile assigned)
+        self.tiles = np.full(self.array_shape, -1, dtype=np.int32)
+        self.sum_weights = np.full(self.array_shape, self.weights.sum())
+        self.sum_weight_log_weights = np.full(self.array_shape, self.weight_log_weights.sum())
+        # Running sum of the values of the possible tiles, and whether each cell has changed since it was last drawn
+        self.value_sums = np.tile(self.tile_values.sum(axis=0), self.array_shape + (1,))
+        self.dirty = np.ones(self.array_shape, dtype=np.bool_)
+        # Current heap key of every cell. Heap entries are (key, cell) and are skipped once they no longer match
+        self.entropy = np.zeros(self.array_shape)
+        self.entropy_heap = []
+
+        self.cursor[:] = 0
+        self.decisions = []
+
+        self.enabler_counts = self.make_enabler_counts()
+        if self.enabler_counts is not None:
+            self.enablers = self.enabler_counts.enablers.reshape(self.num_cells, self.num_directions, self.num_tiles)
+            self.remove_unsupported_tiles()
+        else:
+            # Without support counts there is nothing to give back when undoing
+            self.enablers = np.zeros((1, self.num_directions, self.num_tiles), dtype=np.int32)
+
+        self.rebuild_entropy_heap()
+
+    def make_enabler_counts(self) -> EnablerCounts | None:
+        """Support counts for the AC-4 kernels, or None for a propagator which doesn't keep them"""
+        if self.tile_set.sparse:
+            return EnablerCounts.from_sparse(self.shape, self.num_tiles, self.tile_set.adjacency_indptr)
+        return EnablerCounts(self.shape, self.num_tiles, self.tile_set.adjacencies)
+
+    def _flat_state(self) -> tuple:
+        """Flattened views of the solver arrays, in the order expected by the propagator kernels"""
+        return (
+            self.wave.data.reshape(self.num_cells, -1),
+            self.wave.packed,
+            self.counts.reshape(-1),
+            self.tiles.reshape(-1),
+            self.collapsed.reshape(-1),
+            self.sum_weights.reshape(-1),
+            self.sum_weight_log_weights.reshape(-1),
+            self.weights,
+            self.weight_log_weights,
+            self.value_sums.reshape(self.num_cells, -1),
+            self.tile_values,
+            self.dirty.reshape(-1),
+        )
+
+    def tile_ids(self, cell: int) -> np.ndarray:
+        """The tiles still possible in a cell"""
+        row = self.wave.data.reshape(self.num_cells, -1)[cell]
+        return np.flatnonzero(unpack_bits(row, self.num_tiles) if self.wave.packed else row)
+
+    def _ensure_removal_space(self, extra: int) -> None:
+        if self.removals.shape[0] - self.cursor[1] >= extra:
+            return
+
+        self._compact_trail()
+        if self.removals.shape[0] - self.cursor[1] < extra:
+            grown = np.zeros((max(2 * self.removals.shape[0], self.cursor[1] + extra), 2), dtype=np.int32)
+            grown[:self.cursor[1]] = self.removals[:self.cursor[1]]
+            self.removals = grown
+
+    def _compact_trail(self) -> None:
+        """Drop the start of the trail once it is older than any decision the backtrack depth allows us to undo"""
+        if self.max_backtrack_depth is None:
+            return
+
+        undoable = self.decisions[max(0, len(self.decisions) - self.max_backtrack_depth):] if self.max_backtrack_depth else []
+        drop = undoable[0][0] if undoable else int(self.cursor[0])
+        if drop == 0:
+            return
+
+        self.removals[:self.cursor[1] - drop] = self.removals[drop:self.cursor[1]]
+        self.cursor -= drop
+        self.decisions = [(max(trail_length - drop, 0), cell, tile_id) for trail_length, cell, tile_id in self.decisions]
+
+    def _record_removals(self, cell: int, removed: np.ndarray) -> None:
+        """Add removals made outside the kernels to the trail. They are already propagated, so head moves with tail"""
+        self._ensure_removal_space(len(removed))
+        end = self.cursor[1] + len(removed)
+        self.removals[self.cursor[1]:end, 0] = cell
+        self.removals[self.cursor[1]:end, 1] = removed
+        self.cursor[:] = end
+
+    def remove_unsupported_tiles(self) -> None:
+        """Remove tiles which no tile at all allows next to them, in every cell where that neighbour exists"""
+        self.cursor[:] = 0
+        while True:
+            status = remove_unsupported(self._flat_state(), self.enablers, self.neighbour_table, self.removals, self.cursor)
+            if status != NEEDS_SPACE:
+                break
+            self._ensure_removal_space(self.removals.shape[0])
+
+        if status == CONTRADICTION or not self.propagate_ac4():
+            print("Tile set cannot fill this output. Puzzle failed.")
+
+    def step(self) -> bool:
+        cell = self.choose_next_cell()
+        if cell is None:
+            self.decisions = []
+            self.finished = True
+            return False
+
+        if not self.collapse(cell, choice(self.tile_ids(cell).tolist())):
+            return self.backtrack()
+        return True
+
+    def backtrack(self) -> bool:
+        """
+        Undo the most recent decision and rule out the tile it chose, repeating with older decisions while that still
+        leads to a contradiction. Falls back to restarting once the backtrack depth is used up.
+        """
+        depth = 0
+        while self.decisions:
+            trail_length, cell, tile_id = self.decisions.pop()
+            self.undo(trail_length)
+            depth += 1
+            if self.max_backtrack_depth is not None and depth > self.max_backtrack_depth:
+                break
+
+            # never retry a tile which has already failed in this cell
+            if self.ban(cell, tile_id):
+                print(f"Backtracked {depth} decision(s) using the trail. Trail length = {self.cursor[1]}")
+                return True
+
+        if self.restarts < self.max_restarts:
+            self.restarts += 1
+            print(f"Puzzle failed. Restarting ({self.restarts}/{self.max_restarts})")
+            self.reset()
+            return True
+
+        print("No more states to backtrack to. Puzzle failed.")
+        self.failed = True
+        self.finished = True
+        return False
+
+    def undo(self, trail_length: int) -> None:
+        """Rewind the trail to trail_length, restoring every tile removed since"""
+        changed = np.unique(self.removals[trail_length:self.cursor[1], 0])
+        restore_support = self.enabler_counts is not None
+        if self.tile_set.sparse:
+            undo_removals_sparse(
+                self._flat_state(), self.enablers, self.tile_set.adjacency_indptr, self.tile_set.adjacency_indices,
+                self.neighbour_table, self.removals, self.cursor, restore_support, trail_length
+            )
+        else:
+            undo_removals(
+                self._flat_state(), self.enablers, self.tile_set.adjacencies, self.neighbour_table,
+                self.removals, self.cursor, restore_support, trail_length
+            )
+        self.update_entropy_heap(changed)
+
+    def ban(self, cell: int, tile_id: int) -> bool:
+        """Remove a single tile from a cell and propagate the consequences"""
+        self._ensure_removal_space(1)
+        if not remove_tile(self._flat_state(), cell, tile_id, self.removals, self.cursor):
+            return False
+        return self.propagate_queued(cell)
+
+    def collapse(self, cell: int, tile_id: int) -> bool:
+        # Remember where the trail was so the decision can be undone if it leads to a contradiction
+        self.decisions.append((int(self.cursor[1]), cell, tile_id))
+
+        self._ensure_removal_space(self.num_tiles)
+        collapse_to(self._flat_state(), self.num_tiles, cell, tile_id, self.removals, self.cursor)
+        return self.propagate_queued(cell)
+
+    def propagate_queued(self, cell: int) -> bool:
+        """Propagate the removals queued on the trail by a change to cell"""
+        return self.propagate_ac4()
+
+    def propagate_ac4(self) -> bool:
+        """Propagate every queued removal with the compiled enabler-count kernel"""
+        # Every cell which lost a tile needs a fresh entry in the entropy heap. Collect them before the trail is
+        # compacted to make space, as that can drop the start of this propagation
+        changed = []
+        start = int(self.cursor[0])
+        while True:
+            if self.tile_set.sparse:
+                status = propagate_removals_sparse(
+                    self._flat_state(), self.enablers, self.tile_set.adjacency_indptr,
+                    self.tile_set.adjacency_indices, self.neighbour_table, self.removals, self.cursor
+                )
+            else:
+                status = propagate_removals(
+                    self._flat_state(), self.enablers, self.tile_set.adjacencies, self.neighbour_table, self.removals, self.cursor
+                )
+            changed.append(self.removals[start:self.cursor[1], 0].copy())
+            if status != NEEDS_SPACE:
+                break
+            self._ensure_removal_space(2 * self.num_directions * self.num_tiles)
+            start = int(self.cursor[1])
+
+        self.update_entropy_heap(np.unique(np.concatenate(changed)))
+        return status != CONTRADICTION
+
+    def entropy_of(self, cells: np.ndarray) -> np.ndarray:
+        """Weighted Shannon entropy (plus tie-breaking noise) of the given flat cell indices"""
+        sum_weights = self.sum_weights.reshape(-1)[cells]
+        sum_weight_log_weights = self.sum_weight_log_weights.reshape(-1)[cells]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            entropy = np.log(sum_weights) - sum_weight_log_weights / sum_weights
+        return entropy + self.entropy_noise.reshape(-1)[cells]
+
+    def update_entropy_heap(self, cells: np.ndarray) -> None:
+        """Push fresh heap entries for cells whose possibilities changed. Older entries become stale and are skipped"""
+        cells = cells[~self.collapsed.reshape(-1)[cells]]
+        if len(cells) == 0:
+            return
+
+        keys = self.entropy_of(cells)
+        self.entropy.reshape(-1)[cells] = keys
+        for key, cell in zip(keys.tolist(), cells.tolist()):
+            heapq.heappush(self.entropy_heap, (key, cell))
+
+        # Stop stale entries building up without limit
+        if len(self.entropy_heap) > 4 * self.num_cells:
+            self.rebuild_entropy_heap()
+
+    def rebuild_entropy_heap(self) -> None:
+        cells = np.flatnonzero(~self.collapsed)
+        keys = self.entropy_of(cells)
+        self.entropy.reshape(-1)[cells] = keys
+        self.entropy_heap = list(zip(keys.tolist(), cells.tolist()))
+        heapq.heapify(self.entropy_heap)
+
+    def choose_next_cell(self) -> int | None:
+        """The uncollapsed cell with the lowest entropy, skipping stale heap entries. None once every cell is collapsed"""
+        collapsed, entropy = self.collapsed.reshape(-1), self.entropy.reshape(-1)
+        while self.entropy_heap:
+            key, cell = heapq.heappop(self.entropy_heap)
+            if not collapsed[cell] and key == entropy[cell]:
+                return cell
+        return None
@@ -0,0 +1,158 @@
+"""
+Speculative solving - several independently seeded attempts at the same grid race each other across a process pool,
+and the first to finish wins. The others are told to stop as soon as there is a winner.
+
+On samples which often contradict, this cuts the time taken by the unlucky attempts which have to backtrack a long way
+or fail outright.
+
+Example - 8 attempts at a 40x30 grid, written out as a PNG with the attempt stats alongside it:
+    python -m overlapping_version.speculative samples\\Flowers.png --attempts 8 --size 40 30 --output flowers.png
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from PIL import Image
+
+from .batch import render
+from .grid import Grid
+from .tile_set import TileSet
+
+# Set in each worker process by init_worker
+_tile_set = None
+_stop = None
+
+
+def init_worker(tile_set: TileSet, stop) -> None:
+    global _tile_set, _stop
+    _tile_set = tile_set
+    _stop = stop
+
+
+def attempt(number: int, seed: int, size: tuple[int, int], budget: float | None, grid_options: dict) -> tuple[Grid | None, dict]:
+    """One attempt at the grid. Only a finished grid is sent back, to save pickling the ones which lost"""
+    random.seed(seed)
+    start = time.perf_counter()
+    grid = Grid(size, size, _tile_set, **grid_options)
+
+    steps = 0
+    status = None
+    while not grid.finished:
+        if _stop.is_set():
+            status = "cancelled"
+            break
+        if budget is not None and time.perf_counter() - start > budget:
+            status = "timeout"
+            break
+        grid.step()
+        steps += 1
+
+    if status is None:
+        status = "failed" if grid.failed else "finished"
+
+    stats = {
+        "attempt": number,
+        "seed": seed,
+        "status": status,
+        "steps": steps,
+        "restarts": grid.restarts,
+        "seconds": time.perf_counter() - start,
+    }
+    return (grid if status == "finished" else None), stats
+
+
+def solve(tile_set: TileSet, size: tuple[int, int], attempts: int=4, seed: int=0, workers: int | None=None, budget: float | None=None, grid_options: dict | None=None) -> tuple[Grid | None, dict]:
+    """
+    Race attempts seeded seed, seed + 1, ... and return the first grid to finish (None if every attempt failed), along
+    with the stats of every attempt.
+    A tile set built with a cache_dir is shared with the workers by memory-mapping its cache rather than copying it.
+    """
+    grid_options = grid_options or {}
+    workers = min(workers or os.cpu_count(), attempts)
+    start = time.perf_counter()
+
+    # Spawn rather than fork the workers, as forking after Numba has started its parallel threads can deadlock
+    spawn = multiprocessing.get_context("spawn")
+    stop = spawn.Event()
+    winner = None
+    results = []
+    with ProcessPoolExecutor(workers, mp_context=spawn, initializer=init_worker, initargs=(tile_set, stop)) as pool:
+        pending = {pool.submit(attempt, number, seed + number, size, budget, grid_options) for number in range(attempts)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                grid, stats = future.result()
+                results.append(stats)
+                if grid is not None and winner is None:
+                    winner = grid
+                    winner_stats = stats
+                    # Stop the running attempts, and drop the ones which haven't started yet
+                    stop.set()
+                    for other in pending:
+                        other.cancel()
+
+    results.sort(key=lambda stats: stats["attempt"])
+    report = {
+        "winner": winner_stats["attempt"] if winner is not None else None,
+        "seconds": time.perf_counter() - start,
+        "workers": workers,
+        "started": len(results),
+        "finished": sum(stats["status"] == "finished" for stats in results),
+        "failed": sum(stats["status"] == "failed" for stats in results),
+        "timeout": sum(stats["status"] == "timeout" for stats in results),
+        "cancelled": attempts - len(results) + sum(stats["status"] == "cancelled" for stats in results),
+        "attempts": results,
+    }
+    return winner, report
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Race several seeded attempts at one grid and keep the first to finish.")
+    parser.add_argument("sample", help="sample PNG to take the tiles from")
+    parser.add_argument("--attempts", type=int, default=os.cpu_count(), help="number of seeded attempts")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first attempt, the others follow on from it")
+    parser.add_argument("--size", type=int, nargs=2, default=(40, 30), metavar=("WIDTH", "HEIGHT"), help="output size in cells")
+    parser.add_argument("--budget", type=float, default=None, help="wall-clock seconds allowed per attempt")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (defaults to one per attempt, up to the cores)")
+    parser.add_argument("--output", default="speculative.png", help="PNG of the winning grid, with its stats written next to it as JSON")
+    parser.add_argument("--kernel-size", type=int, default=3)
+    parser.add_argument("--rotate", action="store_true", help="include rotated kernels")
+    parser.add_argument("--flip", action="store_true", help="include flipped kernels")
+    parser.add_argument("--cache-dir", default=".wfc_cache", help="folder to cache the tile set rule tables in")
+    parser.add_argument("--wrap", action="store_true")
+    parser.add_argument("--packed", action="store_true", help="bit-pack the wave")
+    parser.add_argument("--max-backtrack-depth", type=int, default=None)
+    parser.add_argument("--max-restarts", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tile_set = TileSet(
+        args.sample, kernel_size=args.kernel_size, include_rotated_kernels=args.rotate, include_flipped_kernels=args.flip,
+        cache_dir=args.cache_dir
+    )
+    grid_options = dict(
+        wrap=args.wrap, packed=args.packed, max_backtrack_depth=args.max_backtrack_depth, max_restarts=args.max_restarts
+    )
+
+    grid, report = solve(tile_set, tuple(args.size), args.attempts, args.seed, args.workers, args.budget, grid_options)
+    with open(os.path.splitext(args.output)[0] + ".json", "w") as stats_file:
+        json.dump(report, stats_file, indent=2)
+
+    if grid is None:
+        print(f"All {args.attempts} attempts failed in {report['seconds']:.2f}s")
+        return
+
+    Image.fromarray(render(grid)).save(args.output)
+    print(f"Attempt {report['winner']} won in {report['seconds']:.2f}s ({report['started']} started, {report['cancelled']} cancelled), written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from overlapping_version import benchmark
+
+
+class TestBenchmark:
+    @pytest.fixture
+    def setup(self):
+        self.baseline = [
+            {"operation": "solve", "case": "maze-16 16x16", "median": 0.2},
+            {"operation": "frequencies", "case": "maze-16", "median": 0.00001},
+        ]
+
+    def test_synthetic_samples_are_repeatable(self, setup):
+        # Arrange
+
+        # Act
+        first = benchmark.synthetic_sample("maze", 16, 3)
+        second = benchmark.synthetic_sample("maze", 16, 3)
+
+        # Assert
+        assert first.shape == (16, 16, 3)
+        assert first.dtype == np.uint8
+        assert np.array_equal(first, second)
+
+    def test_unknown_sample_kind_raises(self, setup):
+        # Arrange
+
+        # Act / Assert
+        with pytest.raises(ValueError):
+            benchmark.synthetic_sample("spiral", 16, 3)
+
+    def test_slowdown_beyond_threshold_is_a_regression(self, setup):
+        # Arrange
+        results = [{"operation": "solve", "case": "maze-16 16x16", "median": 0.3}]
+
+        # Act
+        regressions = benchmark.compare(results, self.baseline, 1.25)
+
+        # Assert
+        assert len(regressions) == 1
+        assert regressions[0]["ratio"] == pytest.approx(1.5)
+
+    def test_tiny_and_new_operations_are_not_regressions(self, setup):
+        # Arrange
+        results = [
+            {"operation": "solve", "case": "maze-16 16x16", "median": 0.22},
+            {"operation": "frequencies", "case": "maze-16", "median": 0.00005},
+            {"operation": "solve", "case": "maze-16 64x64", "median": 5.0},
+        ]
+
+        # Act
+        regressions = benchmark.compare(results, self.baseline, 1.25)
+
+        # Assert
+        assert regressions == []
@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pytest
+
+from common.chunks import solve_attempts
+from overlapping_version.chunks import ChunkedWorld
+from overlapping_version.tile_set import TileSet
+
+
+class TestChunkedWorld:
+    @pytest.fixture
+    def setup(self, tmp_path):
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "CityTest.png"))
+        self.store_dir = str(tmp_path)
+        self.world = ChunkedWorld(self.tile_set, (6, 5), seed=3, window=2, store_dir=self.store_dir)
+
+    def test_chunk_is_generated_and_stored_on_disk(self, setup):
+        # Arrange
+
+        # Act
+        tiles = self.world.chunk(0, 0)
+
+        # Assert
+        assert tiles.shape == (5, 6)
+        assert np.all(tiles >= 0)
+        assert os.path.exists(self.world.chunk_path(0, 0))
+
+    def test_only_a_window_of_chunks_is_kept_in_memory(self, setup):
+        # Arrange
+        self.world.chunk(0, 0)
+        self.world.chunk(1, 0)  # solves the edge of (0, 0) which faces it again
+        first = self.world.loaded[(0, 0)].copy()
+
+        # Act
+        self.world.chunk(2, 0)
+        reloaded = self.world.chunk(0, 0)
+
+        # Assert
+        assert len(self.world.loaded) == 2
+        assert len(self.world.stats) == 3  # reloaded from disk rather than generated again
+        assert np.array_equal(reloaded, first)
+
+    def test_ring_lies_just_outside_the_overlap_with_existing_neighbours(self, setup):
+        # Arrange
+        world = ChunkedWorld(self.tile_set, (6, 5), seed=3, store_dir=self.store_dir, overlap=1)
+        world.chunk(0, 1)
+        world.chunk(0, 0)
+        west, north_west = world.chunk(0, 1), world.chunk(0, 0)
+
+        # Act
+        ring = world.ring(1, 1)
+
+        # Assert
+        assert ring.shape == (5 + 2 * 1 + 2, 6 + 2 * 1 + 2)
+        assert np.array_equal(ring[2:7, 0], west[:, -2])
+        assert ring[0, 0] == north_west[-2, -2]
+        assert np.all(ring[1:-1, 1:-1] == -1)
+        assert np.all(ring[:, -1] == -1)
+
+    def test_region_spans_several_chunks(self, setup):
+        # Arrange
+
+        # Act
+        region = self.world.tiles(3, 2, 10, 8)
+
+        # Assert
+        assert region.shape == (8, 10)
+        assert np.array_equal(region[0:3, 0:3], self.world.chunk(0, 0)[2:5, 3:6])
+        assert np.array_equal(region[3:8, 3:9], self.world.chunk(1, 1))
+
+    def test_restarts_are_left_to_the_chunk_attempts(self, setup):
+        # Arrange
+
+        # Act
+        world = ChunkedWorld(self.tile_set, (6, 5), store_dir=self.store_dir, grid_options={"max_restarts": 5})
+
+        # Assert
+        assert world.grid_options["max_restarts"] == 0
+
+    def test_generate_joins_every_chunk_to_its_neighbours(self, setup):
+        # Arrange
+        tile_set = TileSet(os.path.join(os.path.dirname(__file__), "..", "..", "samples", "City.png"))
+        world = ChunkedWorld(tile_set, (12, 12), store_dir=self.store_dir)
+
+        # Act
+        world.generate([(x, y) for y in range(3) for x in range(3)], workers=2)
+        tiles = world.tiles(0, 0, 36, 36)
+
+        # Assert
+        assert np.all(tiles >= 0)
+        assert np.all(tile_set.adjacencies[tiles[:, :-1], 3, tiles[:, 1:]])
+        assert np.all(tile_set.adjacencies[tiles[:-1, :], 1, tiles[1:, :]])
+        assert sum(stats["seams"] for stats in world.stats.values()) == 0
+
+    def test_overlap_must_leave_the_middle_of_each_chunk(self, setup):
+        # Arrange
+
+        # Act / Assert
+        with pytest.raises(ValueError):
+            ChunkedWorld(self.tile_set, (6, 5), store_dir=self.store_dir, overlap=3)
+
+    def test_solve_attempts_needs_at_least_one_attempt(self, setup):
+        # Arrange
+
+        # Act / Assert
+        with pytest.raises(ValueError):
+            solve_attempts(None, None, None, seed=0, max_attempts=0)
@@ -0,0 +1,68 @@
+import os
+import random
+import time
+
+import numpy as np
+import pytest
+
+from overlapping_version.cell import CellImage
+from overlapping_version.driver import BackgroundSolver, step_for
+from overlapping_version.grid import Grid
+from overlapping_version.tile_set import TileSet
+
+
+class TestDriver:
+    @pytest.fixture
+    def setup(self):
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "CityTest.png"))
+        self.screen_size = (80, 60)
+        self.size = (8, 6)
+
+    def test_step_for_takes_one_step_when_the_budget_is_used_up(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size, self.tile_set)
+
+        # Act
+        steps = step_for(grid, 0)
+
+        # Assert
+        assert steps == 1
+
+    def test_step_for_stops_once_the_grid_is_finished(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size, self.tile_set)
+
+        # Act
+        steps = step_for(grid, 60)
+
+        # Assert
+        assert grid.finished
+        assert steps <= self.size[0] * self.size[1] + 1
+
+    def test_background_solver_rejects_unknown_modes(self, setup):
+        # Arrange
+
+        # Act / Assert
+        with pytest.raises(ValueError):
+            BackgroundSolver("inline", self.tile_set, self.screen_size, self.size)
+
+    def test_thread_solver_streams_every_changed_cell(self, setup):
+        # Arrange
+        random.seed(5)
+        grid = Grid(self.screen_size, self.size, self.tile_set)
+        step_for(grid, 60)
+        expected = np.clip(np.rint(grid.average_colours()), 0, 255).astype(np.uint8).transpose(1, 0, 2)
+        solver = BackgroundSolver("thread", self.tile_set, self.screen_size, self.size, seed=5)
+        image = CellImage(self.size[0], self.size[1], grid.cell_size)
+
+        # Act
+        solver.start()
+        deadline = time.perf_counter() + 60
+        while not solver.finished and time.perf_counter() < deadline:
+            solver.poll(image)
+        solver.stop()
+
+        # Assert
+        assert solver.finished
+        assert not solver.failed
+        assert np.array_equal(image.pixels, expected)
@@ -1,175 +1,381 @@
+import os
 import heapq
-from collections import deque
 
 import numpy as np
+import pygame
 import pytest
-from grid import Grid
-from tile_set import TileSet
+from overlapping_version.grid import Grid
+from overlapping_version.tile_set import TileSet
 
 
 class TestGrid:
     @pytest.fixture
     def setup(self):
         self.screen_size = (800, 600)
-        self.tile_set = TileSet(r"..\samples\City.png")
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "..", "..", "samples", "City.png"))
         self.size_in_cells = (20, 14)
-        self.scaling = 1
         self.wrap = False
-        self.entropy_heap = []
-        self.tile_removals = deque()
+
+    def push_entropy(self, grid, entropy, x_index, y_index):
+        # Heap entries are (key, flat cell index), and only count while the key matches the cell's entropy
+        grid.entropy[y_index, x_index] = entropy
+        heapq.heappush(grid.entropy_heap, (entropy, y_index * self.size_in_cells[0] + x_index))
 
     def test_initialise_grid(self, setup):
         # Arrange
 
         # Act
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
 
-        # Act
+        # Assert
         assert grid.screen_size == self.screen_size
-        assert grid.size_in_cells == self.size_in_cells
+        assert (grid.width_in_cells, grid.height_in_cells) == self.size_in_cells
         assert grid.tile_set == self.tile_set
         assert grid.cell_size == min(self.screen_size[0] // self.size_in_cells[0], self.screen_size[1] // self.size_in_cells[1])
-        assert grid.num_cells == len(self.tile_set.tiles)
-        assert grid.num_uncollapsed_cells == len(self.tile_set.tiles)
-        assert grid.scaling == self.scaling
+        assert grid.num_cells == self.size_in_cells[0] * self.size_in_cells[1]
+        assert len(grid.get_uncollapsed_cells()[0]) == grid.num_cells
         assert grid.wrap == self.wrap
-        assert grid.entropy_heap == self.entropy_heap
-        assert grid.tile_removals == self.tile_removals
+        assert sorted(cell for _, cell in grid.entropy_heap) == list(range(grid.num_cells))
+        assert grid.decisions == []
 
     def test_grid_step_sequence_of_events(self, setup, mocker):
         # Arrange
-        mock_choose_cell = mocker.patch("grid.Grid.choose_next_cell")
+        mock_choose_cell = mocker.patch("overlapping_version.grid.Grid.get_lowest_entropy_cell")
         mock_choose_cell.return_value = (0, 0)
-        mock_collapse_cell = mocker.patch("grid.Grid.collapse_cell_at")
-        mock_propagate = mocker.patch("grid.Grid.propagate")
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
+        mock_collapse_cell = mocker.patch("overlapping_version.grid.Grid.collapse_cell")
+        mock_backtrack = mocker.patch("overlapping_version.grid.Grid.backtrack")
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
 
         # Act
         grid.step()
 
-        # Act
+        # Assert
         assert mock_choose_cell.call_count == 1
         assert mock_collapse_cell.call_count == 1
-        assert mock_collapse_cell.call_args_list[0][0][0] == (0, 0)
-        assert mock_propagate.call_count == 1
+        assert mock_collapse_cell.call_args_list[0][0][:2] == (0, 0)
+        assert mock_backtrack.call_count == 0
 
     def test_grid_choose_next_cell_returns_cell(self, setup):
         # Arrange
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
-        expected = (1.23, 7, 3)
-        heapq.heappush(grid.entropy_heap, expected)
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
+        self.push_entropy(grid, -1.23, 7, 3)
 
         # Act
         result = grid.choose_next_cell()
 
-        # Act
-        assert result == expected
+        # Assert
+        assert result == 3 * 20 + 7
 
     def test_grid_choose_next_cell_returns_first_uncollapsed_cell(self, setup):
         # Arrange
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
-        grid.cells[4][1].is_collapsed = True
-        expected = (1.23, 2, 5)
-        heapq.heappush(grid.entropy_heap, expected)
-        heapq.heappush(grid.entropy_heap, (1.23, 1, 4))
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
+        self.push_entropy(grid, -1.23, 2, 5)
+        self.push_entropy(grid, -1.23, 1, 4)
+        grid.collapsed[4, 1] = True
 
         # Act
         result = grid.choose_next_cell()
 
-        # Act
-        assert result == expected
+        # Assert
+        assert result == 5 * 20 + 2
 
     def test_grid_choose_next_cell_returns_the_cell_with_the_lowest_entropy(self, setup):
         # Arrange
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
-        expected = (1.21, 11, 9)
-        heapq.heappush(grid.entropy_heap, (1.22, 19, 16))
-        heapq.heappush(grid.entropy_heap, expected)
-        heapq.heappush(grid.entropy_heap, (1.23, 1, 4))
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
+        self.push_entropy(grid, -1.22, 19, 13)
+        self.push_entropy(grid, -1.23, 11, 9)
+        self.push_entropy(grid, -1.21, 1, 4)
 
         # Act
         result = grid.choose_next_cell()
 
-        # Act
-        assert result == expected
+        # Assert
+        assert result == 9 * 20 + 11
 
     def test_grid_choose_next_cell_returns_the_uncollapsed_cell_with_the_lowest_entropy(self, setup):
         # Arrange
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
-        grid.cells[4][1].is_collapsed = True
-        expected = (1.21, 11, 9)
-        heapq.heappush(grid.entropy_heap, (1.22, 19, 16))
-        heapq.heappush(grid.entropy_heap, expected)
-        heapq.heappush(grid.entropy_heap, (1.2, 1, 4))
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
+        self.push_entropy(grid, -1.22, 19, 13)
+        self.push_entropy(grid, -1.23, 11, 9)
+        self.push_entropy(grid, -1.24, 1, 4)
+        grid.collapsed[4, 1] = True
 
         # Act
         result = grid.choose_next_cell()
 
-        # Act
-        assert result == expected
+        # Assert
+        assert result == 9 * 20 + 11
 
-    def test_grid_choose_next_cell_throws_error_if_heap_becomes_empty(self, setup):
+    def test_grid_choose_next_cell_returns_none_once_the_heap_is_empty(self, setup):
         # Arrange
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
+        grid.entropy_heap = []
+
+        # Act
+        result = grid.choose_next_cell()
 
-        # Act & Assert
-        with pytest.raises(IndexError):
-            grid.choose_next_cell()
+        # Assert
+        assert result is None
 
-    def test_grid_collapse_cell_at_sets_collapsed_flag_of_target_cell(self, setup):
+    def test_grid_collapse_cell_sets_collapsed_flag_of_target_cell(self, setup):
         # Arrange
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
-        target_cell_coord = (1, 4)
-        pre_collapsed = grid.cells[target_cell_coord[1]][target_cell_coord[0]].is_collapsed
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
+        pre_collapsed = grid.cells[4][1].is_collapsed
 
         # Act
-        grid.collapse_cell_at(target_cell_coord)
+        grid.collapse_cell(1, 4, int(grid.wave.tile_ids(4, 1)[0]))
 
         # Assert
         assert pre_collapsed is False
-        assert grid.cells[target_cell_coord[1]][target_cell_coord[0]].is_collapsed is True
+        assert grid.cells[4][1].is_collapsed is True
 
-    def test_grid_collapse_cell_at_sets_possible_flag_to_true_and_all_others_to_false(self, setup):
+    def test_grid_collapse_cell_sets_possible_flag_to_true_and_all_others_to_false(self, setup):
         # Arrange
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
-        target_cell_coord = (1, 4)
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
 
         # Act
-        grid.collapse_cell_at(target_cell_coord)
-        possibles = grid.cells[target_cell_coord[1]][target_cell_coord[0]].possible
+        grid.collapse_cell(1, 4, int(grid.wave.tile_ids(4, 1)[0]))
+        possibles = grid.cells[4][1].possible
 
         # Assert
         assert len(possibles[possibles == True]) == 1
         assert len(possibles[possibles == False]) == len(possibles) - 1
 
-    def test_grid_collapse_cell_at_adds_current_tile_number_and_cell_coordinate_to_removal_history(self, setup):
+    def test_grid_collapse_cell_adds_the_decision_and_its_removals_to_the_trail(self, setup):
         # Arrange
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
-        target_cell_coord = (1, 4)
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
+        tile_id = int(grid.wave.tile_ids(4, 1)[0])
+        others = [tile for tile in grid.wave.tile_ids(4, 1) if tile != tile_id]
+        trail_length = int(grid.cursor[1])
 
         # Act
-        grid.collapse_cell_at(target_cell_coord)
-        expected_tile = np.flatnonzero(grid.cells[target_cell_coord[1]][target_cell_coord[0]].possible)
-        removals = grid.tile_removals.popleft()
+        grid.collapse_cell(1, 4, tile_id)
+        removals = grid.removals[trail_length:grid.cursor[1]]
 
         # Assert
-        assert removals[0] == expected_tile
-        assert removals[1] == target_cell_coord
+        assert grid.decisions == [(trail_length, 4 * 20 + 1, tile_id)]
+        assert sorted(removals[removals[:, 0] == 4 * 20 + 1, 1].tolist()) == others
 
+    def test_grid_step(self, setup):
+        # Arrange
+        self.size_in_cells = (2, 3)
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "CityTest.png"))
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.wrap)
 
+        # Act
+        grid.step()
 
+        # Assert
+        assert True
 
 
+class TestGridArrays:
+    @pytest.fixture
+    def setup(self):
+        self.screen_size = (800, 600)
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "CityTest.png"))
+        self.size_in_cells = (5, 4)
 
+    def test_initialise_grid_holds_state_in_parallel_arrays(self, setup):
+        # Arrange
 
-    def test_grid_step(self, setup):
+        # Act
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set)
+
+        # Assert
+        assert grid.wave.to_bool().shape == (4, 5, len(self.tile_set.tiles))
+        assert np.all(grid.wave.to_bool())
+        assert grid.collapsed.shape == (4, 5)
+        assert not np.any(grid.collapsed)
+        assert np.all(grid.tiles == -1)
+
+    def test_cells_are_views_onto_the_grid_arrays(self, setup):
         # Arrange
-        self.size_in_cells = (2, 3)
-        self.tile_set = TileSet(r"..\tests\CityTest.png")
-        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, self.scaling, self.wrap)
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set)
 
         # Act
-        grid.step()
+        grid.collapse_cell(2, 1, 3)
+        cell = grid.cells[1][2]
 
         # Assert
-        assert True
+        assert cell.is_collapsed is True
+        assert np.all(np.equal(cell.tile, self.tile_set.tiles[3]))
+        assert np.flatnonzero(cell.possible).tolist() == [3]
+
+    def test_get_lowest_entropy_cell_ignores_collapsed_cells(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set)
+        grid.collapsed[:] = True
+        grid.collapsed[3, 4] = False
+
+        # Act
+        result = grid.get_lowest_entropy_cell()
+
+        # Assert
+        assert result == (4, 3)
+
+    def test_grid_step_until_finished_produces_consistent_neighbours(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set)
+
+        # Act
+        while not grid.finished:
+            grid.step()
+
+        # Assert
+        for y in range(self.size_in_cells[1]):
+            for x in range(self.size_in_cells[0] - 1):
+                assert self.tile_set.adjacencies[grid.tiles[y, x], 3, grid.tiles[y, x + 1]]
+
+    def test_entropy_is_weighted_by_tile_frequencies(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set)
+        weights = np.asarray(self.tile_set.frequencies, dtype=np.float64)
+        probabilities = weights / weights.sum()
+        expected = -np.sum(probabilities * np.log(probabilities))
+
+        # Act
+        result = grid.entropy_of(np.array([7]))[0] - grid.entropy_noise.reshape(-1)[7]
+
+        # Assert
+        assert result == pytest.approx(expected)
+
+    def test_choose_next_cell_skips_stale_entries(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set)
+        heapq.heappush(grid.entropy_heap, (-1.0, 3 * 5 + 2))  # stale - doesn't match the cell's current entropy
+        grid.entropy[1, 4] = -0.5
+        heapq.heappush(grid.entropy_heap, (-0.5, 1 * 5 + 4))
+
+        # Act
+        result = grid.choose_next_cell()
+
+        # Assert
+        assert result == 1 * 5 + 4
+
+
+class TestGridTrail:
+    @pytest.fixture
+    def setup(self):
+        self.screen_size = (800, 600)
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "..", "..", "samples", "City.png"))
+        self.size_in_cells = (5, 4)
+
+    @pytest.mark.parametrize("propagator", ["ac4", "overlap"])
+    def test_undo_restores_the_grid_exactly(self, setup, propagator):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, propagator=propagator)
+        grid.collapse_cell(0, 0, 0)
+        wave, counts, tiles = grid.wave.to_bool(), grid.counts.copy(), grid.tiles.copy()
+        sum_weights, colour_sums = grid.sum_weights.copy(), grid.colour_sums.copy()
+        enablers = grid.enabler_counts.enablers.copy() if propagator == "ac4" else None
+        trail_length = int(grid.cursor[1])
+
+        # Act
+        grid.collapse_cell(2, 2, int(grid.wave.tile_ids(2, 2)[0]))
+        grid.undo(trail_length)
+
+        # Assert
+        assert np.array_equal(grid.wave.to_bool(), wave)
+        assert np.array_equal(grid.counts, counts)
+        assert np.array_equal(grid.tiles, tiles)
+        assert np.allclose(grid.sum_weights, sum_weights)
+        assert np.allclose(grid.colour_sums, colour_sums)
+        if enablers is not None:
+            assert np.array_equal(grid.enabler_counts.enablers, enablers)
+
+    @pytest.mark.parametrize("propagator", ["ac4", "overlap"])
+    def test_backtrack_rules_out_the_tile_chosen_by_the_last_decision(self, setup, propagator):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, propagator=propagator)
+        grid.collapse_cell(2, 2, 0)
+
+        # Act
+        result = grid.backtrack()
+
+        # Assert
+        assert result is True
+        assert grid.decisions == []
+        assert not grid.collapsed[2, 2]
+        assert not grid.wave.possible(2, 2)[0]
+
+    def test_backtrack_restarts_once_there_is_nothing_left_to_undo(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, max_restarts=1)
+
+        # Act
+        first = grid.backtrack()
+        second = grid.backtrack()
+
+        # Assert
+        assert first is True
+        assert grid.restarts == 1
+        assert second is False
+        assert grid.failed is True
+
+    def test_trail_is_compacted_to_the_backtrack_depth(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set, max_backtrack_depth=1)
+        grid.collapse_cell(0, 0, 0)
+        grid.collapse_cell(4, 3, int(grid.wave.tile_ids(3, 4)[0]))
+        trail_length = int(grid.cursor[1]) - grid.decisions[-1][0]
+
+        # Act
+        grid._compact_trail()
+
+        # Assert
+        assert grid.decisions[-1][0] == 0
+        assert grid.cursor[1] == trail_length
+
+
+class TestGridDraw:
+    @pytest.fixture
+    def setup(self):
+        self.screen_size = (50, 40)
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "CityTest.png"))
+        self.grid = Grid(self.screen_size, (5, 4), self.tile_set)
+        self.surface = pygame.Surface(self.screen_size)
+
+    def cell_colours(self) -> np.ndarray:
+        # Centre pixel of every cell, as [y, x, rgb]
+        pixels = pygame.surfarray.array3d(self.surface)
+        half = self.grid.cell_size // 2
+        return pixels[half::self.grid.cell_size, half::self.grid.cell_size].transpose(1, 0, 2)
+
+    def test_average_colours_are_the_mean_of_the_possible_tiles(self, setup):
+        # Arrange
+        self.grid.collapse_cell(1, 1, 2)
+        possible = self.grid.wave.to_bool()
+        expected = possible @ self.grid.tile_colours / np.maximum(possible.sum(axis=2, keepdims=True), 1)
+
+        # Act
+        result = self.grid.average_colours()
+
+        # Assert
+        assert np.allclose(result, expected)
+
+    def test_draw_paints_every_cell_in_its_average_colour(self, setup):
+        # Arrange
+        self.grid.collapse_cell(1, 1, 2)
+
+        # Act
+        self.grid.draw(self.surface)
+
+        # Assert
+        assert np.array_equal(self.cell_colours(), np.rint(self.grid.average_colours()))
+        assert not np.any(self.grid.dirty)
+
+    def test_draw_only_redraws_cells_changed_since_the_last_frame(self, setup):
+        # Arrange
+        self.grid.draw(self.surface)
+        self.grid.image.pixels[:] = 0
+
+        # Act
+        self.grid.collapse_cell(1, 1, 2)
+        changed = self.grid.dirty.copy()
+        self.grid.draw(self.surface)
+
+        # Assert
+        drawn = np.any(self.cell_colours() != 0, axis=2)
+        assert np.any(changed)
+        assert np.array_equal(drawn & ~changed, np.zeros_like(drawn))
@@ -3,7 +3,7 @@ import math
 import numpy as np
 import pytest
 
-from helpers import (
+from overlapping_version.helpers import (
     Adjacencies,
     Frequencies,
     get_valid_adjacencies,
@@ -64,6 +64,37 @@ class TestAdjacencies:
         assert np.all(tile_matches[2] == np.array([False, False, False, True, False, False]))
         assert np.all(tile_matches[3] == np.array([False, False, False, False, True, False]))
 
+    def test_adjacency_rules_match_pairwise_comparison(self):
+        # Arrange
+        rng = np.random.default_rng(0)
+        tile_data = [rng.integers(0, 2, (3, 3, 1)) for _ in range(50)]
+        expected = np.array([
+            [[get_valid_adjacencies(a, b, direction) for b in tile_data] for direction in range(4)] for a in tile_data
+        ])
+
+        # Act
+        adj = Adjacencies(tile_data)
+
+        # Assert
+        assert np.array_equal(adj.allowed, expected)
+
+    def test_sparse_adjacency_rules_list_the_allowed_neighbours(self):
+        # Arrange
+        rng = np.random.default_rng(1)
+        tile_data = [rng.integers(0, 2, (3, 3, 1)) for _ in range(50)]
+        dense = Adjacencies(tile_data).allowed
+
+        # Act
+        adj = Adjacencies(tile_data, dense=False)
+
+        # Assert
+        assert adj.allowed is None
+        for direction in range(4):
+            for tile in range(len(tile_data)):
+                row = direction * len(tile_data) + tile
+                neighbours = adj.indices[adj.indptr[row]:adj.indptr[row + 1]]
+                assert np.array_equal(np.sort(neighbours), np.flatnonzero(dense[tile, direction]))
+
     def test_compatible_compares_tile_to_the_north(self, setup):
         # Arrange
         tile = np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
@@ -194,6 +225,20 @@ class TestEnablers:
         assert enabler_counts.num_tiles == len(self.tile_data)
         assert np.all(np.equal(enabler_counts.enablers, expected))
 
+    def test_enabler_counts_of_a_volume_have_six_directions_matching_the_sparse_rules(self, setup):
+        # Arrange
+        rng = np.random.default_rng(0)
+        tiles = list(rng.integers(0, 2, size=(12, 2, 2, 2)))
+        adjacency_rules = Adjacencies(tiles, dimensions=3, overlap=1)
+
+        # Act
+        enabler_counts = EnablerCounts((2, 3, 4), len(tiles), adjacency_rules.allowed)
+
+        # Assert
+        expected = EnablerCounts.from_sparse((2, 3, 4), len(tiles), adjacency_rules.indptr)
+        assert enabler_counts.enablers.shape == (2, 3, 4, 6, len(tiles))
+        assert np.array_equal(enabler_counts.enablers, expected.enablers)
+
     @pytest.mark.parametrize("index, expected", [(0, 1), (1, 1), (2, 1), (3, 0), (4, 0), (5, 1)])
     def test_enabler_counts_get_enabler_count_returns_values_to_the_north(self, setup, index, expected):
         # Arrange
@@ -0,0 +1,87 @@
+import json
+import os
+import random
+
+import pytest
+
+from overlapping_version.grid import Grid
+from overlapping_version.instrumentation import Tracer, instrument
+from overlapping_version.tile_set import TileSet
+
+
+class TestInstrumentation:
+    @pytest.fixture
+    def setup(self):
+        random.seed(5)
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "CityTest.png"))
+        self.grid = Grid((80, 60), (8, 6), self.tile_set)
+
+    def test_grid_is_untouched_unless_instrumented(self, setup):
+        # Arrange
+
+        # Act
+        grid = Grid((80, 60), (8, 6), self.tile_set)
+
+        # Assert
+        assert "step" not in vars(grid)
+        assert "propagate_ac4" not in vars(grid)
+
+    def test_every_step_is_recorded(self, setup):
+        # Arrange
+        tracer = instrument(self.grid, Tracer())
+
+        # Act
+        steps = 0
+        while not self.grid.finished:
+            self.grid.step()
+            steps += 1
+        summary = tracer.summary()
+
+        # Assert
+        assert summary["step"]["count"] == steps
+        assert summary["select"]["count"] == steps
+        assert summary["propagate"]["tiles_removed"] > 0
+        assert summary["propagate"]["queue_pops"] > 0
+
+    def test_backtrack_records_its_depth(self, setup):
+        # Arrange
+        tracer = instrument(self.grid, Tracer())
+        self.grid.step()
+
+        # Act
+        self.grid.backtrack()
+
+        # Assert
+        backtrack = [event for event in tracer.events if event["name"] == "backtrack"]
+        assert len(backtrack) == 1
+        assert backtrack[0]["args"]["depth"] == 1
+        assert tracer.summary()["undo"]["tiles_restored"] > 0
+
+    def test_chrome_trace_holds_spans_and_counters(self, setup, tmp_path):
+        # Arrange
+        tracer = instrument(self.grid, Tracer())
+        self.grid.step()
+        path = os.path.join(tmp_path, "trace.json")
+
+        # Act
+        tracer.write(path)
+
+        # Assert
+        with open(path) as trace_file:
+            events = json.load(trace_file)["traceEvents"]
+        assert {event["ph"] for event in events} == {"X", "C"}
+        assert "trail" in [event["name"] for event in events if event["ph"] == "C"]
+
+    def test_jsonl_trace_has_one_event_per_line(self, setup, tmp_path):
+        # Arrange
+        tracer = instrument(self.grid, Tracer())
+        self.grid.step()
+        path = os.path.join(tmp_path, "trace.jsonl")
+
+        # Act
+        tracer.write(path)
+
+        # Assert
+        with open(path) as trace_file:
+            lines = [json.loads(line) for line in trace_file]
+        assert lines == tracer.events
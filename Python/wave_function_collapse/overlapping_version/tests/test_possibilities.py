@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+from common.possibilities import Wave, pack_bits, unpack_bits, popcount, num_words
+
+
+class TestBitPacking:
+    @pytest.mark.parametrize("num_bits, expected", [(1, 1), (63, 1), (64, 1), (65, 2), (1500, 24)])
+    def test_num_words(self, num_bits, expected):
+        # Arrange
+
+        # Act
+        result = num_words(num_bits)
+
+        # Assert
+        assert result == expected
+
+    @pytest.mark.parametrize("num_bits", [3, 64, 70, 200])
+    def test_pack_then_unpack_round_trips(self, num_bits):
+        # Arrange
+        rng = np.random.default_rng(num_bits)
+        flags = rng.random((4, 5, num_bits)) > 0.5
+
+        # Act
+        result = unpack_bits(pack_bits(flags), num_bits)
+
+        # Assert
+        assert np.array_equal(result, flags)
+
+    def test_pack_bits_puts_tile_in_expected_word_and_bit(self):
+        # Arrange
+        flags = np.zeros(130, dtype=np.bool_)
+        flags[66] = True
+
+        # Act
+        result = pack_bits(flags)
+
+        # Assert
+        assert result.dtype == np.uint64
+        assert result.tolist() == [0, 4, 0]
+
+    def test_popcount_counts_set_bits_along_last_axis(self):
+        # Arrange
+        rng = np.random.default_rng(7)
+        flags = rng.random((6, 150)) > 0.3
+
+        # Act
+        result = popcount(pack_bits(flags))
+
+        # Assert
+        assert np.array_equal(result, flags.sum(axis=1))
+
+
+class TestWave:
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_initialise_wave_has_every_tile_possible(self, packed):
+        # Arrange
+
+        # Act
+        wave = Wave((3, 2), 70, packed=packed)
+
+        # Assert
+        assert np.all(wave.counts() == 70)
+        assert np.all(wave.to_bool())
+
+    def test_packed_wave_uses_an_eighth_of_the_memory(self):
+        # Arrange
+
+        # Act
+        bool_wave = Wave((10, 10), 640)
+        packed_wave = Wave((10, 10), 640, packed=True)
+
+        # Assert
+        assert packed_wave.nbytes * 8 == bool_wave.nbytes
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_collapse_leaves_only_one_tile(self, packed):
+        # Arrange
+        wave = Wave((3, 2), 70, packed=packed)
+
+        # Act
+        wave.collapse(1, 1, 68)
+
+        # Assert
+        assert wave.tile_ids(1, 1).tolist() == [68]
+        assert wave.count(1, 1) == 1
+        assert wave.count(0, 0) == 70
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_constrain_ands_the_cell_with_the_mask(self, packed):
+        # Arrange
+        wave = Wave((2, 2), 100, packed=packed)
+        mask = np.zeros(100, dtype=np.bool_)
+        mask[[3, 64, 99]] = True
+
+        # Act
+        changed = wave.constrain(0, 1, wave.pack_mask(mask))
+        unchanged = wave.constrain(0, 1, wave.pack_mask(mask))
+
+        # Assert
+        assert changed is True
+        assert unchanged is False
+        assert wave.tile_ids(0, 1).tolist() == [3, 64, 99]
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_union_ors_a_stack_of_masks(self, packed):
+        # Arrange
+        wave = Wave((1, 1), 100, packed=packed)
+        masks = np.zeros((2, 100), dtype=np.bool_)
+        masks[0, 5] = True
+        masks[1, 90] = True
+
+        # Act
+        result = wave.union(wave.pack_mask(masks))
+
+        # Assert
+        assert np.array_equal(unpack_bits(result, 100) if packed else result, masks[0] | masks[1])
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_restore_puts_removed_tiles_back(self, packed):
+        # Arrange
+        wave = Wave((2, 2), 100, packed=packed)
+        before = wave.mask(1, 0)
+        wave.collapse(1, 0, 70)
+        removed = before & ~wave.mask(1, 0)
+
+        # Act
+        wave.restore(1, 0, removed)
+
+        # Assert
+        assert wave.count(1, 0) == 100
+        assert np.array_equal(wave.mask(1, 0), before)
@@ -0,0 +1,123 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from overlapping_version.grid import Grid
+from overlapping_version.propagator import neighbour_table
+from overlapping_version.tile_set import TileSet
+
+
+class TestNeighbourTable:
+    def test_neighbour_table_marks_missing_neighbours_without_wrap(self):
+        # Arrange
+
+        # Act
+        table = neighbour_table(2, 3, wrap=False)
+
+        # Assert
+        assert table[0].tolist() == [-1, 3, -1, 1]  # N, S, W, E
+        assert table[5].tolist() == [2, -1, 4, -1]
+
+    def test_neighbour_table_wraps_around_the_edges(self):
+        # Arrange
+
+        # Act
+        table = neighbour_table(2, 3, wrap=True)
+
+        # Assert
+        assert table[0].tolist() == [3, 3, 2, 1]
+        assert table[5].tolist() == [2, 2, 4, 3]
+
+
+class TestAC4Propagation:
+    @pytest.fixture
+    def setup(self):
+        self.screen_size = (800, 600)
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "CityTest.png"))
+        self.size_in_cells = (6, 5)
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_propagation_matches_the_overlap_propagator(self, setup, packed):
+        # Arrange
+        ac4 = Grid(self.screen_size, self.size_in_cells, self.tile_set, packed=packed)
+        overlap = Grid(self.screen_size, self.size_in_cells, self.tile_set, propagator="overlap")
+
+        # Act
+        ac4.collapse_cell(2, 2, 5)
+        overlap.collapse_cell(2, 2, 5)
+
+        # Assert
+        assert np.array_equal(ac4.wave.to_bool(), overlap.wave.to_bool())
+        assert np.array_equal(ac4.counts, overlap.counts)
+        assert np.array_equal(ac4.tiles, overlap.tiles)
+
+    def test_collapse_cell_reports_contradiction(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set)
+        grid.collapse_cell(0, 0, 0)
+        east_of_first = self.tile_set.adjacencies[0, 3]
+        incompatible = int(np.flatnonzero(~east_of_first)[0])
+
+        # Act
+        result = grid.collapse_cell(1, 0, incompatible)
+
+        # Assert
+        assert result is False
+
+    def test_enabler_counts_track_remaining_support(self, setup):
+        # Arrange
+        grid = Grid(self.screen_size, self.size_in_cells, self.tile_set)
+        random.seed(3)
+
+        # Act
+        grid.step()
+        grid.step()
+
+        # Assert
+        possible = grid.wave.to_bool()
+        enablers = grid.enabler_counts.enablers
+        adjacencies = self.tile_set.adjacencies.astype(np.int32)
+        # Cell (2, 2) is supported from the north by the tiles still possible in cell (2, 1)
+        expected = possible[1, 2].astype(np.int32) @ adjacencies[:, 1, :]
+        assert np.array_equal(enablers[2, 2, 0], expected)
+
+
+class TestSparsePropagation:
+    @pytest.fixture
+    def setup(self):
+        self.screen_size = (800, 600)
+        self.size_in_cells = (8, 6)
+        self.file_path = os.path.join(os.path.dirname(__file__), "CityTest.png")
+
+    def test_sparse_rules_are_chosen_below_the_density_threshold(self, setup):
+        # Arrange
+
+        # Act
+        automatic = TileSet(self.file_path)
+        dense = TileSet(self.file_path, sparse_adjacencies=False)
+
+        # Assert
+        assert automatic.density() < 0.25
+        assert automatic.sparse is True
+        assert dense.sparse is False
+
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_sparse_propagation_matches_dense_propagation(self, setup, seed):
+        # Arrange
+        sparse = TileSet(self.file_path, sparse_adjacencies=True)
+        dense = TileSet(self.file_path, sparse_adjacencies=False)
+        grids = []
+
+        # Act
+        for tile_set in (sparse, dense):
+            random.seed(seed)
+            grid = Grid(self.screen_size, self.size_in_cells, tile_set)
+            while not grid.finished:
+                grid.step()
+            grids.append(grid)
+
+        # Assert
+        assert np.array_equal(grids[0].tiles, grids[1].tiles)
+        assert np.array_equal(grids[0].enabler_counts.enablers, grids[1].enabler_counts.enablers)
@@ -0,0 +1,90 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from overlapping_version import speculative
+from overlapping_version.tile_set import TileSet
+
+
+class TestSpeculativeAttempt:
+    @pytest.fixture
+    def setup(self):
+        self.size = (8, 6)
+        self.stop = threading.Event()
+        speculative.init_worker(TileSet(os.path.join(os.path.dirname(__file__), "CityTest.png")), self.stop)
+
+    def test_attempt_returns_the_finished_grid(self, setup):
+        # Arrange
+
+        # Act
+        grid, stats = speculative.attempt(0, 5, self.size, None, {})
+
+        # Assert
+        assert stats["status"] == "finished"
+        assert np.all(grid.tiles >= 0)
+
+    def test_attempt_is_repeatable_from_its_seed(self, setup):
+        # Arrange
+        first, _ = speculative.attempt(0, 5, self.size, None, {})
+
+        # Act
+        second, _ = speculative.attempt(1, 5, self.size, None, {})
+
+        # Assert
+        assert np.array_equal(first.tiles, second.tiles)
+
+    def test_attempt_stops_once_another_has_won(self, setup):
+        # Arrange
+        self.stop.set()
+
+        # Act
+        grid, stats = speculative.attempt(0, 5, self.size, None, {})
+
+        # Assert
+        assert grid is None
+        assert stats["status"] == "cancelled"
+        assert stats["steps"] == 0
+
+
+class TestSpeculativeSolve:
+    @pytest.fixture
+    def setup(self):
+        self.size = (8, 6)
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "CityTest.png"))
+
+    def test_solve_returns_only_the_winning_grid_and_cancels_the_rest(self, setup):
+        # Arrange
+        attempts = 6
+
+        # Act
+        grid, report = speculative.solve(self.tile_set, self.size, attempts=attempts, seed=3, workers=2)
+
+        # Assert
+        assert np.all(grid.tiles >= 0)
+        assert report["workers"] == 2
+        winner = report["attempts"][[stats["attempt"] for stats in report["attempts"]].index(report["winner"])]
+        assert winner["status"] == "finished"
+        # The grid sent back is the winner's, which its seed repeats
+        speculative.init_worker(self.tile_set, threading.Event())
+        repeat, _ = speculative.attempt(report["winner"], winner["seed"], self.size, None, {})
+        assert np.array_equal(grid.tiles, repeat.tiles)
+        # Once there is a winner the stop event cancels the attempts still running, and the rest never start
+        assert report["cancelled"] >= 1
+        assert report["finished"] + report["failed"] + report["timeout"] + report["cancelled"] == attempts
+        assert report["started"] == len(report["attempts"])
+        assert [stats["attempt"] for stats in report["attempts"]] == sorted(stats["attempt"] for stats in report["attempts"])
+
+    def test_solve_returns_none_when_every_attempt_fails(self, setup):
+        # Arrange
+        # No time at all for any attempt
+
+        # Act
+        grid, report = speculative.solve(self.tile_set, self.size, attempts=3, workers=2, budget=0)
+
+        # Assert
+        assert grid is None
+        assert report["winner"] is None
+        assert report["started"] == report["timeout"] == 3
+        assert all(stats["steps"] == 0 for stats in report["attempts"])
@@ -1,7 +1,9 @@
+import os
+import pickle
 import numpy as np
 import pytest
 
-from tile_set import TileSet
+from overlapping_version.tile_set import TileSet
 
 
 class TestTileSet:
@@ -9,17 +11,17 @@ class TestTileSet:
     def setup(self):
         # tile will not make adjacencies with itself or tile3 but will with tile2 in all 4 directions
         self.bad_file_path = r"this is not a path"
-        self.good_file_path = r"..\samples\City.png"
+        self.good_file_path = os.path.join(os.path.dirname(__file__), "..", "..", "samples", "City.png")
         self.tile = np.array([[[0, 0, 255], [0, 0, 0], [0, 0, 255]],
                               [[0, 0, 0], [0, 0, 255], [0, 0, 0]],
                               [[0, 0, 255], [0, 0, 0], [0, 0, 255]]])
 
     def test_initialise_tile_set_reads_pixels_of_valid_passed_in_file(self, mocker, setup):
         # Arrange
-        mock_read = mocker.patch("tile_set.TileSet.read_source_file")
-        mocker.patch("tile_set.TileSet.create_tiles")
-        mocker.patch("tile_set.Adjacencies")
-        mocker.patch("tile_set.Frequencies")
+        mock_read = mocker.patch("overlapping_version.tile_set.TileSet.read_source_file")
+        mocker.patch("overlapping_version.tile_set.TileSet.create_tiles")
+        mocker.patch("overlapping_version.tile_set.Adjacencies")
+        mocker.patch("overlapping_version.tile_set.Frequencies")
 
         # Act
         TileSet(source_file=self.good_file_path)
@@ -48,9 +50,9 @@ class TestTileSet:
 
     def test_initialise_tile_set_creates_tiles_from_passed_in_pixels(self, mocker, setup):
         # Arrange
-        mock_create = mocker.patch("tile_set.TileSet.create_tiles")
-        mocker.patch("tile_set.Adjacencies")
-        mocker.patch("tile_set.Frequencies")
+        mock_create = mocker.patch("overlapping_version.tile_set.TileSet.create_tiles")
+        mocker.patch("overlapping_version.tile_set.Adjacencies")
+        mocker.patch("overlapping_version.tile_set.Frequencies")
 
         # Act
         TileSet(source_file=self.good_file_path)
@@ -70,7 +72,7 @@ class TestTileSet:
         # Assert
         assert np.all(np.equal(ts.tiles[0], expected))
 
-    def test_initialise_tile_set_correctly_creates_seventh_tile(self, setup):
+    def test_initialise_tile_set_correctly_creates_fifth_tile(self, setup):
         # Arrange
         expected = np.array([[[255, 255, 255], [255, 255, 255], [255, 255, 255]],
                              [[0, 0, 0], [0, 0, 0], [255, 255, 255]],
@@ -80,9 +82,9 @@ class TestTileSet:
         ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert np.all(np.equal(ts.tiles[6], expected))
+        assert np.all(np.equal(ts.tiles[4], expected))
 
-    def test_initialise_tile_set_correctly_creates_eighth_tile(self, setup):
+    def test_initialise_tile_set_correctly_creates_sixth_tile(self, setup):
         # Arrange
         expected = np.array([[[255, 255, 255], [255, 255, 255], [255, 255, 255]],
                              [[0, 0, 0], [255, 255, 255], [255, 255, 255]],
@@ -92,9 +94,9 @@ class TestTileSet:
         ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert np.all(np.equal(ts.tiles[7], expected))
+        assert np.all(np.equal(ts.tiles[5], expected))
 
-    def test_initialise_tile_set_correctly_creates_ninth_tile(self, setup):
+    def test_initialise_tile_set_correctly_creates_seventh_tile(self, setup):
         # Arrange
         expected = np.array([[[255, 255, 255], [255, 255, 255], [255, 255, 255]],
                              [[255, 255, 255], [255, 255, 255], [0, 0, 0]],
@@ -104,9 +106,9 @@ class TestTileSet:
         ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert np.all(np.equal(ts.tiles[8], expected))
+        assert np.all(np.equal(ts.tiles[6], expected))
 
-    def test_initialise_tile_set_correctly_creates_55th_tile(self, setup):
+    def test_initialise_tile_set_correctly_creates_25th_tile(self, setup):
         # Arrange
         expected = np.array([[[255, 255, 255], [0, 0, 0], [237, 28, 36]],
                              [[255, 255, 255], [0, 0, 0], [0, 0, 0]],
@@ -116,9 +118,9 @@ class TestTileSet:
         ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert np.all(np.equal(ts.tiles[54], expected))
+        assert np.all(np.equal(ts.tiles[24], expected))
 
-    def test_initialise_tile_set_correctly_creates_61st_tile(self, setup):
+    def test_initialise_tile_set_correctly_creates_29th_tile(self, setup):
         # Arrange
         expected = np.array([[[237, 28, 36], [0, 0, 0], [255, 255, 255]],
                              [[0, 0, 0], [0, 0, 0], [255, 255, 255]],
@@ -128,9 +130,9 @@ class TestTileSet:
         ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert np.all(np.equal(ts.tiles[60], expected))
+        assert np.all(np.equal(ts.tiles[28], expected))
 
-    def test_initialise_tile_set_correctly_creates_64th_tile(self, setup):
+    def test_initialise_tile_set_correctly_creates_32nd_tile(self, setup):
         # Arrange
         expected = np.array([[[255, 255, 255], [0, 0, 0], [0, 0, 0]],
                              [[255, 255, 255], [255, 255, 255], [255, 255, 255]],
@@ -140,9 +142,9 @@ class TestTileSet:
         ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert np.all(np.equal(ts.tiles[63], expected))
+        assert np.all(np.equal(ts.tiles[31], expected))
 
-    def test_initialise_tile_set_correctly_creates_71st_tile(self, setup):
+    def test_initialise_tile_set_correctly_creates_35th_tile(self, setup):
         # Arrange
         expected = np.array([[[0, 0, 0], [255, 255, 255], [255, 255, 255]],
                              [[255, 255, 255], [255, 255, 255], [255, 255, 255]],
@@ -152,9 +154,9 @@ class TestTileSet:
         ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert np.all(np.equal(ts.tiles[70], expected))
+        assert np.all(np.equal(ts.tiles[34], expected))
 
-    def test_initialise_tile_set_correctly_creates_73rd_tile(self, setup):
+    def test_initialise_tile_set_correctly_creates_37th_tile(self, setup):
         # Arrange
         expected = np.array([[[255, 255, 255], [255, 255, 255], [255, 255, 255]],
                              [[255, 255, 255], [255, 255, 255], [255, 255, 255]],
@@ -164,9 +166,9 @@ class TestTileSet:
         ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert np.all(np.equal(ts.tiles[72], expected))
+        assert np.all(np.equal(ts.tiles[36], expected))
 
-    def test_initialise_tile_set_correctly_creates_81st_tile(self, setup):
+    def test_initialise_tile_set_correctly_creates_41st_tile(self, setup):
         # Arrange
         expected = np.array([[[255, 255, 255], [255, 255, 255], [255, 255, 255]],
                              [[255, 255, 255], [255, 255, 255], [255, 255, 255]],
@@ -176,7 +178,7 @@ class TestTileSet:
         ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert np.all(np.equal(ts.tiles[80], expected))
+        assert np.all(np.equal(ts.tiles[40], expected))
 
     def test_initialise_tile_set_correctly_creates_first_tile_with_rotation(self, setup):
         # Arrange
@@ -234,10 +236,7 @@ class TestTileSet:
         expected2 = np.rot90(expected, 1)
         expected3 = np.rot90(expected, 2)
         expected4 = np.rot90(expected, 3)
-        expected5 = np.flip(expected, axis=0)
-        expected6 = np.rot90(expected5, 1)
-        expected7 = np.rot90(expected5, 2)
-        expected8 = np.rot90(expected5, 3)
+        expected5 = np.flip(expected, axis=0)  # Same pattern as expected4, so it is not repeated
 
         # Act
         ts = TileSet(source_file=self.good_file_path, include_rotated_kernels=True, include_flipped_kernels=True)
@@ -247,67 +246,85 @@ class TestTileSet:
         assert np.all(np.equal(ts.tiles[1], expected2))
         assert np.all(np.equal(ts.tiles[2], expected3))
         assert np.all(np.equal(ts.tiles[3], expected4))
-        assert np.all(np.equal(ts.tiles[4], expected5))
-        assert np.all(np.equal(ts.tiles[5], expected6))
-        assert np.all(np.equal(ts.tiles[6], expected7))
-        assert np.all(np.equal(ts.tiles[7], expected8))
+        assert not any(np.array_equal(tile, expected5) for tile in ts.tiles[4:])
 
-    def test_initialise_tile_set_creates_a_tile_for_every_pixel_without_rotation_or_flipping(self, setup):
+    @pytest.mark.parametrize("rotate, flip, symmetries", [(False, False, 1), (True, False, 4), (False, True, 2), (True, True, 8)])
+    def test_initialise_tile_set_creates_one_tile_for_every_unique_pattern(self, setup, rotate, flip, symmetries):
         # Arrange
 
         # Act
-        ts = TileSet(source_file=self.good_file_path)
-        expected = ts.pixels.shape[0] * ts.pixels.shape[1]
+        ts = TileSet(source_file=self.good_file_path, include_rotated_kernels=rotate, include_flipped_kernels=flip)
+        flat_tiles = np.stack(ts.tiles).reshape(len(ts.tiles), -1)
 
         # Assert
-        assert len(ts.tiles) == expected
+        assert len(np.unique(flat_tiles, axis=0)) == len(ts.tiles)
+        assert ts.tile_counts.sum() == ts.pixels.shape[0] * ts.pixels.shape[1] * symmetries
 
-    def test_initialise_tile_set_creates_4_tiles_for_every_pixel_with_rotation_without_flipping(self, setup):
+    def test_initialise_tile_set_creates_adjacency_rules(self, setup):
         # Arrange
 
         # Act
-        ts = TileSet(source_file=self.good_file_path, include_rotated_kernels=True)
-        expected = ts.pixels.shape[0] * ts.pixels.shape[1] * 4
+        ts = TileSet(source_file=self.good_file_path)
+        expected = (len(ts.tiles), 4, len(ts.tiles))
 
         # Assert
-        assert len(ts.tiles) == expected
+        assert ts.adjacencies.shape == expected
 
-    def test_initialise_tile_set_creates_2_tiles_for_every_pixel_without_rotation_with_flipping(self, setup):
+    def test_initialise_tile_set_creates_frequency_rules(self, setup):
         # Arrange
 
         # Act
-        ts = TileSet(source_file=self.good_file_path, include_flipped_kernels=True)
-        expected = ts.pixels.shape[0] * ts.pixels.shape[1] * 2
+        ts = TileSet(source_file=self.good_file_path)
 
         # Assert
-        assert len(ts.tiles) == expected
+        assert len(ts.frequencies) == len(ts.tiles)
+        assert ts.frequencies.sum() == ts.pixels.shape[0] * ts.pixels.shape[1]
 
-    def test_initialise_tile_set_creates_8_tiles_for_every_pixel_with_rotation_and_flipping(self, setup):
+
+class TestTileSetCache:
+    @pytest.fixture
+    def setup(self):
+        self.file_path = os.path.join(os.path.dirname(__file__), "CityTest.png")
+
+    def test_tile_set_is_rebuilt_from_the_cache(self, mocker, setup, tmp_path):
         # Arrange
+        original = TileSet(self.file_path, cache_dir=tmp_path)
+        mock_adjacencies = mocker.patch("overlapping_version.tile_set.Adjacencies")
+        mock_frequencies = mocker.patch("overlapping_version.tile_set.Frequencies")
 
         # Act
-        ts = TileSet(source_file=self.good_file_path, include_rotated_kernels=True, include_flipped_kernels=True)
-        expected = ts.pixels.shape[0] * ts.pixels.shape[1] * 8
+        cached = TileSet(self.file_path, cache_dir=tmp_path)
 
         # Assert
-        assert len(ts.tiles) == expected
-
-    def test_initialise_tile_set_creates_adjacency_rules(self, setup):
+        assert mock_adjacencies.call_count == 0
+        assert mock_frequencies.call_count == 0
+        assert np.array_equal(np.stack(cached.tiles), np.stack(original.tiles))
+        assert np.array_equal(cached.adjacencies, original.adjacencies)
+        assert np.array_equal(cached.frequencies, original.frequencies)
+        assert np.array_equal(cached.tile_counts, original.tile_counts)
+
+    def test_cache_key_depends_on_the_tile_options(self, setup):
         # Arrange
 
         # Act
-        ts = TileSet(source_file=self.good_file_path)
-        expected = (ts.pixels.shape[0] * ts.pixels.shape[1], 4, ts.pixels.shape[0] * ts.pixels.shape[1])
+        plain = TileSet.cache_key(self.file_path, 3, False, False)
+        rotated = TileSet.cache_key(self.file_path, 3, True, False)
+        larger = TileSet.cache_key(self.file_path, 2, False, False)
 
         # Assert
-        assert ts.adjacencies.shape == expected
+        assert len({plain, rotated, larger}) == 3
 
-    def test_initialise_tile_set_creates_frequency_rules(self, setup):
+    def test_cached_tile_set_pickles_as_its_cache_path(self, setup, tmp_path):
         # Arrange
+        original = TileSet(self.file_path, cache_dir=tmp_path)
 
         # Act
-        ts = TileSet(source_file=self.good_file_path)
-        expected = ts.pixels.shape[0] * ts.pixels.shape[1]
+        pickled = pickle.dumps(original)
+        unpickled = pickle.loads(pickled)
 
         # Assert
-        assert len(ts.frequencies) == expected
+        assert len(pickled) < 1000
+        assert isinstance(unpickled.adjacency_indices, np.memmap)
+        assert np.array_equal(np.stack(unpickled.tiles), np.stack(original.tiles))
+        assert np.array_equal(unpickled.adjacencies, original.adjacencies)
+        assert unpickled.sparse == original.sparse
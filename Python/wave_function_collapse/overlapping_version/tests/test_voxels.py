@@ -0,0 +1,113 @@
+import random
+
+import numpy as np
+import pytest
+
+from overlapping_version.propagator import OPPOSITE, neighbour_table, neighbour_table_nd
+from overlapping_version.voxels import VoxelGrid, VoxelTileSet, main
+
+
+class TestVoxels:
+    @pytest.fixture
+    def setup(self):
+        # Ground along the bottom of the volume, air above it, and a pillar standing on the ground
+        self.sample = np.zeros((6, 6, 6), dtype=np.uint8)
+        self.sample[:, :, :2] = 1
+        self.sample[2, 3, 2:5] = 2
+
+    def test_neighbour_table_nd_matches_the_2d_table(self, setup):
+        # Arrange
+
+        # Act
+        table = neighbour_table_nd((4, 5), False)
+
+        # Assert
+        assert np.array_equal(table, neighbour_table(4, 5, False))
+
+    def test_neighbour_table_nd_has_six_opposite_directions_in_3d(self, setup):
+        # Arrange
+        shape = (3, 4, 5)
+
+        # Act
+        table = neighbour_table_nd(shape, True)
+
+        # Assert
+        assert table.shape == (60, 6)
+        for direction in range(6):
+            assert np.array_equal(table[table[:, direction], OPPOSITE[direction]], np.arange(60))
+
+    def test_tile_set_finds_unique_patterns_with_six_directions_of_rules(self, setup):
+        # Arrange
+
+        # Act
+        tile_set = VoxelTileSet(self.sample, kernel_size=2)
+
+        # Assert
+        assert tile_set.tiles.shape[1:] == (2, 2, 2)
+        assert len(np.unique(tile_set.tiles.reshape(len(tile_set), -1), axis=0)) == len(tile_set)
+        assert tile_set.frequencies.sum() == self.sample.size
+        assert len(tile_set.adjacency_indptr) == 6 * len(tile_set) + 1
+
+    def test_kernel_size_must_overlap(self, setup):
+        # Arrange
+
+        # Act / Assert
+        with pytest.raises(ValueError):
+            VoxelTileSet(self.sample, kernel_size=1)
+
+    def test_solved_volume_only_has_allowed_neighbours(self, setup):
+        # Arrange
+        random.seed(3)
+        tile_set = VoxelTileSet(self.sample, kernel_size=2)
+        grid = VoxelGrid((8, 8, 8), tile_set, max_restarts=3)
+        indptr, indices = tile_set.adjacency_indptr, tile_set.adjacency_indices
+
+        # Act
+        while not grid.finished:
+            grid.step()
+
+        # Assert
+        assert not grid.failed
+        assert grid.voxels().shape == (8, 8, 8)
+        for cell in range(grid.num_cells):
+            for direction in range(6):
+                neighbour = grid.neighbour_table[cell, direction]
+                if neighbour >= 0:
+                    row = direction * len(tile_set) + grid.tiles[cell]
+                    assert grid.tiles[neighbour] in indices[indptr[row]:indptr[row + 1]]
+
+    def test_2d_samples_are_solved_too(self, setup):
+        # Arrange
+        random.seed(1)
+        sample = np.indices((6, 6)).sum(axis=0) % 3
+        grid = VoxelGrid((9, 12), VoxelTileSet(sample, kernel_size=2), wrap=True)
+
+        # Act
+        while not grid.finished:
+            grid.step()
+
+        # Assert
+        volume = grid.voxels()
+        assert not grid.failed
+        assert np.array_equal((volume[:, 1:] - volume[:, :-1]) % 3, np.ones((9, 11)))
+
+    def test_enabler_counts_use_the_smallest_type(self, setup):
+        # Arrange
+
+        # Act
+        grid = VoxelGrid((4, 4, 4), VoxelTileSet(self.sample, kernel_size=2))
+
+        # Assert
+        assert grid.enablers.dtype == np.int8
+        assert grid.enablers.shape == (64, 6, len(grid.tile_set))
+
+    def test_main_saves_the_volume(self, setup, tmp_path):
+        # Arrange
+        np.save(tmp_path / "sample.npy", self.sample)
+        output = tmp_path / "volume.npy"
+
+        # Act
+        main([str(tmp_path / "sample.npy"), "--size", "5", "6", "7", "--output", str(output)])
+
+        # Assert
+        assert np.load(output).shape == (5, 6, 7)
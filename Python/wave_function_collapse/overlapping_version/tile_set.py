@@ -1,44 +1,159 @@
+import hashlib
+import os
+import tempfile
 from typing import AnyStr
 import numpy as np
 from PIL import Image
 from numpy import ndarray, dtype
-from helpers import Adjacencies, Frequencies
+from .helpers import Adjacencies, Frequencies, dense_adjacencies
+
+# Bump whenever the way tiles or rules are built changes, so that stale cache entries are never loaded
+CACHE_VERSION = 4
+CACHED_ARRAYS = ("pixels", "tiles", "tile_counts", "adjacency_indptr", "adjacency_indices", "frequencies")
+
+# The solver uses the CSR adjacency rules when fewer than this fraction of tile pairs are compatible. CSR takes four
+# bytes per compatible pair against one byte per pair for the dense tensor, so below a quarter it is smaller as well
+SPARSE_ADJACENCY_DENSITY = 0.25
 
 
 class TileSet:
-    def __init__(self, source_file: AnyStr, kernel_size: int = 3, include_rotated_kernels: bool=False, include_flipped_kernels: bool=False):
-        self.pixels = self.read_source_file(source_file)
+    def __init__(self, source_file: AnyStr, kernel_size: int = 3, include_rotated_kernels: bool=False, include_flipped_kernels: bool=False, cache_dir: AnyStr | None=None, sparse_adjacencies: bool | None=None):
         self.kernel_size = kernel_size
+        self._adjacencies = None
+
+        # Rule tables are cached on disk, keyed by the content of the sample and the options used to build them
+        self.cache_path = None
+        if cache_dir is not None:
+            self.cache_path = os.path.join(
+                cache_dir, self.cache_key(source_file, kernel_size, include_rotated_kernels, include_flipped_kernels)
+            )
+            if self.load_cache(self.cache_path):
+                self.sparse = self.choose_sparse(sparse_adjacencies)
+                return
+
+        self.pixels = self.read_source_file(source_file)
         self.tiles = []
+        self.tile_counts = np.zeros(0, dtype=np.int64)
         self.create_tiles(include_rotated_kernels, include_flipped_kernels)
-        self.adjacencies = Adjacencies(self.tiles).allowed
-        self.frequencies = Frequencies(self.tiles).rules
+        adjacencies = Adjacencies(self.tiles, dense=False)
+        self.adjacency_indptr, self.adjacency_indices = adjacencies.indptr, adjacencies.indices
+        self.frequencies = Frequencies(self.tiles, self.tile_counts).rules
+        self.sparse = self.choose_sparse(sparse_adjacencies)
+
+        if self.cache_path is not None:
+            self.save_cache(self.cache_path)
+
+    def __getstate__(self) -> dict:
+        # A cached tile set is sent to other processes as its cache path, and each one memory-maps the same files, so
+        # the operating system shares a single copy of the rule tables between them
+        if self.cache_path is not None and os.path.isdir(self.cache_path):
+            return {"cache_path": self.cache_path, "kernel_size": self.kernel_size, "sparse": self.sparse}
+        return self.__dict__
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if "pixels" not in state:
+            self._adjacencies = None
+            self.load_cache(self.cache_path)
+
+    @property
+    def adjacencies(self) -> ndarray:
+        """Dense [tile, direction, tile] adjacency rules, only expanded from the CSR form when first asked for"""
+        if self._adjacencies is None:
+            self._adjacencies = dense_adjacencies(self.adjacency_indptr, self.adjacency_indices, len(self.tiles))
+        return self._adjacencies
+
+    def density(self) -> float:
+        """Fraction of tile pairs which are compatible"""
+        return len(self.adjacency_indices) / max(4 * len(self.tiles) ** 2, 1)
+
+    def choose_sparse(self, sparse_adjacencies: bool | None) -> bool:
+        """sparse_adjacencies forces the CSR (True) or dense (False) rules, None picks by density"""
+        if sparse_adjacencies is not None:
+            return sparse_adjacencies
+        return self.density() < SPARSE_ADJACENCY_DENSITY
+
+    @staticmethod
+    def cache_key(source_file: AnyStr, kernel_size: int, include_rotated_kernels: bool, include_flipped_kernels: bool) -> str:
+        with open(source_file, "rb") as f:
+            digest = hashlib.sha256(f.read())
+        digest.update(f"{CACHE_VERSION}:{kernel_size}:{include_rotated_kernels}:{include_flipped_kernels}".encode())
+        return digest.hexdigest()
+
+    def load_cache(self, cache_path: AnyStr) -> bool:
+        """Memory-map a cached rule table bundle. Returns False if there is no entry for this sample"""
+        if not os.path.isdir(cache_path):
+            return False
+
+        arrays = {name: np.load(os.path.join(cache_path, f"{name}.npy"), mmap_mode="r") for name in CACHED_ARRAYS}
+        self.pixels = arrays["pixels"]
+        self.tiles = list(arrays["tiles"])
+        self.tile_counts = arrays["tile_counts"]
+        self.adjacency_indptr = arrays["adjacency_indptr"]
+        self.adjacency_indices = arrays["adjacency_indices"]
+        self.frequencies = arrays["frequencies"]
+        return True
+
+    def save_cache(self, cache_path: AnyStr) -> None:
+        # Write into a temporary folder and rename it into place, so other processes never see a partial entry
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        staging = tempfile.mkdtemp(dir=os.path.dirname(cache_path) or ".")
+        arrays = dict(
+            pixels=self.pixels,
+            tiles=np.stack(self.tiles),
+            tile_counts=self.tile_counts,
+            adjacency_indptr=self.adjacency_indptr,
+            adjacency_indices=self.adjacency_indices,
+            frequencies=self.frequencies,
+        )
+        for name in CACHED_ARRAYS:
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+
+        try:
+            os.rename(staging, cache_path)
+        except OSError:
+            # Another process got there first
+            for name in CACHED_ARRAYS:
+                os.remove(os.path.join(staging, f"{name}.npy"))
+            os.rmdir(staging)
 
     def create_tiles(self, include_rotated_kernels: bool=False, include_flipped_kernels: bool=False) -> None:
+        """
+        Build the unique kernel_size x kernel_size patterns of the (wrapping) source image, along with the number of
+        times each one appears. Patterns are kept in order of first appearance.
+        """
+        windows = self.extract_windows(self.pixels, self.kernel_size)
 
-        for y in range(self.pixels.shape[0]):
-            cols = [(y + dy) % self.pixels.shape[0] for dy in range(self.kernel_size)]
+        # Every symmetry of a window follows straight after it, in the same order tiles were originally appended
+        variants = [windows]
+        if include_rotated_kernels:
+            variants += [np.rot90(windows, turns, axes=(1, 2)) for turns in (1, 2, 3)]
 
-            for x in range(self.pixels.shape[1]):
-                rows = [(x + dx) % self.pixels.shape[1] for dx in range(self.kernel_size)]
+        if include_flipped_kernels:
+            flipped = np.flip(windows, axis=1)
+            variants.append(flipped)
 
-                tile_pixels = self.pixels[np.ix_(cols, rows)]
-                self.tiles.append(tile_pixels)
+            if include_rotated_kernels:
+                variants += [np.rot90(flipped, turns, axes=(1, 2)) for turns in (1, 2, 3)]
 
-                if include_rotated_kernels:
-                    self.add_kernel_rotations(tile_pixels)
+        candidates = np.stack(variants, axis=1).reshape(-1, *windows.shape[1:])
 
-                if include_flipped_kernels:
-                    tile_pixels = np.flip(tile_pixels, axis=0)
-                    self.tiles.append(tile_pixels)
+        # View each pattern as a single opaque value so np.unique compares whole patterns at once
+        flat = np.ascontiguousarray(candidates.reshape(len(candidates), -1))
+        keys = flat.view(np.dtype((np.void, flat.shape[1] * flat.itemsize)))[:, 0]
+        _, first_index, counts = np.unique(keys, return_index=True, return_counts=True)
+        order = np.argsort(first_index)
 
-                    if include_rotated_kernels:
-                        self.add_kernel_rotations(tile_pixels)
+        self.tiles = list(candidates[first_index[order]])
+        self.tile_counts = counts[order]
 
-    def add_kernel_rotations(self, kernel_pixels: ndarray) -> None:
-        self.tiles.append(np.rot90(kernel_pixels, 1))
-        self.tiles.append(np.rot90(kernel_pixels, 2))
-        self.tiles.append(np.rot90(kernel_pixels, 3))
+    @staticmethod
+    def extract_windows(pixels: ndarray, kernel_size: int) -> ndarray:
+        """Every kernel_size x kernel_size window of the image, wrapping at the edges, as [H * W, k, k, channels]"""
+        padded = np.pad(pixels, ((0, kernel_size - 1), (0, kernel_size - 1), (0, 0)), mode="wrap")
+        windows = np.lib.stride_tricks.sliding_window_view(padded, (kernel_size, kernel_size), axis=(0, 1))
+        # sliding_window_view puts the window axes last: [H, W, channels, k, k]
+        return windows.transpose(0, 1, 3, 4, 2).reshape(-1, kernel_size, kernel_size, pixels.shape[2])
 
     @staticmethod
     def read_source_file(source_file: AnyStr) -> ndarray[tuple[int, ...], dtype[int]] | None:
@@ -0,0 +1,140 @@
+"""
+Voxel wave function collapse - the overlapping model for samples with any number of axes, such as 3D volumes of voxel
+ids, solved with the same Numba propagation kernels as the 2D Grid. Every axis adds a pair of directions, so a volume
+has six. Outputs are arrays of voxel ids, saved with numpy.
+
+The possibility tensor is always bit-packed, as [X, Y, Z, words of tiles], the enabler counts use the smallest integer
+type that holds them, and the trail is compacted to the backtrack depth, so volumes of 64x64x64 fit easily in memory.
+
+Example - a 32x32x32 volume from a 3D sample saved with numpy, using 2x2x2 patterns:
+    python -m overlapping_version.voxels sample.npy --size 32 32 32 --kernel-size 2 --output volume.npy
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from .helpers import Adjacencies, EnablerCounts
+from .solver import Solver
+
+
+class VoxelTileSet:
+    """
+    Every kernel_size^n pattern of an n-axis sample of voxel ids (wrapping at the edges), with how often each appears
+    and which patterns may sit next to each other, as CSR rules with two directions per axis.
+    Two patterns may be neighbours when they overlap exactly once one is moved a single voxel along the axis.
+    """
+    def __init__(self, voxels: np.ndarray, kernel_size: int=2, include_rotated_kernels: bool=False) -> None:
+        if kernel_size < 2:
+            raise ValueError("kernel_size must be at least 2, so that neighbouring patterns overlap")
+
+        self.voxels = np.asarray(voxels)
+        self.dimensions = self.voxels.ndim
+        self.kernel_size = kernel_size
+
+        windows = self.extract_windows(self.voxels, kernel_size)
+        if include_rotated_kernels:
+            # Turn about the last axis, which is up for a volume
+            windows = np.stack([windows] + [np.rot90(windows, turns, axes=(1, 2)) for turns in (1, 2, 3)], axis=1)
+            windows = windows.reshape(-1, *windows.shape[2:])
+
+        flat = np.ascontiguousarray(windows.reshape(len(windows), -1))
+        keys = flat.view(np.dtype((np.void, flat.shape[1] * flat.itemsize)))[:, 0]
+        _, first_index, counts = np.unique(keys, return_index=True, return_counts=True)
+        order = np.argsort(first_index)
+        self.tiles = windows[first_index[order]]
+        self.frequencies = counts[order].astype(np.int64)
+
+        adjacencies = Adjacencies(list(self.tiles), dense=False, dimensions=self.dimensions, overlap=kernel_size - 1)
+        self.adjacency_indptr, self.adjacency_indices = adjacencies.indptr, adjacencies.indices
+        self.sparse = True
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    @staticmethod
+    def extract_windows(voxels: np.ndarray, kernel_size: int) -> np.ndarray:
+        """Every kernel_size^n window of the sample, wrapping at the edges, as [number of voxels, k, k, ...]"""
+        padded = np.pad(voxels, [(0, kernel_size - 1)] * voxels.ndim, mode="wrap")
+        windows = np.lib.stride_tricks.sliding_window_view(padded, (kernel_size,) * voxels.ndim)
+        return windows.reshape(-1, *(kernel_size,) * voxels.ndim)
+
+    def voxel_values(self) -> np.ndarray:
+        """The voxel each pattern stands for in the output - the one at its origin"""
+        return self.tiles[(slice(None),) + (0,) * self.dimensions]
+
+
+class VoxelGrid(Solver):
+    """
+    Solver for an output with as many axes as the tile set, holding everything in flat arrays indexed by cell.
+    Steps, backtracking and restarts are the same as in the 2D Grid.
+    """
+    def __init__(self, shape: tuple[int, ...], tile_set: VoxelTileSet, wrap: bool=False, max_backtrack_depth: int | None=8, max_restarts: int=0):
+        if len(shape) != tile_set.dimensions:
+            raise ValueError(f"a {tile_set.dimensions}D tile set needs a {tile_set.dimensions}D shape")
+
+        # The solver keeps a running sum of a value per possible tile, which the 2D Grid uses for colours. Here it is
+        # the voxel each tile stands for
+        self.values = tile_set.voxel_values()
+
+        # No enabler count can be larger than the longest rule row, so use the smallest type which holds that
+        longest_row = int(np.diff(tile_set.adjacency_indptr).max(initial=0))
+        self.enabler_dtype = next(dtype for dtype in (np.int8, np.int16, np.int32) if longest_row <= np.iinfo(dtype).max)
+
+        num_cells = int(np.prod(shape))
+        super().__init__(
+            shape, (num_cells,), tile_set, self.values.astype(np.float64).reshape(-1, 1), wrap, packed=True,
+            max_backtrack_depth=max_backtrack_depth, max_restarts=max_restarts
+        )
+
+    def make_enabler_counts(self) -> EnablerCounts:
+        return EnablerCounts.from_sparse(self.shape, self.num_tiles, self.tile_set.adjacency_indptr, dtype=self.enabler_dtype)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the solver arrays"""
+        return sum(array.nbytes for array in self._flat_state() if isinstance(array, np.ndarray)) + self.enablers.nbytes + self.removals.nbytes
+
+    def voxels(self, empty: int=-1) -> np.ndarray:
+        """The output volume, with empty in any cell which isn't collapsed"""
+        volume = np.full(self.num_cells, empty, dtype=np.result_type(self.values.dtype, np.int8))
+        collapsed = self.tiles >= 0
+        volume[collapsed] = self.values[self.tiles[collapsed]]
+        return volume.reshape(self.shape)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate a volume of voxels from a sample volume saved with numpy.")
+    parser.add_argument("sample", help=".npy file of voxel ids, with two or three axes")
+    parser.add_argument("--size", type=int, nargs="+", default=(32, 32, 32), help="output size in voxels, one per axis")
+    parser.add_argument("--kernel-size", type=int, default=2)
+    parser.add_argument("--rotate", action="store_true", help="include kernels turned about the last axis")
+    parser.add_argument("--wrap", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-backtrack-depth", type=int, default=8)
+    parser.add_argument("--max-restarts", type=int, default=3)
+    parser.add_argument("--output", default="volume.npy", help=".npy file to write the voxel ids to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    tile_set = VoxelTileSet(np.load(args.sample), kernel_size=args.kernel_size, include_rotated_kernels=args.rotate)
+
+    start = time.perf_counter()
+    grid = VoxelGrid(tuple(args.size), tile_set, wrap=args.wrap, max_backtrack_depth=args.max_backtrack_depth, max_restarts=args.max_restarts)
+    while not grid.finished:
+        grid.step()
+
+    np.save(args.output, grid.voxels())
+    status = "failed" if grid.failed else "finished"
+    print(
+        f"{'x'.join(map(str, grid.shape))} volume {status} in {time.perf_counter() - start:.2f}s with {len(tile_set)} "
+        f"patterns, using {grid.nbytes / 2 ** 20:.1f} MiB, written to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
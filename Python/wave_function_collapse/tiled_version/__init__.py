@@ -0,0 +1 @@
+"""Tiled model - tiles are read from a folder of images and matched by their edges"""
@@ -0,0 +1,149 @@
+"""
+Headless batch generation, without a pygame window or frame limit.
+
+Example - 100 images of 50x40 tiles from seeds 0-99, on every core, giving up on any image after 10 seconds:
+    python -m tiled_version.batch tilesets\\Knots --count 100 --size 50 40 --seed 0 --budget 10 --output out
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .grid import Grid
+from .instrumentation import Tracer, instrument
+from .tile_set import TileSet
+
+# Set in each worker process by init_worker, so the tile set is only built once per process
+_tile_set = None
+
+
+def init_worker(folder: str, tile_set_options: dict) -> None:
+    global _tile_set
+    _tile_set = TileSet(folder, **tile_set_options)
+
+
+def render(grid: Grid) -> np.ndarray:
+    """Full resolution image of the grid. Uncollapsed cells are left black"""
+    tile_height, tile_width = grid.tile_size
+    image = np.zeros((grid.height_in_cells * tile_height, grid.width_in_cells * tile_width, 3), dtype=np.uint8)
+    for y, x in zip(*np.nonzero(grid.tiles != -1)):
+        image[y * tile_height:(y + 1) * tile_height, x * tile_width:(x + 1) * tile_width] = grid.tile_set.tiles[grid.tiles[y, x]].pixels
+    return image
+
+
+def generate(seed: int, size: tuple[int, int], budget: float, output: str, grid_options: dict, trace: str | None=None) -> dict:
+    """Generate a single image. Everything random is drawn from the seed, so the same seed gives the same image"""
+    random.seed(seed)
+    start = time.perf_counter()
+    grid = Grid(size, _tile_set, size[0], size[1], **grid_options)
+    tracer = instrument(grid, Tracer()) if trace else None
+
+    steps = 0
+    timed_out = False
+    while not grid.failed:
+        if budget is not None and time.perf_counter() - start > budget:
+            timed_out = True
+            break
+
+        y, x = grid.get_lowest_entropy_cell()
+        if x is None:
+            break
+
+        current_entropies = list(grid.entropy.tile_ids(y, x))
+        next_tile_id = random.choice(current_entropies)
+        grid.collapse(x, y, next_tile_id, [n for n in current_entropies if n != next_tile_id])
+        steps += 1
+
+    filename = os.path.join(output, f"wfc_{seed}.png")
+    Image.fromarray(render(grid)).save(filename)
+
+    result = {
+        "seed": seed,
+        "file": filename,
+        "status": "timeout" if timed_out else "failed" if grid.failed else "finished",
+        "steps": steps,
+        "restarts": grid.restarts,
+        "seconds": time.perf_counter() - start,
+    }
+    if tracer is not None:
+        result["trace"] = os.path.join(output, f"wfc_{seed}.{'json' if trace == 'chrome' else 'jsonl'}")
+        result["phases"] = tracer.summary()
+        tracer.write(result["trace"])
+    return result
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate wave function collapse images from a tileset folder, without a window.")
+    parser.add_argument("folder", help="folder of PNG tiles")
+    parser.add_argument("--count", type=int, default=1, help="number of images to generate")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first image, the others follow on from it")
+    parser.add_argument("--seeds", type=int, nargs="+", help="explicit seeds, one per image (overrides --count and --seed)")
+    parser.add_argument("--size", type=int, nargs=2, default=(50, 40), metavar=("WIDTH", "HEIGHT"), help="output size in tiles")
+    parser.add_argument("--budget", type=float, default=None, help="wall-clock seconds allowed per image")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--output", default="output", help="folder for the PNGs and stats.json")
+    parser.add_argument("--colour-tolerance", type=int, default=10)
+    parser.add_argument("--match-ratio", type=float, default=0.9)
+    parser.add_argument("--max-mismatch-run", type=int, default=1)
+    parser.add_argument("--wrap", action="store_true")
+    parser.add_argument("--packed", action="store_true", help="bit-pack the possible tiles of each cell")
+    parser.add_argument("--propagator", choices=["tensor", "illegals"], default="tensor")
+    parser.add_argument("--max-backtrack-depth", type=int, default=None)
+    parser.add_argument("--max-restarts", type=int, default=0)
+    parser.add_argument(
+        "--trace", choices=["jsonl", "chrome"], default=None,
+        help="write a trace of every solver phase next to each image, as JSON lines or in Chrome trace format"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    seeds = args.seeds if args.seeds else list(range(args.seed, args.seed + args.count))
+    size = tuple(args.size)
+    os.makedirs(args.output, exist_ok=True)
+
+    tile_set_options = dict(
+        colour_tolerance=args.colour_tolerance, match_ratio=args.match_ratio, max_mismatch_run=args.max_mismatch_run
+    )
+    grid_options = dict(
+        wrap=args.wrap,
+        packed=args.packed,
+        propagator=args.propagator,
+        max_backtrack_depth=args.max_backtrack_depth,
+        max_restarts=args.max_restarts,
+    )
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(args.folder, tile_set_options)) as pool:
+        futures = [pool.submit(generate, seed, size, args.budget, args.output, grid_options, args.trace) for seed in seeds]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    stats = {
+        "folder": args.folder,
+        "size": size,
+        "tile_set": tile_set_options,
+        "grid": grid_options,
+        "budget": args.budget,
+        "workers": args.workers,
+        "seconds": elapsed,
+        "images_per_second": len(results) / elapsed,
+        "finished": sum(result["status"] == "finished" for result in results),
+        "failed": sum(result["status"] == "failed" for result in results),
+        "timeout": sum(result["status"] == "timeout" for result in results),
+        "images": results,
+    }
+    with open(os.path.join(args.output, "stats.json"), "w") as stats_file:
+        json.dump(stats, stats_file, indent=2)
+
+    print(f"{stats['finished']}/{len(results)} images finished in {elapsed:.2f}s, written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Times the tensor propagator against the grid as it was before any of the propagation changes, and against the
+set-based "illegals" propagator of the current grid, on the same seeds. The "illegals" propagator was itself changed
+along with the grid's undo trail, so the original grid is read from git (the first commit by default, or --baseline) to
+measure the whole gain. The two current propagators are checked to give the same grid. The baseline draws its random
+numbers differently, so its grids are not compared.
+
+The tensor propagator is faster than "illegals" on every tile set here, but the current grid has more to set up per
+step than the original one (the wave, the trail and the entropy heap), so with only a handful of tiles the original grid
+is still quicker - e.g. 0.6x on Knots with its 13 tiles, against 1.3x on Rooms (28) and 2.1x on Circuit (40).
+
+Example - the Summer tileset with its preset from the README, 20x20 tiles, seeds 0-4:
+    python -m tiled_version.benchmark_propagation tilesets\\Summer --colour-tolerance 50 --match-ratio 0.5 --max-mismatch-run 5 --size 20 20 --seeds 0 1 2 3 4
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import time
+import types
+from random import choice
+
+import numpy as np
+
+from .grid import Grid
+from .tile_set import TileSet
+
+PROPAGATORS = ("illegals", "tensor")
+
+
+def git(*args: str) -> str:
+    """Output of a git command run in this folder"""
+    return subprocess.run(["git", "-C", os.path.dirname(os.path.abspath(__file__)), *args], capture_output=True, text=True, check=True).stdout
+
+
+def load_baseline_grid(revision: str | None=None) -> type:
+    """The Grid class of this folder's grid.py as it was at revision, which defaults to the first commit"""
+    if revision is None:
+        revision = git("rev-list", "--max-parents=0", "HEAD").split()[0]
+
+    module = types.ModuleType("baseline_grid")
+    exec(compile(git("show", f"{revision}:./grid.py"), f"{revision}:grid.py", "exec"), module.__dict__)
+    return module.Grid
+
+
+def solve_baseline(baseline_grid: type, tile_set: TileSet, size: tuple[int, int], seed: int, wrap: bool) -> tuple[object, float, bool]:
+    """Run the baseline grid the way the original main.py did, returning it, the seconds taken and whether it failed"""
+    random.seed(seed)
+    grid = baseline_grid(size, tile_set, size[0], size[1], wrap=wrap)
+
+    start = time.perf_counter()
+    failed = False
+    while True:
+        y, x = grid.get_lowest_entropy_cell()
+        if x is None:
+            break
+
+        current_entropies = [i for i, e in enumerate(grid.entropy[y, x]) if e]
+        next_tile_id = choice(current_entropies)
+        try:
+            grid.collapse(x, y, next_tile_id, [n for n in current_entropies if n != next_tile_id])
+        except IndexError:
+            # The original backtracking has no way to give up other than running out of snapshots
+            failed = True
+            break
+
+    return grid, time.perf_counter() - start, failed
+
+
+def solve(tile_set: TileSet, size: tuple[int, int], seed: int, grid_options: dict) -> tuple[Grid, float]:
+    """Run a grid to completion (or failure) from the seed, returning it with the wall-clock seconds taken"""
+    random.seed(seed)
+    grid = Grid(size, tile_set, size[0], size[1], **grid_options)
+
+    start = time.perf_counter()
+    while not grid.failed:
+        y, x = grid.get_lowest_entropy_cell()
+        if x is None:
+            break
+
+        current_entropies = list(grid.entropy.tile_ids(y, x))
+        next_tile_id = random.choice(current_entropies)
+        grid.collapse(x, y, next_tile_id, [n for n in current_entropies if n != next_tile_id])
+
+    return grid, time.perf_counter() - start
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the tiled propagators against each other.")
+    parser.add_argument("folder", help="folder of PNG tiles")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--size", type=int, nargs=2, default=(30, 30), metavar=("WIDTH", "HEIGHT"), help="grid size in tiles")
+    parser.add_argument("--colour-tolerance", type=int, default=10)
+    parser.add_argument("--match-ratio", type=float, default=0.9)
+    parser.add_argument("--max-mismatch-run", type=int, default=1)
+    parser.add_argument("--wrap", action="store_true")
+    parser.add_argument("--packed", action="store_true", help="bit-pack the possible tiles of each cell")
+    parser.add_argument("--max-backtrack-depth", type=int, default=3)
+    parser.add_argument("--max-restarts", type=int, default=3)
+    parser.add_argument("--baseline", help="git revision of the grid to compare against (default: the first commit)")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    size = tuple(args.size)
+    tile_set = TileSet(
+        args.folder, colour_tolerance=args.colour_tolerance, match_ratio=args.match_ratio, max_mismatch_run=args.max_mismatch_run
+    )
+    grid_options = dict(
+        wrap=args.wrap, packed=args.packed, max_backtrack_depth=args.max_backtrack_depth, max_restarts=args.max_restarts
+    )
+
+    baseline_grid = load_baseline_grid(args.baseline)
+
+    runs = []
+    for seed in args.seeds:
+        grids = {}
+        run = {"seed": seed}
+        _, run["baseline"], run["baseline_failed"] = solve_baseline(baseline_grid, tile_set, size, seed, args.wrap)
+        for propagator in PROPAGATORS:
+            grids[propagator], run[propagator] = solve(tile_set, size, seed, dict(grid_options, propagator=propagator))
+        run["same"] = bool(np.array_equal(grids["illegals"].tiles, grids["tensor"].tiles))
+        run["speedup"] = run["baseline"] / run["tensor"]
+        runs.append(run)
+
+    print(f"{len(tile_set)} tiles, {size[0]}x{size[1]} grid")
+    print(f"{'seed':>6} {'baseline':>10} {'illegals':>10} {'tensor':>10} {'speedup':>8}  same")
+    for run in runs:
+        print(f"{run['seed']:>6} {run['baseline']:>9.3f}s {run['illegals']:>9.3f}s {run['tensor']:>9.3f}s {run['speedup']:>7.1f}x  {run['same']}")
+
+    totals = {name: sum(run[name] for run in runs) for name in ("baseline", *PROPAGATORS)}
+    print(
+        f"{'total':>6} {totals['baseline']:>9.3f}s {totals['illegals']:>9.3f}s {totals['tensor']:>9.3f}s "
+        f"{totals['baseline'] / totals['tensor']:>7.1f}x  {all(run['same'] for run in runs)}"
+    )
+    print("baseline is the original grid, illegals the set-based propagator on the current grid, and speedup is "
+          "baseline / tensor. same compares illegals with tensor")
+    failures = sum(run["baseline_failed"] for run in runs)
+    if failures:
+        print(f"the baseline ran out of snapshots on {failures} seed(s), so its times stop there")
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"folder": args.folder, "tiles": len(tile_set), "size": size, "grid": grid_options, "runs": runs}, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
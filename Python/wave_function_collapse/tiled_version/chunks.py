@@ -0,0 +1,106 @@
+"""
+Chunk worlds of the tiled model - see common/chunks.py for how a world is put together from chunks.
+
+Example - an 8x8 chunk world of 16x16 tile chunks, as a single image:
+    python -m tiled_version.chunks tilesets\\Knots --chunks 8 8 --chunk-size 16 16 --output world.png
+"""
+import argparse
+import random
+
+import numpy as np
+
+from common import chunks as shared_chunks
+
+from .grid import Grid
+from .tile_set import TileSet
+
+
+def solve_chunk(tile_set: TileSet, chunk_size: tuple[int, int], seed: int, ring: np.ndarray, grid_options: dict, max_attempts: int) -> tuple[np.ndarray, dict]:
+    """
+    Solve one chunk along with its overlap strips, which together are chunk_size. ring is [height + 2, width + 2] and
+    holds the tiles of the neighbouring chunks around the edge, or -1 where that chunk hasn't been generated. Returns
+    the [height, width] tiles inside the ring and the chunk's stats.
+    """
+    width, height = chunk_size
+    return shared_chunks.solve_attempts(
+        lambda: Grid((width + 2, height + 2), tile_set, width + 2, height + 2, **grid_options),
+        lambda grid: pin_ring(grid, ring), run, seed, max_attempts
+    )
+
+
+def run(grid: Grid) -> int:
+    steps = 0
+    while not grid.failed:
+        y, x = grid.get_lowest_entropy_cell()
+        if x is None:
+            break
+
+        current_entropies = list(grid.entropy.tile_ids(y, x))
+        next_tile_id = random.choice(current_entropies)
+        grid.collapse(x, y, next_tile_id, [n for n in current_entropies if n != next_tile_id])
+        steps += 1
+    return steps
+
+
+def pin_ring(grid: Grid, ring: np.ndarray) -> int:
+    """
+    Collapse the ring cells around the chunk to the tiles of the neighbouring chunks.
+    A pin which would cause a contradiction is skipped, leaving a seam. Returns the number of seams.
+    """
+    seams = 0
+    for y_index, x_index in zip(*np.nonzero(ring >= 0)):
+        tile_id = int(ring[y_index, x_index])
+        # An earlier pin may already have forced this cell
+        if grid.tiles[y_index, x_index] == tile_id:
+            continue
+
+        if not grid.entropy.possible(y_index, x_index)[tile_id]:
+            seams += 1
+            continue
+
+        trail_length = len(grid.trail)
+        if not grid.collapse_tile(int(x_index), int(y_index), tile_id, []):
+            grid.decisions.pop()
+            grid.undo(trail_length)
+            seams += 1
+    return seams
+
+
+class ChunkedWorld(shared_chunks.ChunkedWorld):
+    solve_chunk = staticmethod(solve_chunk)
+
+    def render(self, x_index: int, y_index: int, width: int, height: int) -> np.ndarray:
+        """Full resolution image of any rectangle of the world. Cells a chunk failed to collapse are left black"""
+        tiles = self.tiles(x_index, y_index, width, height)
+        tile_height, tile_width = self.tile_set.tile_size
+        image = np.zeros((height * tile_height, width * tile_width, 3), dtype=np.uint8)
+        for y, x in zip(*np.nonzero(tiles != -1)):
+            image[y * tile_height:(y + 1) * tile_height, x * tile_width:(x + 1) * tile_width] = self.tile_set.tiles[tiles[y, x]].pixels
+        return image
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate a large world chunk by chunk from a tileset folder.")
+    parser.add_argument("folder", help="folder of PNG tiles")
+    shared_chunks.add_world_arguments(parser, (16, 16), "tiles")
+    parser.add_argument("--colour-tolerance", type=int, default=10)
+    parser.add_argument("--match-ratio", type=float, default=0.9)
+    parser.add_argument("--max-mismatch-run", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tile_set = TileSet(
+        args.folder, colour_tolerance=args.colour_tolerance, match_ratio=args.match_ratio, max_mismatch_run=args.max_mismatch_run
+    )
+    world = ChunkedWorld(
+        tile_set, args.chunk_size, seed=args.seed, window=args.window, store_dir=args.store,
+        grid_options=dict(max_backtrack_depth=args.max_backtrack_depth), max_attempts=args.max_attempts,
+        overlap=args.overlap
+    )
+    shared_chunks.generate_world(world, args)
+
+
+if __name__ == "__main__":
+    main()
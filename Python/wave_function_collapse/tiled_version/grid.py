@@ -1,11 +1,16 @@
-from random import choice
+import heapq
+from random import choice, getrandbits
 import pygame
 import numpy as np
 from collections import deque
+from common.possibilities import Wave
 
 
 class Grid:
-    def __init__(self, screen_size, tile_set, width_in_cells, height_in_cells, scaling=1, wrap=False):
+    def __init__(self, screen_size, tile_set, width_in_cells, height_in_cells, scaling=1, wrap=False, packed=False, max_backtrack_depth=None, max_restarts=0, propagator="tensor"):
+        if propagator not in ("tensor", "illegals"):
+            raise ValueError("propagator must be 'tensor' or 'illegals'")
+
         self.screen_size = screen_size
         self.tile_set = tile_set
         self.width_in_cells = width_in_cells
@@ -16,17 +21,24 @@ class Grid:
         self.scaling = scaling
         self.draw_size = (self.tile_size[0], self.tile_size[1])
         self.wrap = wrap
+        self.packed = packed
+        self.propagator = propagator
+        self.failed = False
 
-        # Optimise grid structure with numpy arrays
-        # -1 indicates not collapsed (no tile assigned)
-        self.tiles = np.full((self.height_in_cells, self.width_in_cells), -1, dtype=np.int32)
+        # Backtracking policy: how many exhausted decisions may be abandoned to resolve one contradiction (None for
+        # no limit), and how many times the whole grid may be started again once backtracking gives up
+        self.max_backtrack_depth = max_backtrack_depth
+        self.max_restarts = max_restarts
+        self.restarts = 0
+
+        # Tile of every cell as it was last drawn, along with the persistent image of the grid. Set up on the first draw
+        self.drawn_tiles = None
+        self.frame_surface = None
 
-        # Use boolean array for entropy - faster than lists
-        # Shape: [height, width, num_tiles]
-        self.entropy = np.ones((self.height_in_cells, self.width_in_cells, self.num_tiles), dtype=bool)
+        # Small per-cell noise breaks ties between cells of equal entropy
+        self.entropy_noise = np.random.default_rng(getrandbits(32)).random((self.height_in_cells, self.width_in_cells)) * 0.00001
 
-        # Cache for backtracking - maybe a queue would be more efficient?
-        self.grid_copy = []
+        self.reset()
 
         # Precompute neighbour co-ordinates for faster access
         self.directions = [
@@ -36,7 +48,11 @@ class Grid:
             (0, -1),  # West
         ]
 
-        # Precompute direction to illegal_list mapping
+        # Compatibility tensor in the same storage format as the wave, as [tile, direction, tile or word], so a
+        # neighbour can be constrained with a single OR over the possible tiles and a single AND
+        self.allowed_masks = self.entropy.pack_mask(self.tile_set.allowed)
+
+        # Precompute direction to illegal_list mapping, used by the original set-based propagator
         self.direction_to_illegals = [
             lambda tile: self.tile_set.tiles[tile].north_illegals,  # North
             lambda tile: self.tile_set.tiles[tile].east_illegals,   # East
@@ -44,56 +60,152 @@ class Grid:
             lambda tile: self.tile_set.tiles[tile].west_illegals,   # West
         ]
 
+    def reset(self):
+        # Optimise grid structure with numpy arrays
+        # -1 indicates not collapsed (no tile assigned)
+        self.tiles = np.full((self.height_in_cells, self.width_in_cells), -1, dtype=np.int32)
+
+        # Tiles still possible in each cell, either one bool per tile or bit-packed into uint64 words
+        # Shape: [height, width, num_tiles] (or [height, width, num_words] when packed)
+        self.entropy = Wave((self.height_in_cells, self.width_in_cells), self.num_tiles, packed=self.packed)
+
+        # Current heap key of every cell. Heap entries are (key, x, y) and are skipped once they no longer match
+        self.entropy_keys = np.zeros((self.height_in_cells, self.width_in_cells))
+        self.entropy_heap = []
+        self.rebuild_entropy_heap()
+
+        # Undo log for backtracking: every change to a cell is recorded as (y, x, removed tiles, previous tile) so it
+        # can be rewound, instead of keeping a copy of the whole grid for every step
+        self.trail = []
+        # Decisions made so far, as (trail length before the decision, x, y, tile, tiles still to try in that cell)
+        self.decisions = []
+
     def collapse(self, x_index, y_index, tile_id, remaining_choices):
         success = self.collapse_tile(x_index, y_index, tile_id, remaining_choices)
-        while not success:
-            # Need to backtrack the last step on the stack
-            # restore grid to pre-collapsed state
-            old_tiles, old_entropy, last_x, last_y, choices = self.grid_copy.pop()
+        if not success:
+            success = self.backtrack()
+        return success
+
+    def backtrack(self):
+        depth = 0
+        while self.decisions:
+            # restore grid to the state before the last decision
+            trail_length, last_x, last_y, _, choices = self.decisions.pop()
+            self.undo(trail_length)
 
             if len(choices) == 0:
-                print(f"Backtracked using snapshots. Snapshot stack length = {len(self.grid_copy)}")
-                success = False
+                # Every tile has failed in this cell, so the decision before it was wrong too
+                depth += 1
+                if self.max_backtrack_depth is not None and depth > self.max_backtrack_depth:
+                    break
                 continue
 
-            # restore last good grid
-            self.tiles = old_tiles.copy()
-            self.entropy = old_entropy.copy()
-
             # choose a new tile to collapse to
             new_choice = choice(choices)
 
             # try it out
-            success = self.collapse_tile(x_index, y_index, new_choice, [n for n in choices if n != new_choice])
+            if self.collapse_tile(last_x, last_y, new_choice, [n for n in choices if n != new_choice]):
+                print(f"Backtracked using the trail. Trail length = {len(self.trail)}")
+                return True
+
+        if self.restarts < self.max_restarts:
+            self.restarts += 1
+            print(f"Puzzle failed. Restarting ({self.restarts}/{self.max_restarts})")
+            self.reset()
+            return True
+
+        print("No more states to backtrack to. Puzzle failed.")
+        self.failed = True
+        return False
+
+    def undo(self, trail_length):
+        changed = set()
+        while len(self.trail) > trail_length:
+            y_index, x_index, removed, old_tile = self.trail.pop()
+            self.entropy.restore(y_index, x_index, removed)
+            self.tiles[y_index, x_index] = old_tile
+            changed.add((y_index, x_index))
+
+        for y_index, x_index in changed:
+            if self.tiles[y_index, x_index] == -1:
+                self.push_entropy(x_index, y_index, self.entropy.count(y_index, x_index))
+
+    def compact_trail(self):
+        # Decisions further back than the backtrack depth can never be undone, so forget their part of the trail
+        if self.max_backtrack_depth is None or len(self.decisions) <= 2 * (self.max_backtrack_depth + 1):
+            return
+
+        kept = self.decisions[-(self.max_backtrack_depth + 1):]
+        drop = kept[0][0]
+        del self.trail[:drop]
+        self.decisions = [(trail_length - drop, x, y, tile_id, choices) for trail_length, x, y, tile_id, choices in kept]
+
+    def remove_possibilities(self, x_index, y_index, mask):
+        """AND the cell with mask, recording what was removed. Returns True if anything was removed"""
+        before = self.entropy.mask(y_index, x_index)
+        if not self.entropy.constrain(y_index, x_index, mask):
+            return False
+
+        self.trail.append((y_index, x_index, before & ~self.entropy.mask(y_index, x_index), self.tiles[y_index, x_index]))
+        return True
 
     def collapse_tile(self, x_index, y_index, tile_id, remaining_choices):
-        # Save state in case we need to backtrack
-        self.grid_copy.append([self.tiles.copy(), self.entropy.copy(), x_index, y_index, remaining_choices])
+        # Remember where the trail was in case we need to backtrack
+        self.decisions.append((len(self.trail), x_index, y_index, tile_id, remaining_choices))
+        self.compact_trail()
 
         # Collapse the current cell
+        before = self.entropy.mask(y_index, x_index)
+        self.entropy.collapse(y_index, x_index, tile_id)
+        self.trail.append((y_index, x_index, before & ~self.entropy.mask(y_index, x_index), self.tiles[y_index, x_index]))
         self.tiles[y_index, x_index] = tile_id
-        self.entropy[y_index, x_index][:] = False
-        self.entropy[y_index, x_index][tile_id] = True
 
         # Propagate the collapse across the grid
+        if self.propagator == "illegals":
+            return self.propagate_illegals(x_index, y_index, tile_id)
         return self.propagate(x_index, y_index, tile_id)
 
     def propagate(self, x_index, y_index, tile_id):
+        queue = deque([(y_index, x_index)])
+        queued = {(y_index, x_index)}
+
+        while queue:
+            current_y, current_x = queue.popleft()
+            queued.discard((current_y, current_x))
+
+            # A collapsed cell has a single possible tile, so this covers both cases
+            possible_tiles = self.entropy.tile_ids(current_y, current_x)
+
+            for direction_number, (y_diff, x_diff) in enumerate(self.directions):
+                neighbour_y, neighbour_x = current_y + y_diff, current_x + x_diff
+
+                if self.wrap:
+                    neighbour_y %= self.height_in_cells
+                    neighbour_x %= self.width_in_cells
+                elif not (0 <= neighbour_y < self.height_in_cells and 0 <= neighbour_x < self.width_in_cells):
+                    continue
+
+                # Tiles allowed next to any of the possible tiles, with one OR across their rows of the tensor
+                legal = self.entropy.union(self.allowed_masks[possible_tiles, direction_number])
+                if not self.apply_mask(neighbour_x, neighbour_y, legal, queue, queued):
+                    return False
+
+        return True
+
+    def propagate_illegals(self, x_index, y_index, tile_id):
+        """The original propagator, which intersects sets of each tile's illegal neighbours"""
         # Queue of cells to process (y, x)
         cell_tuple = [(y_index, x_index)]
         queue = deque(cell_tuple)
 
-        # Track processed cells to avoid duplicates
-        processed = set()
+        # Track queued cells to avoid duplicates. A cell which changes again after it was processed is queued again,
+        # otherwise the later change never reaches its neighbours
+        queued = set(cell_tuple)
 
         # Changed propagation method from Manhattan distance to a queue of cells within the grid
         while queue:
             current_y, current_x = queue.popleft()
-
-            if (current_y, current_x) in processed:
-                continue
-
-            processed.add((current_y, current_x))
+            queued.discard((current_y, current_x))
 
             current_tile = self.tiles[current_y, current_x]
 
@@ -102,11 +214,8 @@ class Grid:
                 neighbour_y, neighbour_x = current_y + y_diff, current_x + x_diff
 
                 if self.wrap:
-                    if neighbour_x == self.width_in_cells:
-                        neighbour_x = 0
-
-                    if neighbour_y >= self.height_in_cells:
-                        neighbour_y = 0
+                    neighbour_y %= self.height_in_cells
+                    neighbour_x %= self.width_in_cells
                 else:
                     # Skip if outside bounds
                     if not (0 <= neighbour_y < self.height_in_cells and 0 <= neighbour_x < self.width_in_cells):
@@ -117,103 +226,118 @@ class Grid:
                     # Get illegal tiles in this direction
                     illegals = self.direction_to_illegals[direction_number](current_tile)
 
-                    # If neighbour isn't collapsed yet
-                    if self.tiles[neighbour_y, neighbour_x] == -1:
-                        # Remove illegal options
-                        if not self.apply_constraints(neighbour_x, neighbour_y, illegals, queue, processed):
-                            return False
+                    # Collapsed neighbours are checked too, so that two cells forced at once can't disagree
+                    if not self.apply_constraints(neighbour_x, neighbour_y, illegals, queue, queued):
+                        return False
 
                 else:
                     # Current cell not collapsed, constrain based on possible valid tiles
-                    possible_tiles = np.where(self.entropy[current_y, current_x])[0]
+                    possible_tiles = self.entropy.tile_ids(current_y, current_x)
 
-                    # If neighbour not collapsed, constrain based on all possible tiles
-                    if self.tiles[neighbour_y, neighbour_x] == -1:
-                        # Get all illegals for this direction from all possible tiles
-                        all_illegals = []
-                        for tile in possible_tiles:
-                            all_illegals.append(
-                                set(self.direction_to_illegals[direction_number](tile))
-                            )
+                    # Get all illegals for this direction from all possible tiles
+                    all_illegals = []
+                    for tile in possible_tiles:
+                        all_illegals.append(
+                            set(self.direction_to_illegals[direction_number](tile))
+                        )
 
-                        # Find common illegals (tiles illegal for ALL possible configurations)
-                        if all_illegals:
-                            common_illegals = set.intersection(*all_illegals)
+                    # Find common illegals (tiles illegal for ALL possible configurations)
+                    if all_illegals:
+                        common_illegals = set.intersection(*all_illegals)
 
-                            # Apply constraints
-                            if not self.apply_constraints(neighbour_x, neighbour_y, common_illegals, queue, processed):
-                                return False
+                        # Apply constraints
+                        if not self.apply_constraints(neighbour_x, neighbour_y, common_illegals, queue, queued):
+                            return False
 
         return True  # No contradictions found
 
-    def apply_constraints(self, neighbour_x, neighbour_y, illegals, queue, processed):
-        changed = False
+    def apply_constraints(self, neighbour_x, neighbour_y, illegals, queue, queued):
+        legal = np.ones(self.num_tiles, dtype=bool)
+        legal[list(illegals)] = False
+        return self.apply_mask(neighbour_x, neighbour_y, self.entropy.pack_mask(legal), queue, queued)
 
-        # Remove illegal neighbour options
-        for illegal in illegals:
-            if self.entropy[neighbour_y, neighbour_x, illegal]:
-                self.entropy[neighbour_y, neighbour_x, illegal] = False
-                changed = True
+    def apply_mask(self, neighbour_x, neighbour_y, legal, queue, queued):
+        # Remove illegal neighbour options with a single (word-wise) AND
+        changed = self.remove_possibilities(neighbour_x, neighbour_y, legal)
 
         # If changes were made, check for contradictions and add to queue
         if changed:
+            remaining = self.entropy.count(neighbour_y, neighbour_x)
+
             # Check if this cell still has valid options
-            if not np.any(self.entropy[neighbour_y, neighbour_x]):
+            if remaining == 0:
                 return False  # Contradiction
 
-            # If only one option left, collapse it
-            if np.sum(self.entropy[neighbour_y, neighbour_x]) == 1:
-                tile_id = np.where(self.entropy[neighbour_y, neighbour_x])[0][0]
+            # If only one option left, collapse it (the trail entry above already holds the previous tile)
+            if remaining == 1:
+                tile_id = self.entropy.tile_ids(neighbour_y, neighbour_x)[0]
                 self.tiles[neighbour_y, neighbour_x] = tile_id
 
+            else:
+                self.push_entropy(neighbour_x, neighbour_y, remaining)
+
             # Add neighbour to queue
-            if (neighbour_y, neighbour_x) not in processed:
+            if (neighbour_y, neighbour_x) not in queued:
                 queue.append((neighbour_y, neighbour_x))
+                queued.add((neighbour_y, neighbour_x))
 
         return True
 
-    def get_lowest_entropy_cell(self):
-
-        # Get all uncollapsed cells
-        uncollapsed = np.where(self.tiles == -1)
-        if len(uncollapsed[0]) == 0:
-            return None, None
-
-        # Count entropy (number of possibilities) for each uncollapsed cell
-        entropy_counts = np.sum(self.entropy[uncollapsed], axis=1)
+    def push_entropy(self, x_index, y_index, remaining):
+        # All tiles are equally likely, so the Shannon entropy is just log(number of possibilities)
+        key = float(np.log(remaining) + self.entropy_noise[y_index, x_index])
+        self.entropy_keys[y_index, x_index] = key
+        heapq.heappush(self.entropy_heap, (key, x_index, y_index))
 
-        # Find the minimum entropy value
-        min_entropy = np.min(entropy_counts)
+        # Stop stale entries building up without limit
+        if len(self.entropy_heap) > 4 * self.width_in_cells * self.height_in_cells:
+            self.rebuild_entropy_heap()
 
-        # Get all cells with minimum entropy
-        min_indices = np.where(entropy_counts == min_entropy)[0]
+    def rebuild_entropy_heap(self):
+        uncollapsed = np.nonzero(self.tiles == -1)
+        keys = np.log(self.entropy.counts()[uncollapsed]) + self.entropy_noise[uncollapsed]
+        self.entropy_keys[uncollapsed] = keys
+        self.entropy_heap = list(zip(keys.tolist(), uncollapsed[1].tolist(), uncollapsed[0].tolist()))
+        heapq.heapify(self.entropy_heap)
 
-        # Choose randomly from cells with minimum entropy
-        if len(min_indices) == 0:
-            return None, None
-
-        choice_index = choice(min_indices)
-        y, x = uncollapsed[0][choice_index], uncollapsed[1][choice_index]
+    def get_lowest_entropy_cell(self):
+        # Pop entries until one is found for an uncollapsed cell whose entropy hasn't changed since it was pushed
+        while self.entropy_heap:
+            key, x, y = heapq.heappop(self.entropy_heap)
+            if self.tiles[y, x] == -1 and key == self.entropy_keys[y, x]:
+                return y, x
 
-        return y, x
+        # Stale entries can only be left behind by collapsed cells, so we're done
+        return None, None
 
     def draw(self, surface):
-        for y in range(self.height_in_cells):
-            for x in range(self.width_in_cells):
-                pygame.draw.rect(
-                    surface,
-                    (100, 100, 100),
-                    (
-                        x * self.draw_size[1],
-                        y * self.draw_size[0],
-                        self.draw_size[1],
-                        self.draw_size[0],
-                    ),
-                    1,
-                )
-                if self.tiles[y, x] != -1:
-                    self.tile_set.tiles[self.tiles[y, x]].draw(
-                        surface,
-                        x * self.draw_size[1],
-                        y * self.draw_size[0],
-                    )
+        """
+        Redraw only the cells whose tile changed since the last frame. They are written into a persistent image of the
+        whole grid, which reaches the surface with a single surfarray write
+        """
+        tile_height, tile_width = self.draw_size
+        if self.drawn_tiles is None:
+            self.tile_pixels = np.stack([tile.pixels for tile in self.tile_set.tiles])
+            # An uncollapsed cell is black with a grey outline
+            self.empty_cell = np.zeros((tile_height, tile_width, 3), dtype=np.uint8)
+            self.empty_cell[[0, -1], :] = 100
+            self.empty_cell[:, [0, -1]] = 100
+            self.frame = np.zeros((self.height_in_cells * tile_height, self.width_in_cells * tile_width, 3), dtype=np.uint8)
+            self.frame_surface = pygame.Surface((self.width_in_cells * tile_width, self.height_in_cells * tile_height))
+            # -2 never matches a cell, so every cell is drawn on the first frame
+            self.drawn_tiles = np.full_like(self.tiles, -2)
+
+        changed_y, changed_x = np.nonzero(self.tiles != self.drawn_tiles)
+        if len(changed_y):
+            tile_ids = self.tiles[changed_y, changed_x]
+            cell_pixels = self.tile_pixels[np.maximum(tile_ids, 0)]
+            cell_pixels[tile_ids < 0] = self.empty_cell
+
+            # View the frame as [cell y, cell x, pixel y, pixel x, rgb] so every changed cell is written at once
+            cells = self.frame.reshape(self.height_in_cells, tile_height, self.width_in_cells, tile_width, 3).swapaxes(1, 2)
+            cells[changed_y, changed_x] = cell_pixels
+            self.drawn_tiles[changed_y, changed_x] = tile_ids
+
+            pygame.surfarray.blit_array(self.frame_surface, self.frame.swapaxes(0, 1))
+
+        surface.blit(self.frame_surface, (0, 0))
@@ -0,0 +1,73 @@
+"""
+Opt-in instrumentation of a Grid - per phase timings and propagation counters, exported as JSON lines or as a Chrome
+trace (open it in chrome://tracing or https://ui.perfetto.dev).
+
+Nothing in the solver knows about tracing. instrument() wraps the methods of one Grid instance, so a grid which isn't
+instrumented runs exactly the same code as before, with no overhead at all.
+
+    tracer = instrument(grid, Tracer())
+    ... collapse cells with grid.collapse() as usual ...
+    tracer.write_chrome_trace("trace.json")
+"""
+import functools
+
+from common.instrumentation import Tracer, trace_phases
+
+
+def instrument(grid, tracer: Tracer) -> Tracer:
+    """Wrap the phases of grid so that every call to them is recorded by tracer"""
+    removed = [0]
+    checks = [0]
+
+    remove_possibilities = grid.remove_possibilities
+
+    @functools.wraps(remove_possibilities)
+    def counted_remove_possibilities(x_index, y_index, mask):
+        before = grid.entropy.count(y_index, x_index)
+        changed = remove_possibilities(x_index, y_index, mask)
+        if changed:
+            removed[0] += before - grid.entropy.count(y_index, x_index)
+        return changed
+
+    apply_mask = grid.apply_mask
+
+    @functools.wraps(apply_mask)
+    def counted_apply_mask(*args):
+        checks[0] += 1
+        return apply_mask(*args)
+
+    grid.remove_possibilities = counted_remove_possibilities
+    grid.apply_mask = counted_apply_mask
+
+    def position() -> tuple[int, int, int]:
+        return removed[0], checks[0], len(grid.trail)
+
+    def propagated(before, result):
+        # The propagators keep their queues to themselves, but every cell taken off the queue checks each of its
+        # neighbours, so the neighbour checks stand in for the queue pops
+        return {
+            "tiles_removed": removed[0] - before[0],
+            "neighbour_checks": checks[0] - before[1],
+            "cells_changed": len(grid.trail) - before[2],
+            "contradiction": not result,
+        }
+
+    def undone(before, result):
+        return {"cells_restored": before[2] - len(grid.trail)}
+
+    # Every trail entry holds one mask of the removed tiles
+    mask_bytes = grid.entropy.mask(0, 0).nbytes
+
+    def stepped(before, result):
+        # The trail replaced copies of the whole grid, so it is the memory spent on being able to backtrack
+        tracer.counter("trail", mask_bytes=len(grid.trail) * mask_bytes, trail_length=len(grid.trail))
+        tracer.counter("progress", decisions=len(grid.decisions), uncollapsed=int((grid.tiles == -1).sum()))
+        return {}
+
+    propagate_method = "propagate_illegals" if grid.propagator == "illegals" else "propagate"
+    trace_phases(grid, tracer, position, {
+        propagate_method: ("propagate", propagated),
+        "undo": ("undo", undone),
+        "collapse": ("step", stepped),
+    })
+    return tracer
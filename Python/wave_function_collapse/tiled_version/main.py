@@ -1,14 +1,14 @@
 from random import choice
 import pygame
 
-from grid import Grid
-from tile_set import TileSet
+from .grid import Grid
+from .tile_set import TileSet
 
 
 def main():
     window_size = (1000, 800)
     default_tile_scaling = 2
-    tile_set = TileSet(r'..\tilesets\knots', colour_tolerance=10, match_ratio=0.9, max_mismatch_run=1)
+    tile_set = TileSet(r'tilesets\knots', colour_tolerance=10, match_ratio=0.9, max_mismatch_run=1)
     horizonal_cells = window_size[0] // (default_tile_scaling * tile_set.tile_size[1])
     vertical_cells = window_size[1] // (default_tile_scaling * tile_set.tile_size[0])
     grid = Grid(window_size, tile_set, horizonal_cells, vertical_cells, scaling=default_tile_scaling, wrap=True)
@@ -25,7 +25,7 @@ def main():
 
     y, x = grid.get_lowest_entropy_cell()
     first_tile = choice(tile_set.tiles)
-    grid.collapse(x, y, first_tile.id, [n for n in grid.entropy[y, x] if n != first_tile.id])
+    grid.collapse(x, y, first_tile.id, [n for n in grid.entropy.tile_ids(y, x) if n != first_tile.id])
 
     clock = pygame.time.Clock()
     running = True
@@ -45,9 +45,10 @@ def main():
         if collapsing:
             y, x = grid.get_lowest_entropy_cell()
             if x is not None and y is not None:
-                current_entropies = [i for i, e in enumerate(grid.entropy[y, x]) if e]
+                current_entropies = list(grid.entropy.tile_ids(y, x))
                 next_tile_id = choice(current_entropies)
-                grid.collapse(x, y, next_tile_id, [n for n in current_entropies if n != next_tile_id])
+                if not grid.collapse(x, y, next_tile_id, [n for n in current_entropies if n != next_tile_id]):
+                    collapsing = False
             else:
                 print("Finished")
                 collapsing = False
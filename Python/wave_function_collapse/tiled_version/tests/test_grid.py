@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+import pytest
+
+from tiled_version.benchmark_propagation import solve
+from tiled_version.tile_set import TileSet
+
+
+class TestPropagators:
+    @pytest.fixture
+    def setup(self):
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "..", "..", "tilesets", "Rooms"))
+        self.size_in_cells = (12, 10)
+
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_tensor_and_illegals_propagators_build_the_same_grid(self, setup, seed, packed):
+        # Arrange
+        options = dict(packed=packed, max_backtrack_depth=3, max_restarts=3)
+
+        # Act
+        illegals, _ = solve(self.tile_set, self.size_in_cells, seed, dict(options, propagator="illegals"))
+        tensor, _ = solve(self.tile_set, self.size_in_cells, seed, dict(options, propagator="tensor"))
+
+        # Assert
+        assert not tensor.failed
+        assert np.all(tensor.tiles >= 0)
+        assert np.array_equal(illegals.tiles, tensor.tiles)
+        assert np.array_equal(illegals.entropy.counts(), tensor.entropy.counts())
@@ -0,0 +1,58 @@
+import os
+import random
+
+import pytest
+
+from tiled_version.grid import Grid
+from tiled_version.instrumentation import Tracer, instrument
+from tiled_version.tile_set import TileSet
+
+
+class TestInstrumentation:
+    @pytest.fixture
+    def setup(self):
+        random.seed(5)
+        self.tile_set = TileSet(os.path.join(os.path.dirname(__file__), "..", "..", "tilesets", "Knots"))
+        self.size = (10, 8)
+
+    def collapse_next(self, grid):
+        y, x = grid.get_lowest_entropy_cell()
+        if x is None:
+            return False
+        current_entropies = list(grid.entropy.tile_ids(y, x))
+        next_tile_id = random.choice(current_entropies)
+        grid.collapse(x, y, next_tile_id, [n for n in current_entropies if n != next_tile_id])
+        return True
+
+    def test_grid_is_untouched_unless_instrumented(self, setup):
+        # Arrange
+
+        # Act
+        grid = Grid(self.size, self.tile_set, *self.size)
+
+        # Assert
+        assert "collapse" not in vars(grid)
+        assert "propagate" not in vars(grid)
+
+    @pytest.mark.parametrize("propagator", ["tensor", "illegals"])
+    def test_trace_holds_every_phase(self, setup, propagator):
+        # Arrange
+        grid = Grid(self.size, self.tile_set, *self.size, propagator=propagator)
+        tracer = instrument(grid, Tracer())
+
+        # Act
+        steps = 0
+        while not grid.failed and self.collapse_next(grid):
+            steps += 1
+        grid.backtrack()
+        summary = tracer.summary()
+
+        # Assert
+        assert {"select", "step", "propagate", "backtrack", "undo"} <= set(summary)
+        assert {"trail", "progress"} <= {event["name"] for event in tracer.events if "values" in event}
+        assert summary["step"]["count"] == steps
+        # Propagation is only reached through collapse_tile, so this shows the grid's own calls are traced too
+        assert summary["propagate"]["count"] >= steps
+        assert summary["propagate"]["tiles_removed"] > 0
+        assert summary["propagate"]["neighbour_checks"] > 0
+        assert summary["undo"]["cells_restored"] > 0
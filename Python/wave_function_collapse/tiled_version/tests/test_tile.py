@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pytest
+
+from tiled_version.tile import Tile
+from tiled_version.tile_set import TileSet
+
+
+class TestCompareEdgeSets:
+    @staticmethod
+    def compare_pairwise(edges_a, edges_b, *args):
+        return np.array([[Tile.compare_edges(edge_a, edge_b, *args) for edge_b in edges_b] for edge_a in edges_a])
+
+    @pytest.mark.parametrize("folder, colour_tolerance, match_ratio, max_mismatch_run", [
+        ("Castle", 20, 0.5, 1),
+        ("Circuit", 10, 0.7, 1),
+        ("Rooms", 10, 0.9, 1),
+        ("Summer", 50, 0.5, 5),
+    ])
+    def test_compare_edge_sets_matches_compare_edges_on_the_tilesets(self, folder, colour_tolerance, match_ratio, max_mismatch_run):
+        # Arrange
+        tile_set = TileSet()
+        tile_set.read_tile_set(os.path.join(os.path.dirname(__file__), "..", "..", "tilesets", folder))
+        stacked = np.stack([tile.pixels for tile in tile_set.tiles])
+        north, south = stacked[:, 0, :], stacked[:, -1, :]
+        settings = (colour_tolerance, match_ratio, max_mismatch_run)
+
+        # Act
+        result = Tile.compare_edge_sets(north, south, *settings)
+
+        # Assert
+        assert np.array_equal(result, self.compare_pairwise(north, south, *settings))
+
+    @pytest.mark.parametrize("max_mismatch_run", [0, 1, 3, 8, 20])
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64])
+    def test_compare_edge_sets_matches_compare_edges_on_random_edges(self, max_mismatch_run, chunk_size):
+        # Arrange
+        rng = np.random.default_rng(max_mismatch_run)
+        edges_a = rng.integers(0, 256, size=(20, 10, 3), dtype=np.uint8)
+        # Copies of some of edges_a with anything from none to over half of their pixels changed, so that pairs both
+        # match and don't
+        edges_b = edges_a[rng.integers(0, 20, size=15)]
+        changed = rng.random((15, 10)) < np.linspace(0, 0.7, 15)[:, None]
+        edges_b[changed] = rng.integers(0, 256, size=(np.count_nonzero(changed), 3), dtype=np.uint8)
+        settings = (10, 0.6, max_mismatch_run)
+
+        # Act
+        result = Tile.compare_edge_sets(edges_a, edges_b, *settings, chunk_size=chunk_size)
+
+        # Assert
+        assert result.shape == (20, 15)
+        assert 0 < np.count_nonzero(result) < result.size
+        assert np.array_equal(result, self.compare_pairwise(edges_a, edges_b, *settings))
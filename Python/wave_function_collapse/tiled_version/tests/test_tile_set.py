@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from tiled_version.tile_set import TileSet
+
+
+class TestReadTileSet:
+    @pytest.fixture
+    def setup(self, tmp_path):
+        self.folder = tmp_path
+
+    def save_tile(self, name, pixels):
+        Image.fromarray(np.asarray(pixels, dtype=np.uint8)).save(os.path.join(self.folder, name))
+
+    @staticmethod
+    def read_tile_set_by_comparison(folder):
+        """The original read_tile_set, which compared each rotation and flip with every tile added before it"""
+        tiles = []
+        for root, dirs, files in os.walk(folder):
+            for filename in files:
+                if filename.endswith('.png'):
+                    orig_pixels = TileSet.read_image_into_pixels(os.path.join(root, filename))
+                    tiles.append(orig_pixels)
+                    variants = [np.rot90(orig_pixels, turns) for turns in (1, 2, 3)]
+                    variants += [np.flip(orig_pixels, axis=0), np.flip(orig_pixels, axis=1)]
+                    for pixels in variants:
+                        if not any(np.array_equal(pixels, tile) for tile in tiles):
+                            tiles.append(pixels)
+        return tiles
+
+    def test_symmetric_tile_is_only_added_once(self, setup):
+        # Arrange
+        pixels = np.zeros((3, 3, 3))
+        pixels[1, 1] = 255
+        self.save_tile("dot.png", pixels)
+        tile_set = TileSet()
+
+        # Act
+        tile_set.read_tile_set(self.folder)
+
+        # Assert
+        assert len(tile_set) == 1
+        assert tile_set.tile_size == (3, 3)
+
+    def test_rotations_and_flips_which_repeat_a_tile_are_not_added(self, setup):
+        # Arrange
+        # A line through the middle only has two distinct orientations
+        pixels = np.zeros((3, 3, 3))
+        pixels[:, 1] = 255
+        self.save_tile("line.png", pixels)
+        tile_set = TileSet()
+
+        # Act
+        tile_set.read_tile_set(self.folder)
+
+        # Assert
+        assert len(tile_set) == 2
+        assert [tile.id for tile in tile_set.tiles] == [0, 1]
+        assert not np.array_equal(tile_set.tiles[0].pixels, tile_set.tiles[1].pixels)
+
+    def test_only_a_file_repeating_a_tile_adds_a_duplicate_and_is_reported(self, setup, capsys):
+        # Arrange
+        rng = np.random.default_rng(0)
+        corner = np.zeros((4, 4, 3))
+        corner[0, 0] = 255
+        self.save_tile("a_corner.png", corner)
+        # A second file holding the corner turned over, so all of its variants are already in the set
+        self.save_tile("b_corner.png", np.rot90(corner))
+        self.save_tile("c_noise.png", rng.integers(0, 256, size=(4, 4, 3)))
+        tile_set = TileSet()
+
+        # Act
+        tile_set.read_tile_set(self.folder)
+
+        # Assert
+        expected = self.read_tile_set_by_comparison(self.folder)
+        assert len(tile_set) == len(expected)
+        assert all(np.array_equal(tile.pixels, pixels) for tile, pixels in zip(tile_set.tiles, expected))
+        # Only the tiles read from the files themselves may repeat one already added
+        keys = [tile.pixels.tobytes() for tile in tile_set.tiles]
+        assert len(set(keys)) == len(keys) - 1
+        assert "b_corner.png repeats a tile already in the set" in capsys.readouterr().out
+
+    @pytest.mark.parametrize("folder", ["Castle", "Circuit", "Knots", "Summer"])
+    def test_read_tile_set_matches_comparing_every_tile(self, folder):
+        # Arrange
+        path = os.path.join(os.path.dirname(__file__), "..", "..", "tilesets", folder)
+        tile_set = TileSet()
+
+        # Act
+        tile_set.read_tile_set(path)
+
+        # Assert
+        expected = self.read_tile_set_by_comparison(path)
+        assert len(tile_set) == len(expected)
+        assert all(np.array_equal(tile.pixels, pixels) for tile, pixels in zip(tile_set.tiles, expected))
+
+    def test_empty_folder_raises_an_error_naming_it(self, setup):
+        # Arrange
+        tile_set = TileSet()
+
+        # Act
+        with pytest.raises(FileNotFoundError) as error:
+            tile_set.read_tile_set(self.folder)
+
+        # Assert
+        assert str(self.folder) in str(error.value)
+
+    def test_misspelt_folder_raises_an_error_naming_it(self, setup):
+        # Arrange
+        folder = os.path.join(self.folder, "Kntos")
+
+        # Act
+        with pytest.raises(FileNotFoundError) as error:
+            TileSet(folder)
+
+        # Assert
+        assert "Kntos" in str(error.value)
@@ -65,6 +65,38 @@ class Tile:
 
         return match_fraction >= match_ratio and max_run <= max_mismatch_run
 
+    @staticmethod
+    def compare_edge_sets(edges_a, edges_b, colour_tolerance=20, match_ratio=0.5, max_mismatch_run=1, chunk_size=64):
+        """
+        compare_edges for every pair of edges at once. edges_a and edges_b are [tiles, edge length, RGB] arrays and the
+        result is a [len(edges_a), len(edges_b)] bool array. Rows are compared in chunks to bound the memory used.
+        """
+        edge_length = edges_a.shape[1]
+        edges_a = edges_a.astype(np.int16)
+        edges_b = edges_b.astype(np.int16)
+        result = np.empty((len(edges_a), len(edges_b)), dtype=bool)
+
+        for start in range(0, len(edges_a), chunk_size):
+            chunk = edges_a[start:start + chunk_size]
+
+            # [chunk, tiles, edge length] - True where all RGB channels are within tolerance
+            pixel_matches = np.all(np.abs(chunk[:, None] - edges_b[None]) <= colour_tolerance, axis=3)
+            match_fraction = np.count_nonzero(pixel_matches, axis=2) / edge_length
+
+            # A run of more than max_mismatch_run mismatches exists if any window of max_mismatch_run + 1 pixels
+            # holds nothing but mismatches
+            window = max_mismatch_run + 1
+            if window > edge_length:
+                runs_ok = np.ones(match_fraction.shape, dtype=bool)
+            else:
+                mismatches = np.cumsum(~pixel_matches, axis=2)
+                mismatches = np.concatenate([np.zeros(mismatches.shape[:2] + (1,), dtype=mismatches.dtype), mismatches], axis=2)
+                runs_ok = ~np.any(mismatches[:, :, window:] - mismatches[:, :, :-window] == window, axis=2)
+
+            result[start:start + chunk_size] = (match_fraction >= match_ratio) & runs_ok
+
+        return result
+
     @staticmethod
     def max_consecutive_false(mask):
         max_run = run = 0
@@ -1,13 +1,16 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
-from tile import Tile
+from .tile import Tile
 
 
 class TileSet:
     def __init__(self, folder=None, colour_tolerance=0, match_ratio=1.0, max_mismatch_run=1):
         self.tiles = []
         self.tile_size = (None, None)
+        # [tile, direction, tile] - True where the second tile may be placed next to the first in that direction
+        self.allowed = None
         if folder is not None:
             self.read_tile_set(folder)
             self.get_illegal_neighbours(colour_tolerance, match_ratio, max_mismatch_run)
@@ -22,59 +25,62 @@ class TileSet:
     #     return self.tiles[0].pixels.shape[:2]
 
     def get_illegal_neighbours(self, colour_tolerance, match_ratio, max_mismatch_run):
-        for this_tile in self.tiles:
-            for other_tile in self.tiles:
-                valid_neighbour = Tile.compare_edges(this_tile.north_pixels, other_tile.south_pixels, colour_tolerance, match_ratio, max_mismatch_run)
-                if not valid_neighbour:
-                    this_tile.north_illegals.append(other_tile.id)
+        """
+        Compare the edges of every pair of tiles at once, giving the [tile, direction, tile] compatibility tensor with
+        directions N, E, S, W. The *_illegals lists of each tile are filled in from it.
+        """
+        stacked = np.stack([tile.pixels for tile in self.tiles])
+        north, south = stacked[:, 0, :], stacked[:, -1, :]
+        west, east = stacked[:, :, 0], stacked[:, :, -1]
 
-                valid_neighbour = Tile.compare_edges(this_tile.south_pixels, other_tile.north_pixels, colour_tolerance, match_ratio, max_mismatch_run)
-                if not valid_neighbour:
-                    this_tile.south_illegals.append(other_tile.id)
+        # Edge comparison is symmetric, so the southern rules are the northern rules seen from the other tile
+        north_allowed = Tile.compare_edge_sets(north, south, colour_tolerance, match_ratio, max_mismatch_run)
+        east_allowed = Tile.compare_edge_sets(east, west, colour_tolerance, match_ratio, max_mismatch_run)
+        self.allowed = np.stack([north_allowed, east_allowed, north_allowed.T, east_allowed.T], axis=1)
 
-                valid_neighbour = Tile.compare_edges(this_tile.east_pixels, other_tile.west_pixels, colour_tolerance, match_ratio, max_mismatch_run)
-                if not valid_neighbour:
-                    this_tile.east_illegals.append(other_tile.id)
+        for this_tile in self.tiles:
+            illegals = [np.flatnonzero(~self.allowed[this_tile.id, direction]).tolist() for direction in range(4)]
+            this_tile.north_illegals, this_tile.east_illegals, this_tile.south_illegals, this_tile.west_illegals = illegals
 
-                valid_neighbour = Tile.compare_edges(this_tile.west_pixels, other_tile.east_pixels, colour_tolerance, match_ratio, max_mismatch_run)
-                if not valid_neighbour:
-                    this_tile.west_illegals.append(other_tile.id)
+        return self.allowed
 
     def read_tile_set(self, folder):
+        paths = [
+            os.path.join(root, filename) for root, dirs, files in os.walk(folder) for filename in files if filename.endswith('.png')
+        ]
+        if not paths:
+            # os.walk gives nothing for a folder which doesn't exist, so a misspelt name ends up here too
+            raise FileNotFoundError(f"No .png tiles found in '{folder}'")
+
+        # Decoding the PNGs is the slow part of reading them, and PIL releases the GIL while it decodes
+        with ThreadPoolExecutor() as pool:
+            images = list(pool.map(self.read_image_into_pixels, paths))
+
+        # The raw bytes of every tile added so far, so each variant is checked against them with a single lookup
+        seen = set()
         id_num = 0
         tile_sizes = []
-        for root, dirs, files in os.walk(folder):
-            for filename in files:
-                if filename.endswith('.png'):
-                    orig_pixels = self.read_image_into_pixels(os.path.join(root, filename))
-                    if orig_pixels.shape[0] != orig_pixels.shape[1]:
-                        raise Exception('Non-square tiles detected')
-                    tile_sizes.append(orig_pixels.shape[:2])
-                    if len(tile_sizes) > 0:
-                        if tile_sizes[-1] != tile_sizes[0]:
-                            raise Exception('Different tile sizes detected')
-                        self.add_tile(Tile(orig_pixels, id_num))
+        for path, orig_pixels in zip(paths, images):
+            if orig_pixels.shape[0] != orig_pixels.shape[1]:
+                raise Exception('Non-square tiles detected')
+            tile_sizes.append(orig_pixels.shape[:2])
+            if tile_sizes[-1] != tile_sizes[0]:
+                raise Exception('Different tile sizes detected')
+
+            # The tile itself is always added, then whichever of its rotations and flips are new
+            if orig_pixels.tobytes() in seen:
+                print(f"{path} repeats a tile already in the set")
+            self.add_tile(Tile(orig_pixels, id_num))
+            seen.add(orig_pixels.tobytes())
+            id_num += 1
+            variants = [np.rot90(orig_pixels, turns) for turns in (1, 2, 3)]
+            variants += [np.flip(orig_pixels, axis=0), np.flip(orig_pixels, axis=1)]
+            for pixels in variants:
+                key = pixels.tobytes()
+                if key not in seen:
+                    seen.add(key)
+                    self.add_tile(Tile(pixels, id_num))
                     id_num += 1
-                    pixels = np.rot90(orig_pixels)
-                    if not any([np.array_equal(pixels, tile.pixels) for tile in self.tiles]):
-                        self.add_tile(Tile(pixels, id_num))
-                        id_num += 1
-                    pixels = np.rot90(pixels)
-                    if not any([np.array_equal(pixels, tile.pixels) for tile in self.tiles]):
-                        self.add_tile(Tile(pixels, id_num))
-                        id_num += 1
-                    pixels = np.rot90(pixels)
-                    if not any([np.array_equal(pixels, tile.pixels) for tile in self.tiles]):
-                        self.add_tile(Tile(pixels, id_num))
-                        id_num += 1
-                    pixels = np.flip(orig_pixels, axis=0)
-                    if not any([np.array_equal(pixels, tile.pixels) for tile in self.tiles]):
-                        self.add_tile(Tile(pixels, id_num))
-                        id_num += 1
-                    pixels = np.flip(orig_pixels, axis=1)
-                    if not any([np.array_equal(pixels, tile.pixels) for tile in self.tiles]):
-                        self.add_tile(Tile(pixels, id_num))
-                        id_num += 1
         self.tile_size = tile_sizes[0]
 
     @staticmethod